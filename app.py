@@ -1,18 +1,39 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 from pathlib import Path
 import os
 import sqlite3
 import json
+import math
 import hashlib
+import base64
+import re
 import csv
+import io
 import subprocess
-import urllib.request
+import threading
+import multiprocessing
+import asyncio
+from array import array
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+import heapq
+import zlib
 import urllib.parse
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from bisect import bisect_left, bisect_right
 from datetime import datetime, UTC, timedelta
 import secrets
-from fastapi import FastAPI, Request, Form, Depends, HTTPException, status
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi import FastAPI, Request, Form, Body, Depends, HTTPException, status
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -45,9 +66,17 @@ RESEARCH_AGENTS_PATH = Path(os.getenv("RESEARCH_AGENTS_PATH", "C:/Users/Fernando
 RESEARCH_QUEUE_PATH = Path(os.getenv("RESEARCH_QUEUE_PATH", "C:/Users/Fernando/.openclaw/workspace/proyectos/analisis-mercados/data/research_experiment_queue.json"))
 RESEARCH_RESULTS_PATH = Path(os.getenv("RESEARCH_RESULTS_PATH", "C:/Users/Fernando/.openclaw/workspace/proyectos/analisis-mercados/data/research_experiment_results.json"))
 RESEARCH_DEPLOYMENTS_PATH = Path(os.getenv("RESEARCH_DEPLOYMENTS_PATH", "C:/Users/Fernando/.openclaw/workspace/proyectos/analisis-mercados/config/research_deployments.json"))
-GPT53_BUDGET_PATH = Path(os.getenv("GPT53_BUDGET_PATH", "C:/Users/Fernando/.openclaw/workspace/proyectos/analisis-mercados/data/gpt53_budget.json"))
 STARTUP_LOG_PATH = Path(os.getenv("STARTUP_LOG_PATH", "C:/Users/Fernando/.openclaw/workspace/startup-stack.log"))
+PRICE_WAREHOUSE_PATH = Path(os.getenv("PRICE_WAREHOUSE_PATH", "C:/Users/Fernando/.openclaw/workspace/memory/price_warehouse.csv"))
+STOCK_WAREHOUSE_PATH = Path(os.getenv("STOCK_WAREHOUSE_PATH", "C:/Users/Fernando/.openclaw/workspace/memory/stock_price_warehouse.csv"))
+TRADING_JOURNAL_DB_PATH = Path("C:/Users/Fernando/.openclaw/workspace/skills/trading-journal/journal_db.json")
 GPT53_MODE = os.getenv("GPT53_MODE", "normal").strip().lower()
+# Subsistemas opcionales que se registran en el arranque (lifespan), no al importar
+OPTIONAL_SUBSYSTEMS = {s.strip() for s in os.getenv("DASHBOARD_SUBSYSTEMS", "lstm,sysadmin,terminal").lower().split(",") if s.strip()}
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+CRON_SCHEDULER_ENABLED = os.getenv("CRON_SCHEDULER", "1").strip().lower() not in {"0", "false", "no", "off"}
+# Version del esquema SQLite (PRAGMA user_version); subir al anadir tablas/indices/columnas
+SCHEMA_VERSION = 7
 
 # --- CACHE DE API PROBES (evitar llamadas externas en cada carga de pagina) ---
 _api_probe_cache = {"status": {}, "last_check": 0, "ttl_seconds": 300}  # 5 min cache
@@ -57,13 +86,19 @@ def verify_credentials():
     return "admin"
 
 
+@lru_cache(maxsize=4096)
+def _date_iso_to_es(iso_str: str) -> str:
+    try:
+        return datetime.fromisoformat(iso_str.replace("Z", "+00:00")).strftime("%d/%m/%Y")
+    except Exception:
+        return iso_str
+
+
 def date_iso_to_es(iso_str: str) -> str:
+    # Las mismas fechas se repiten en cada render: parseo memoizado y acotado
     if not iso_str: return "-"
-    try:
-        from datetime import datetime
-        dt = datetime.fromisoformat(iso_str.replace("Z", "+00:00"))
-        return dt.strftime("%d/%m/%Y")
-    except: return iso_str
+    if not isinstance(iso_str, str): return iso_str
+    return _date_iso_to_es(iso_str)
 
 
 def parse_iso_utc(value: str | None):
@@ -74,9 +109,48 @@ def parse_iso_utc(value: str | None):
     except Exception:
         return None
 
-app = FastAPI(title="Agent Ops Dashboard")
+# --- ARRANQUE PEREZOSO: migraciones y subsistemas opcionales en el lifespan ---
+_startup_timing = {"import_ms": None, "init_ms": None, "ready_ms": None}
+_templates = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    t0 = time.perf_counter()
+    init_db()
+    active_tasks.load()
+    register_optional_subsystems()
+    for path in watched_inputs().values():
+        file_watcher.watch(path, newest_child=path == BACKUP_ROOT)
+    file_watcher.subscribe(on_input_changed)
+    file_watcher.start()
+    token_telemetry.start()
+    if CRON_SCHEDULER_ENABLED:
+        cron_scheduler.start()
+    _startup_timing["init_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    _startup_timing["ready_ms"] = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 2)
+    try:
+        yield
+    finally:
+        cron_scheduler.stop()
+        token_telemetry.stop()
+        file_watcher.stop()
+        for session in PROVIDERS.values():
+            session.close()
+
+
+def get_templates():
+    # Jinja2 solo se importa/compila cuando se renderiza la primera pagina
+    global _templates
+    if _templates is None:
+        from fastapi.templating import Jinja2Templates
+        _templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+    return _templates
+
+
+app = FastAPI(title="Agent Ops Dashboard", lifespan=lifespan)
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
-templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 
 def now_iso() -> str:
@@ -98,6 +172,92 @@ def approx_tokens(text: str) -> int:
     return max(1, int(len(text) / 4))
 
 
+# --- TOKENIZERS ENCHUFABLES: conteo por trozos, sin construir el texto completo ---
+TOKEN_COUNT_BLOCK = 64 * 1024  # caracteres por bloque al pasar trozos a un tokenizer real
+
+
+class CharTokenizer:
+    """Estimacion por caracteres (~4 chars/token): suma longitudes, no concatena."""
+
+    def __init__(self, chars_per_token: float = 4.0):
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        return self.count_pieces((text,))
+
+    def count_pieces(self, pieces) -> int:
+        chars = sum(len(p) for p in pieces)
+        return max(1, int(chars / self.chars_per_token)) if chars else 0
+
+
+class HFTokenizer:
+    """tokenizer.json de un modelo local (paquete `tokenizers`); cuenta por bloques de TOKEN_COUNT_BLOCK."""
+
+    def __init__(self, path: str):
+        from tokenizers import Tokenizer  # opcional: solo si se configura en TOKENIZER_FILES
+
+        self._tok = Tokenizer.from_file(path)
+
+    def count(self, text: str) -> int:
+        return len(self._tok.encode(text, add_special_tokens=False).ids) if text else 0
+
+    def count_pieces(self, pieces) -> int:
+        total, block, size = 0, [], 0
+        for p in pieces:
+            block.append(p)
+            size += len(p)
+            if size >= TOKEN_COUNT_BLOCK:
+                total += self.count("".join(block))
+                block, size = [], 0
+        return total + self.count("".join(block))
+
+
+# "nombre=/ruta/tokenizer.json;otro=..." -> se cargan al primer uso
+TOKENIZER_FILES = dict(
+    item.split("=", 1) for item in os.getenv("TOKENIZER_FILES", "").split(";") if "=" in item
+)
+TOKENIZER = os.getenv("TOKENIZER", "approx")
+_tokenizers: dict[str, object] = {"approx": CharTokenizer()}
+_tokenizers_lock = threading.Lock()
+
+
+def register_tokenizer(name: str, tokenizer) -> None:
+    """Cualquier objeto con count(text) y count_pieces(iterable de str) sirve."""
+    with _tokenizers_lock:
+        _tokenizers[name] = tokenizer
+
+
+def get_tokenizer(name: str | None = None):
+    name = name or TOKENIZER
+    tok = _tokenizers.get(name)
+    if tok is not None:
+        return tok
+    with _tokenizers_lock:
+        tok = _tokenizers.get(name)
+        if tok is None:
+            try:
+                tok = HFTokenizer(TOKENIZER_FILES[name])
+            except Exception:
+                tok = _tokenizers["approx"]  # sin fichero o sin paquete: estimacion, y no se reintenta
+            _tokenizers[name] = tok
+    return tok
+
+
+_token_json_encoder = json.JSONEncoder(ensure_ascii=False)
+
+
+def joined_pieces(texts, sep: str = " "):
+    for i, text in enumerate(texts):
+        if i:
+            yield sep
+        yield text
+
+
+def json_rows_pieces(rows, sep: str = " "):
+    # mismos caracteres que " ".join(json.dumps(x) for x in rows), pero una fila viva cada vez
+    return joined_pieces(map(_token_json_encoder.encode, rows or []), sep)
+
+
 def register_token_usage(cur, model: str, actor: str, tin: int, tout: int, session_key: str = "local-autopilot"):
     cur.execute(
         "INSERT INTO token_usage(model, session_key, tokens_in, tokens_out, recorded_at, recorded_by) VALUES(?,?,?,?,?,?)",
@@ -109,6 +269,10 @@ def init_db():
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
     try:
+        # Esquema al dia: no tocar nada (ni executescript ni PRAGMA table_info)
+        current = int(conn.execute("PRAGMA user_version").fetchone()[0] or 0)
+        if current >= SCHEMA_VERSION:
+            return
         conn.executescript(
             """
             CREATE TABLE IF NOT EXISTS tasks (
@@ -163,14 +327,148 @@ def init_db():
             if col not in existing:
                 conn.execute(f"ALTER TABLE tasks ADD COLUMN {col} {ddl}")
 
+        existing_cron = {r[1] for r in conn.execute("PRAGMA table_info(cron_tasks)").fetchall()}
+        for col, ddl in [
+            ("jitter_s", "INTEGER DEFAULT 0"),
+            ("max_concurrency", "INTEGER DEFAULT 1"),
+            ("misfire_grace_s", "INTEGER DEFAULT 300"),
+        ]:
+            if col not in existing_cron:
+                conn.execute(f"ALTER TABLE cron_tasks ADD COLUMN {col} {ddl}")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS cron_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cron_id INTEGER,
+                name TEXT,
+                task_ref TEXT,
+                scheduled_at TEXT,
+                started_at TEXT,
+                finished_at TEXT,
+                status TEXT,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_cron_runs_cron ON cron_runs(cron_id, id);
+            CREATE TABLE IF NOT EXISTS backtest_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                status TEXT,
+                params TEXT,
+                report TEXT,
+                error TEXT,
+                created_at TEXT,
+                finished_at TEXT
+            );
+            """
+        )
+
+        # Indices del navegador de tareas (keyset sobre COALESCE(updated_at,''),id + filtros); la expresion
+        # tiene que coincidir con TASK_UPDATED_KEY para que SQLite los use
+        conn.executescript(
+            """
+            CREATE INDEX IF NOT EXISTS idx_tasks_updated ON tasks(updated_at, id);
+            DROP INDEX IF EXISTS idx_tasks_status_updated;
+            DROP INDEX IF EXISTS idx_tasks_assigned_updated;
+            DROP INDEX IF EXISTS idx_tasks_priority_updated;
+            DROP INDEX IF EXISTS idx_tasks_source_updated;
+            CREATE INDEX IF NOT EXISTS idx_tasks_key ON tasks(COALESCE(updated_at, ''), id);
+            CREATE INDEX IF NOT EXISTS idx_tasks_status_key ON tasks(status, COALESCE(updated_at, ''), id);
+            CREATE INDEX IF NOT EXISTS idx_tasks_assigned_key ON tasks(assigned_to, COALESCE(updated_at, ''), id);
+            CREATE INDEX IF NOT EXISTS idx_tasks_priority_key ON tasks(priority, COALESCE(updated_at, ''), id);
+            CREATE INDEX IF NOT EXISTS idx_tasks_source_key ON tasks(source, COALESCE(updated_at, ''), id);
+            """
+        )
+        # Historico estructurado de walk-forward y registro LSTM (una ejecucion por contenido nuevo)
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS lstm_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT,
+                content_sha1 TEXT,
+                file_mtime TEXT,
+                ingested_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS lstm_walkforward (
+                run_id INTEGER,
+                symbol TEXT,
+                baseline_acc REAL,
+                lstm_acc REAL,
+                delta REAL
+            );
+            CREATE TABLE IF NOT EXISTS lstm_registry (
+                run_id INTEGER,
+                symbol TEXT,
+                best_val_mse REAL,
+                entry TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_lstm_runs_source ON lstm_runs(source, id);
+            CREATE INDEX IF NOT EXISTS idx_lstm_walkforward_run ON lstm_walkforward(run_id);
+            CREATE INDEX IF NOT EXISTS idx_lstm_walkforward_symbol ON lstm_walkforward(symbol, run_id);
+            CREATE INDEX IF NOT EXISTS idx_lstm_registry_run ON lstm_registry(run_id);
+            CREATE INDEX IF NOT EXISTS idx_lstm_registry_symbol ON lstm_registry(symbol, run_id);
+            """
+        )
+        # Ledger de presupuesto LLM: una fila por reserva; limites por (modelo, modo)
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS llm_budget_limits (
+                model TEXT,
+                mode TEXT,
+                max_calls INTEGER,
+                max_tokens INTEGER,
+                PRIMARY KEY (model, mode)
+            );
+            CREATE TABLE IF NOT EXISTS llm_budget_ledger (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                day TEXT,
+                model TEXT,
+                mode TEXT,
+                holder TEXT,
+                calls INTEGER,
+                tokens INTEGER,
+                state TEXT,
+                created_at TEXT,
+                updated_at TEXT,
+                expires_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_llm_budget_day ON llm_budget_ledger(day, model, state);
+            CREATE INDEX IF NOT EXISTS idx_llm_budget_reserved ON llm_budget_ledger(state, expires_at);
+            """
+        )
+        for mode in ("ahorro", "normal", "pro"):
+            lim = gpt53_limits(mode)
+            conn.execute(
+                "INSERT OR IGNORE INTO llm_budget_limits(model, mode, max_calls, max_tokens) VALUES(?,?,?,?)",
+                (GPT53_BUDGET_MODEL, mode, lim["max_calls"], lim["max_tokens"]),
+            )
+        if current < 3:
+            try:
+                conn.executescript(
+                    """
+                    CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(title, details, content='tasks', content_rowid='id');
+                    CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN
+                        INSERT INTO tasks_fts(rowid, title, details) VALUES (new.id, new.title, new.details);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN
+                        INSERT INTO tasks_fts(tasks_fts, rowid, title, details) VALUES ('delete', old.id, old.title, old.details);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title, details ON tasks BEGIN
+                        INSERT INTO tasks_fts(tasks_fts, rowid, title, details) VALUES ('delete', old.id, old.title, old.details);
+                        INSERT INTO tasks_fts(rowid, title, details) VALUES (new.id, new.title, new.details);
+                    END;
+                    INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild');
+                    """
+                )
+            except sqlite3.OperationalError:
+                pass  # SQLite sin FTS5: /api/tasks cae a LIKE
+
+        # WAL: lectores largos (exports, paginas) no bloquean a los escritores
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA user_version = {int(SCHEMA_VERSION)}")
         conn.commit()
     finally:
         conn.close()
 
 
-init_db()
-
-
 def q(sql: str, params=()):
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
@@ -180,6 +478,598 @@ def q(sql: str, params=()):
         conn.close()
 
 
+# --- ETAGS: version de las fuentes -> 304 sin recalcular nada ---
+# --- VIGILANCIA DE FICHEROS: inotify en Linux, sondeo de mtime como respaldo ---
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+IN_DELETE_SELF, IN_MOVE_SELF, IN_Q_OVERFLOW, IN_IGNORED = 0x400, 0x800, 0x4000, 0x8000
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+FILE_WATCH_POLL_SECONDS = float(os.getenv("FILE_WATCH_POLL_SECONDS", "2"))
+# Los ingest reescriben con tmp + rename: una rafaga de eventos -> un solo aviso
+FILE_WATCH_DEBOUNCE_SECONDS = float(os.getenv("FILE_WATCH_DEBOUNCE_SECONDS", "0.5"))
+
+
+def newest_mtime(path: Path) -> float | None:
+    """mtime mas reciente entre los hijos de `path` y, si son carpetas, sus propios hijos."""
+    try:
+        mtimes = []
+        for child in path.iterdir():
+            mtimes.append(child.stat().st_mtime)
+            if child.is_dir():
+                mtimes.extend(p.stat().st_mtime for p in child.iterdir())
+        return max(mtimes, default=None)
+    except Exception:
+        return None
+
+
+class FileWatcher:
+    """Guarda el ultimo stat de cada ruta vigilada; las consultas son O(1) y sin syscalls."""
+
+    def __init__(self, poll_interval: float = FILE_WATCH_POLL_SECONDS, debounce: float = FILE_WATCH_DEBOUNCE_SECONDS):
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.backend = None
+        self.events = 0
+        self._lock = threading.Lock()
+        self._paths: dict[str, Path] = {}
+        self._dirs_newest: set[str] = set()  # directorios donde interesa el hijo mas reciente
+        self._stats: dict[str, tuple | None] = {}
+        self._newest: dict[str, float | None] = {}
+        self._late: list[str] = []  # rutas anadidas con el watcher ya arrancado (se sondean)
+        self._pending: dict[str, float] = {}  # ruta -> instante en que se emite el aviso
+        self._listeners = []
+        self._thread = None
+        self._stop = threading.Event()
+
+    def watch(self, path: Path, newest_child: bool = False):
+        key = str(path)
+        with self._lock:
+            self._paths[key] = path
+            if newest_child:
+                self._dirs_newest.add(key)
+        if self._thread is not None:
+            self._late.append(key)
+            self._refresh(key)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        for key in list(self._paths):
+            self._refresh(key)
+        self._thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def subscribe(self, callback):
+        """callback(key, path) tras cada cambio ya asentado (fuera del hilo de peticiones)."""
+        self._listeners.append(callback)
+
+    def _touch(self, key: str):
+        # Cada evento de la rafaga aplaza el aviso: se emite cuando la ruta lleva `debounce` quieta
+        if self._refresh(key) or key in self._pending:
+            self._pending[key] = time.monotonic() + self.debounce
+
+    def _flush(self):
+        now = time.monotonic()
+        due = [key for key, at in self._pending.items() if at <= now]
+        for key in due:
+            del self._pending[key]
+            self.events += 1
+            for callback in list(self._listeners):
+                try:
+                    callback(key, self._paths[key])
+                except Exception:
+                    pass
+
+    def _wait_timeout(self, limit: float) -> float:
+        if not self._pending:
+            return limit
+        return max(0.0, min(limit, min(self._pending.values()) - time.monotonic()))
+
+    def _refresh(self, key: str) -> bool:
+        path = self._paths[key]
+        try:
+            st = path.stat()
+            stat = (st.st_mtime_ns, st.st_size)
+        except Exception:
+            stat = None
+        newest = None
+        if key in self._dirs_newest and stat is not None:
+            newest = newest_mtime(path)
+        with self._lock:
+            changed = self._stats.get(key, ()) != stat or self._newest.get(key) != newest
+            self._stats[key] = stat
+            self._newest[key] = newest
+        return changed
+
+    def stat(self, path: Path):
+        """(mtime_ns, size) o None; sin watcher activo cae a os.stat."""
+        key = str(path)
+        if self._thread is not None and key in self._stats:
+            return self._stats[key]
+        try:
+            st = path.stat()
+            return (st.st_mtime_ns, st.st_size)
+        except Exception:
+            return None
+
+    def mtime(self, path: Path) -> float | None:
+        stat = self.stat(path)
+        return stat[0] / 1e9 if stat else None
+
+    def newest_child_mtime(self, path: Path) -> float | None:
+        key = str(path)
+        if self._thread is not None and key in self._newest:
+            return self._newest[key]
+        return newest_mtime(path)
+
+    def _run(self):
+        try:
+            self._run_inotify()
+        except Exception:
+            pass
+        if not self._stop.is_set():
+            self.backend = "polling"
+            self._poll()
+
+    def _poll(self):
+        next_poll = time.monotonic() + self.poll_interval
+        while not self._stop.wait(self._wait_timeout(max(0.0, next_poll - time.monotonic()))):
+            if time.monotonic() >= next_poll:
+                for key in list(self._paths):
+                    self._touch(key)
+                next_poll = time.monotonic() + self.poll_interval
+            self._flush()
+
+    def _run_inotify(self):
+        import ctypes
+        import ctypes.util
+        import select
+        import struct
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(0o2000000)  # IN_CLOEXEC
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        try:
+            # Se vigila el directorio padre: los ingest reescriben con rename atomico.
+            # routes: directorio -> (nombre de fichero -> clave, claves que dependen de todo el directorio)
+            routes: dict[str, tuple[dict[str, str], list[str]]] = {}
+            subdirs: dict[str, str] = {}  # subdirectorio de un newest_child -> directorio raiz
+            by_wd: dict[int, str] = {}
+            wd_by_dir: dict[str, int] = {}
+            unwatched: set[str] = set()  # directorios sin watch (aun no existen o se borraron): se sondean
+
+            def route_keys(dkey):
+                files, dir_keys = routes[dkey]
+                return list(files.values()) + dir_keys
+
+            def attach(dkey) -> bool:
+                wd = libc.inotify_add_watch(fd, dkey.encode(), INOTIFY_MASK)
+                if wd < 0:
+                    return False
+                wd_by_dir[dkey] = wd
+                by_wd[wd] = dkey
+                if dkey in self._dirs_newest:
+                    scan_subdirs(dkey)
+                return True
+
+            def add_subdir(root, sub):
+                if sub in routes:
+                    return
+                routes[sub] = ({}, [root])
+                subdirs[sub] = root
+                if not attach(sub):
+                    del routes[sub], subdirs[sub]
+
+            def scan_subdirs(root):
+                # Un nivel por debajo: las copias escriben dentro de su propia carpeta
+                try:
+                    children = [p for p in Path(root).iterdir() if p.is_dir()]
+                except Exception:
+                    return
+                for child in children:
+                    add_subdir(root, str(child))
+
+            def detach(wd, mask) -> list[str]:
+                dkey = by_wd.pop(wd, None)
+                if dkey is None:
+                    return []
+                wd_by_dir.pop(dkey, None)
+                if mask & IN_MOVE_SELF:
+                    libc.inotify_rm_watch(fd, wd)  # el watch seguiria al directorio movido
+                keys = route_keys(dkey)
+                for sub in [s for s, root in subdirs.items() if root == dkey]:
+                    # al reaparecer la raiz se vuelven a escanear sus subdirectorios
+                    sub_wd = wd_by_dir.pop(sub, None)
+                    if sub_wd is not None:
+                        by_wd.pop(sub_wd, None)
+                        libc.inotify_rm_watch(fd, sub_wd)
+                    del subdirs[sub], routes[sub]
+                if dkey in subdirs:
+                    del subdirs[dkey]
+                    del routes[dkey]
+                else:
+                    unwatched.add(dkey)
+                return keys
+
+            for key, path in self._paths.items():
+                routes.setdefault(str(path.parent), ({}, []))[0][path.name] = key
+                if key in self._dirs_newest:
+                    routes.setdefault(key, ({}, []))[1].append(key)
+            for dkey in list(routes):
+                if dkey not in wd_by_dir and not attach(dkey):
+                    unwatched.add(dkey)
+            self.backend = "inotify" if by_wd else "polling"
+            if not by_wd:
+                raise OSError("sin rutas vigilables con inotify")
+            next_poll = time.monotonic() + self.poll_interval
+            while not self._stop.is_set():
+                ready, _, _ = select.select([fd], [], [], self._wait_timeout(min(1.0, self.poll_interval)))
+                touched = set()
+                if ready:
+                    data = os.read(fd, 64 * 1024)
+                    offset = 0
+                    while offset + 16 <= len(data):
+                        wd, mask, _cookie, length = struct.unpack_from("iIII", data, offset)
+                        name = data[offset + 16:offset + 16 + length].split(b"\0", 1)[0].decode(errors="replace")
+                        offset += 16 + length
+                        if mask & IN_Q_OVERFLOW:
+                            touched.update(self._paths)
+                            continue
+                        if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                            touched.update(detach(wd, mask))
+                            continue
+                        dkey = by_wd.get(wd)
+                        if dkey is None:
+                            continue
+                        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and dkey in self._dirs_newest:
+                            add_subdir(dkey, os.path.join(dkey, name))
+                        files, dir_keys = routes[dkey]
+                        if name in files:
+                            touched.add(files[name])
+                        touched.update(dir_keys)
+                if (unwatched or self._late) and time.monotonic() >= next_poll:
+                    # directorios sin watch y rutas anadidas tarde: sondeo, y se reintenta el watch
+                    for dkey in list(unwatched):
+                        touched.update(route_keys(dkey))
+                        if attach(dkey):
+                            unwatched.discard(dkey)
+                    touched.update(self._late)
+                    next_poll = time.monotonic() + self.poll_interval
+                for key in touched:
+                    self._touch(key)
+                self._flush()
+        finally:
+            os.close(fd)
+
+file_watcher = FileWatcher()
+
+
+def file_version(path: Path) -> str:
+    stat = file_watcher.stat(path)
+    return f"{stat[0]:x}-{stat[1]:x}" if stat else "0"
+
+
+def db_version() -> str:
+    # Cambia con cada commit (fichero principal o WAL)
+    return file_version(DB_PATH) + "/" + file_version(Path(str(DB_PATH) + "-wal"))
+
+
+def make_etag(*parts) -> str:
+    return '"' + hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:24] + '"'
+
+
+# Debiles: GZipMiddleware sirve el mismo recurso en gzip o identidad con la misma etiqueta
+_ETAG_HEADERS = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+
+def not_modified(request: Request, etag: str):
+    inm = request.headers.get("if-none-match") or ""
+    if etag in {t.strip().removeprefix("W/") for t in inm.split(",")}:
+        return Response(status_code=304, headers={"ETag": "W/" + etag, **_ETAG_HEADERS})
+    return None
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = "W/" + etag
+    response.headers.update(_ETAG_HEADERS)
+    return response
+
+
+# --- JSON VIGILADOS: se leen y parsean solo cuando cambia la version del fichero ---
+_watched_json_cache: dict[str, tuple[str, object]] = {}  # ruta -> (version, objeto parseado)
+
+
+def load_watched_json(path: Path, default):
+    """Objeto compartido entre peticiones: los llamadores no deben mutarlo."""
+    version = file_version(path)
+    if version == "0":
+        return default
+    key = str(path)
+    hit = _watched_json_cache.get(key)
+    if hit is None or hit[0] != version:
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            data = None  # fichero a medio escribir: se reintenta cuando cambie de version
+        hit = (version, data)
+        _watched_json_cache[key] = hit
+    return default if hit[1] is None else hit[1]
+
+
+# --- PROYECCION EN STREAMING: solo se materializan los campos que usa cada consumidor ---
+JSON_STREAM_CHUNK = 1 << 20
+_json_decoder = json.JSONDecoder()
+_JSON_WS = re.compile(r"[ \t\n\r]*")
+
+
+class JsonRows:
+    """Proyeccion de una lista: `fields` por elemento, filtro `where` y como mucho `limit` filas."""
+
+    def __init__(self, fields=True, limit: int | None = None, where=None):
+        self.fields = fields
+        self.limit = limit
+        self.where = where
+
+
+def project_json(value, spec):
+    # spec: True (valor entero), dict (claves de un objeto) o JsonRows (filas de una lista)
+    if spec is True:
+        return value
+    if isinstance(spec, dict):
+        if not isinstance(value, dict):
+            return value
+        return {k: project_json(value[k], sub) for k, sub in spec.items() if k in value}
+    if isinstance(spec, JsonRows):
+        if not isinstance(value, list):
+            return value
+        rows = []
+        for row in value:
+            if spec.limit is not None and len(rows) >= spec.limit:
+                break
+            if spec.where is None or spec.where(row):
+                rows.append(project_json(row, spec.fields))
+        return rows
+    return value
+
+
+class JsonStreamReader:
+    """Recorre un documento JSON por miembros/elementos; cada trozo lo decodifica el decoder C."""
+
+    def __init__(self, fh, chunk_size: int = JSON_STREAM_CHUNK):
+        self._fh = fh
+        self._chunk = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _more(self, size: int) -> bool:
+        if self._eof:
+            return False
+        data = self._fh.read(size)
+        if not data:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self._pos = _JSON_WS.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._more(self._chunk):
+                return ""
+
+    def take(self) -> str:
+        ch = self.peek()
+        self._pos += 1
+        return ch
+
+    def expect(self, ch: str):
+        if self.take() != ch:
+            raise ValueError(f"JSON: se esperaba {ch!r}")
+
+    def value(self):
+        self.peek()
+        size = self._chunk
+        while True:
+            try:
+                obj, end = _json_decoder.raw_decode(self._buf, self._pos)
+                # un numero pegado al final del buffer puede seguir en el siguiente bloque
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            size *= 2  # valor cortado: bloques crecientes para no re-decodificar en cuadratico
+            self._more(size)
+
+    def read(self, spec):
+        ch = self.peek()
+        if spec is None:
+            # se descarta sin materializar el contenedor completo
+            if ch == "[":
+                self._rows(JsonRows(limit=0))
+            elif ch == "{":
+                self._object({})
+            else:
+                self.value()
+            return None
+        if isinstance(spec, dict) and ch == "{":
+            return self._object(spec)
+        if isinstance(spec, JsonRows) and ch == "[":
+            return self._rows(spec)
+        return project_json(self.value(), spec)
+
+    def _object(self, spec: dict) -> dict:
+        out = {}
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return out
+        while True:
+            key = self.value()
+            self.expect(":")
+            sub = spec.get(key)
+            if sub is None:
+                self.read(None)
+            else:
+                out[key] = self.read(sub)
+            ch = self.take()
+            if ch == "}":
+                return out
+            if ch != ",":
+                raise ValueError("JSON: objeto mal formado")
+
+    def _rows(self, spec: JsonRows) -> list:
+        rows = []
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return rows
+        while True:
+            row = self.value()
+            if (spec.limit is None or len(rows) < spec.limit) and (spec.where is None or spec.where(row)):
+                rows.append(project_json(row, spec.fields))
+            ch = self.take()
+            if ch == "]":
+                return rows
+            if ch != ",":
+                raise ValueError("JSON: lista mal formada")
+
+
+def read_json_projection(path: Path, spec: dict):
+    with open(path, encoding="utf-8") as fh:
+        reader = JsonStreamReader(fh)
+        data = reader.read(spec)
+        if reader.peek():
+            raise ValueError("JSON: datos tras el documento")
+        return data
+
+
+_projected_json_cache: dict[tuple[str, str], tuple[str, object]] = {}  # (ruta, proyeccion) -> (version, datos)
+
+
+def load_projected_json(path: Path, projections: dict, name: str, default):
+    """Como load_watched_json pero solo con los campos de `projections[name]` (compartido, solo lectura)."""
+    version = file_version(path)
+    if version == "0":
+        return default
+    key = (str(path), name)
+    hit = _projected_json_cache.get(key)
+    if hit is None or hit[0] != version:
+        try:
+            data = read_json_projection(path, projections[name])
+        except Exception:
+            data = None
+        hit = (version, data)
+        _projected_json_cache[key] = hit
+    return default if hit[1] is None else hit[1]
+
+
+# --- AVISOS DE CAMBIO: watcher -> invalidacion de caches + clientes (SSE /api/events) ---
+def watched_inputs() -> dict[str, Path]:
+    # Se evalua en el arranque: incluye constantes definidas mas abajo (riesgo, LSTM)
+    return {
+        "SIGNALS_PATH": SIGNALS_PATH,
+        "SNAPSHOT_PATH": SNAPSHOT_PATH,
+        "PORTFOLIO_PATH": PORTFOLIO_PATH,
+        "AUTOPILOT_LOG": AUTOPILOT_LOG,
+        "AGENTS_RUNTIME": AGENTS_RUNTIME,
+        "AGENTS_HEALTH": AGENTS_HEALTH,
+        "SOURCES_CONFIG_PATH": SOURCES_CONFIG_PATH,
+        "ORDERS_PATH": ORDERS_PATH,
+        "JOURNAL_PATH": JOURNAL_PATH,
+        "BACKUP_ROOT": BACKUP_ROOT,
+        "CRYPTO_SIGNALS_PATH": CRYPTO_SIGNALS_PATH,
+        "CRYPTO_ORDERS_PATH": CRYPTO_ORDERS_PATH,
+        "CRYPTO_SHORT_SIGNALS_PATH": CRYPTO_SHORT_SIGNALS_PATH,
+        "CRYPTO_SHORT_ORDERS_PATH": CRYPTO_SHORT_ORDERS_PATH,
+        "CRYPTO_RISK_PATH": CRYPTO_RISK_PATH,
+        "CRYPTO_SHORT_RISK_PATH": CRYPTO_SHORT_RISK_PATH,
+        "CRYPTO_HISTORY_DIR": CRYPTO_HISTORY_DIR,
+        "CRYPTO_STREAM_STATUS_PATH": CRYPTO_STREAM_STATUS_PATH,
+        "LEARNING_STATUS_PATH": LEARNING_STATUS_PATH,
+        "LEARNING_STATUS_SHORT_PATH": LEARNING_STATUS_SHORT_PATH,
+        "MOONSHOT_CANDIDATES_PATH": MOONSHOT_CANDIDATES_PATH,
+        "OPENCLAW_SNAPSHOT_PATH": OPENCLAW_SNAPSHOT_PATH,
+        "RESEARCH_AGENTS_PATH": RESEARCH_AGENTS_PATH,
+        "RESEARCH_QUEUE_PATH": RESEARCH_QUEUE_PATH,
+        "RESEARCH_RESULTS_PATH": RESEARCH_RESULTS_PATH,
+        "RESEARCH_DEPLOYMENTS_PATH": RESEARCH_DEPLOYMENTS_PATH,
+        "PRICE_WAREHOUSE_PATH": PRICE_WAREHOUSE_PATH,
+        "STOCK_WAREHOUSE_PATH": STOCK_WAREHOUSE_PATH,
+        "TRADING_JOURNAL_DB_PATH": TRADING_JOURNAL_DB_PATH,
+        "RISK_METRICS_PATH": RISK_METRICS_PATH,
+        "REGIME_PATH": REGIME_PATH,
+        "CORRELATION_PATH": CORRELATION_PATH,
+        "LSTM_LOG": LSTM_LOG,
+        "LSTM_REGISTRY": LSTM_REGISTRY,
+        "LSTM_WALKFORWARD": LSTM_WALKFORWARD,
+    }
+
+
+class ChangeFeed:
+    """Ultimos avisos de cambio en un buffer circular; cada cliente lee desde su ultimo id."""
+
+    def __init__(self, maxlen: int = 256):
+        self._events = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.last_id = 0
+
+    def publish(self, inputs: list[str], path: Path):
+        with self._lock:
+            self.last_id += 1
+            self._events.append({
+                "id": self.last_id,
+                "inputs": inputs,
+                "path": str(path),
+                "version": file_version(path),
+                "at": datetime.now(UTC).isoformat(),
+            })
+
+    def since(self, last_id: int) -> list[dict]:
+        if last_id >= self.last_id:
+            return []
+        with self._lock:
+            return [e for e in self._events if e["id"] > last_id]
+
+
+change_feed = ChangeFeed()
+
+
+def on_input_changed(key: str, path: Path):
+    # Hilo del watcher: las caches por version ya no aciertan, se sueltan para liberar memoria
+    _watched_json_cache.pop(key, None)
+    for cache_key in [k for k in _projected_json_cache if k[0] == key]:
+        _projected_json_cache.pop(cache_key, None)
+    for cache_key in [k for k in _snapshot_tokens_cache if k[0] == key]:
+        _snapshot_tokens_cache.pop(cache_key, None)
+    for book in ("long", "short"):
+        if str(crypto_book_path(book)) == key:
+            with _order_index_lock:
+                _order_index_cache.pop(book, None)
+    # SIGNALS_PATH y SNAPSHOT_PATH pueden ser el mismo fichero
+    inputs = [name for name, p in watched_inputs().items() if str(p) == key]
+    change_feed.publish(inputs, path)
+
+
 def load_portfolio():
     if not PORTFOLIO_PATH.exists():
         return {
@@ -194,39 +1084,110 @@ def load_portfolio():
         return {"capital_initial_usd": 1000, "cash_usd": 1000, "positions": [], "rules": {}}
 
 
-def load_signals_snapshot():
-    if not SIGNALS_PATH.exists():
+@lru_cache(maxsize=256)
+def _generated_at_ts(gen: str) -> float | None:
+    # un generated_at distinto por version del fichero: se parsea una sola vez
+    try:
+        return datetime.fromisoformat(gen.replace("Z", "+00:00")).timestamp()
+    except Exception:
+        return None
+
+
+def freshness_minutes(gen) -> int | None:
+    ts = _generated_at_ts(gen) if isinstance(gen, str) and gen else None
+    if ts is None:
+        return None
+    return int((time.time() - ts) // 60)
+
+
+# Campos que usa cada consumidor de los snapshots (None = documento completo)
+_PRICE_FIELDS = {"ticker": True, "regularMarketPrice": True, "lastCloseSeries": True}
+SIGNALS_PROJECTIONS = {
+    "home": {
+        "generated_at": True,
+        "macro_regime": True,
+        "top_opportunities": True,
+        "macro": JsonRows(limit=6),
+        "market": JsonRows({**_PRICE_FIELDS, "exchange": True}),
+        "news": JsonRows({"items": JsonRows({"title": True, "title_es": True, "link": True}, limit=2)}, limit=4),
+        "social": JsonRows(limit=8),
+        "earnings": JsonRows(limit=12),
+    },
+    "top": {"generated_at": True, "top_opportunities": True},
+    "prices": {"generated_at": True, "market": JsonRows(_PRICE_FIELDS)},
+}
+CRYPTO_SNAPSHOT_PROJECTIONS = {
+    "home": {
+        "generated_at": True,
+        "source": True,
+        "notes": True,
+        "top_opportunities": JsonRows(limit=10),
+        "assets": JsonRows({"ticker": True, "price_usd": True}, where=lambda a: isinstance(a, dict) and a.get("ticker") and a.get("price_usd")),
+    },
+}
+_LEADERBOARD_TOP = JsonRows(limit=10)
+MOONSHOT_PROJECTIONS = {
+    "home": {
+        "generated_at": True,
+        "combined_top": JsonRows(limit=12),
+        "stocks": JsonRows(limit=10),
+        "crypto": JsonRows(limit=10),
+        "leaderboards": {k: _LEADERBOARD_TOP for k in ("by_narrative", "by_state", "moonshot_crypto_setup", "moonshot_crypto_hour", "by_ticker")},
+    },
+}
+
+
+def _load_snapshot(path: Path, projections: dict, projection: str | None):
+    if projection is None:
+        return load_watched_json(path, None)
+    return load_projected_json(path, projections, projection, None)
+
+
+def load_signals_snapshot(projection: str | None = None):
+    if file_watcher.stat(SIGNALS_PATH) is None:
         return {"generated_at": None, "macro": [], "market": [], "news": [], "freshness_min": None}
     try:
-        data = json.loads(SIGNALS_PATH.read_text(encoding="utf-8"))
-        gen = data.get("generated_at")
-        freshness = None
-        if gen:
-            try:
-                dt = datetime.fromisoformat(gen.replace("Z", "+00:00"))
-                freshness = int((datetime.now(UTC) - dt).total_seconds() // 60)
-            except Exception:
-                freshness = None
-        data["freshness_min"] = freshness
+        data = dict(_load_snapshot(SIGNALS_PATH, SIGNALS_PROJECTIONS, projection))
+        data["freshness_min"] = freshness_minutes(data.get("generated_at"))
         return data
     except Exception:
         return {"generated_at": None, "macro": [], "market": [], "news": [], "freshness_min": None}
 
 
-def load_crypto_snapshot():
-    if not CRYPTO_SIGNALS_PATH.exists():
+_snapshot_tokens_cache: dict[tuple[str, str], tuple[str, dict]] = {}  # (ruta, tokenizer) -> (version, tamaños)
+
+
+def signals_token_sizes(tokenizer: str | None = None) -> dict:
+    """Tokens por seccion del snapshot de señales; se cuentan una vez por version del fichero."""
+    version = file_version(SIGNALS_PATH)  # antes de cargar: si cambia entre medias, el siguiente ciclo recalcula
+    tok_name = tokenizer or TOKENIZER
+    key = (str(SIGNALS_PATH), tok_name)
+    hit = _snapshot_tokens_cache.get(key)
+    if hit is not None and hit[0] == version:
+        return hit[1]
+    signals = load_signals_snapshot()
+    tok = get_tokenizer(tok_name)
+    news_titles = (
+        (it.get("title_es") or it.get("title") or "")
+        for feed in (signals.get("news") or [])
+        for it in (feed.get("items") or [])
+    )
+    sizes = {
+        "market": tok.count_pieces(json_rows_pieces(signals.get("market"))),
+        "news": tok.count_pieces(joined_pieces(news_titles)),
+        "social": tok.count_pieces(json_rows_pieces(signals.get("social"))),
+        "top": tok.count_pieces(json_rows_pieces(signals.get("top_opportunities"))),
+    }
+    _snapshot_tokens_cache[key] = (version, sizes)
+    return sizes
+
+
+def load_crypto_snapshot(projection: str | None = None):
+    if file_watcher.stat(CRYPTO_SIGNALS_PATH) is None:
         return {"generated_at": None, "assets": [], "top_opportunities": [], "freshness_min": None, "is_cache": False, "stale_reason": "sin snapshot"}
     try:
-        data = json.loads(CRYPTO_SIGNALS_PATH.read_text(encoding="utf-8"))
-        gen = data.get("generated_at")
-        freshness = None
-        if gen:
-            try:
-                dt = datetime.fromisoformat(gen.replace("Z", "+00:00"))
-                freshness = int((datetime.now(UTC) - dt).total_seconds() // 60)
-            except Exception:
-                freshness = None
-        data["freshness_min"] = freshness
+        data = dict(_load_snapshot(CRYPTO_SIGNALS_PATH, CRYPTO_SNAPSHOT_PROJECTIONS, projection))
+        data["freshness_min"] = freshness_minutes(data.get("generated_at"))
         source = str(data.get("source") or "")
         notes = str(data.get("notes") or "")
         data["is_recovered"] = source == "snapshot-recovered"
@@ -237,20 +1198,12 @@ def load_crypto_snapshot():
         return {"generated_at": None, "assets": [], "top_opportunities": [], "freshness_min": None, "is_cache": False, "stale_reason": "error leyendo snapshot"}
 
 
-def load_crypto_short_snapshot():
-    if not CRYPTO_SHORT_SIGNALS_PATH.exists():
+def load_crypto_short_snapshot(projection: str | None = None):
+    if file_watcher.stat(CRYPTO_SHORT_SIGNALS_PATH) is None:
         return {"generated_at": None, "assets": [], "top_opportunities": [], "freshness_min": None, "is_cache": False, "stale_reason": "sin snapshot"}
     try:
-        data = json.loads(CRYPTO_SHORT_SIGNALS_PATH.read_text(encoding="utf-8"))
-        gen = data.get("generated_at")
-        freshness = None
-        if gen:
-            try:
-                dt = datetime.fromisoformat(gen.replace("Z", "+00:00"))
-                freshness = int((datetime.now(UTC) - dt).total_seconds() // 60)
-            except Exception:
-                freshness = None
-        data["freshness_min"] = freshness
+        data = dict(_load_snapshot(CRYPTO_SHORT_SIGNALS_PATH, CRYPTO_SNAPSHOT_PROJECTIONS, projection))
+        data["freshness_min"] = freshness_minutes(data.get("generated_at"))
         data["is_cache"] = False
         data["stale_reason"] = ""
         return data
@@ -259,49 +1212,41 @@ def load_crypto_short_snapshot():
 
 
 def load_learning_status():
-    if not LEARNING_STATUS_PATH.exists():
+    if file_watcher.stat(LEARNING_STATUS_PATH) is None:
         return {"semaforo": "ROJO", "reason": "Sin datos suficientes", "trades_7d": 0, "expectancy_usd": 0, "profit_factor": 0}
     try:
-        d = json.loads(LEARNING_STATUS_PATH.read_text(encoding="utf-8"))
+        d = load_watched_json(LEARNING_STATUS_PATH, None)
         return d if isinstance(d, dict) else {"semaforo": "ROJO", "reason": "Formato invÃ¡lido", "trades_7d": 0}
     except Exception:
         return {"semaforo": "ROJO", "reason": "No se pudo leer learning status", "trades_7d": 0}
 
 
 def load_learning_status_short():
-    if not LEARNING_STATUS_SHORT_PATH.exists():
+    if file_watcher.stat(LEARNING_STATUS_SHORT_PATH) is None:
         return {"semaforo": "ROJO", "reason": "Sin datos suficientes", "trades_7d": 0, "expectancy_usd": 0, "profit_factor": 0}
     try:
-        d = json.loads(LEARNING_STATUS_SHORT_PATH.read_text(encoding="utf-8"))
+        d = load_watched_json(LEARNING_STATUS_SHORT_PATH, None)
         return d if isinstance(d, dict) else {"semaforo": "ROJO", "reason": "Formato invalido", "trades_7d": 0}
     except Exception:
         return {"semaforo": "ROJO", "reason": "No se pudo leer learning short", "trades_7d": 0}
 
 
-def load_moonshot_candidates():
-    if not MOONSHOT_CANDIDATES_PATH.exists():
+def load_moonshot_candidates(projection: str | None = None):
+    if file_watcher.stat(MOONSHOT_CANDIDATES_PATH) is None:
         return {"generated_at": None, "stocks": [], "crypto": [], "combined_top": [], "freshness_min": None}
     try:
-        data = json.loads(MOONSHOT_CANDIDATES_PATH.read_text(encoding="utf-8"))
-        gen = data.get("generated_at")
-        freshness = None
-        if gen:
-            try:
-                dt = datetime.fromisoformat(gen.replace("Z", "+00:00"))
-                freshness = int((datetime.now(UTC) - dt).total_seconds() // 60)
-            except Exception:
-                freshness = None
-        data["freshness_min"] = freshness
+        data = dict(_load_snapshot(MOONSHOT_CANDIDATES_PATH, MOONSHOT_PROJECTIONS, projection))
+        data["freshness_min"] = freshness_minutes(data.get("generated_at"))
         return data if isinstance(data, dict) else {"generated_at": None, "stocks": [], "crypto": [], "combined_top": [], "freshness_min": None}
     except Exception:
         return {"generated_at": None, "stocks": [], "crypto": [], "combined_top": [], "freshness_min": None}
 
 
 def load_openclaw_snapshot():
-    if not OPENCLAW_SNAPSHOT_PATH.exists():
+    if file_watcher.stat(OPENCLAW_SNAPSHOT_PATH) is None:
         return {"generated_at": None, "summary": {}, "domains": {}, "freshness": {}}
     try:
-        data = json.loads(OPENCLAW_SNAPSHOT_PATH.read_text(encoding="utf-8"))
+        data = load_watched_json(OPENCLAW_SNAPSHOT_PATH, None)
         return data if isinstance(data, dict) else {"generated_at": None, "summary": {}, "domains": {}, "freshness": {}}
     except Exception:
         return {"generated_at": None, "summary": {}, "domains": {}, "freshness": {}}
@@ -361,6 +1306,8 @@ def load_crypto_risk_config():
         "min_target_net_pct": 0.45,
         "min_expected_net_profit_usd": 0.25,
         "max_alloc_per_trade_usd": 60.0,
+        "max_var99_pct_equity": 5.0,
+        "max_ticker_weight_pct": 0,
     }
     return load_simple_risk_config(CRYPTO_RISK_PATH, default)
 
@@ -374,6 +1321,8 @@ def load_crypto_short_risk_config():
         "min_target_net_pct": 0.5,
         "min_expected_net_profit_usd": 0.25,
         "max_alloc_per_trade_usd": 60.0,
+        "max_var99_pct_equity": 5.0,
+        "max_ticker_weight_pct": 0,
     }
     return load_simple_risk_config(CRYPTO_SHORT_RISK_PATH, default)
 
@@ -436,6 +1385,11 @@ def explain_crypto_execution_blockers(candidate: dict, crypto_orders: dict, acti
             reasons.append(f"cash {round(cash,2)} insuficiente para neto minimo")
         elif required_notional > float(risk_cfg.get("max_alloc_per_trade_usd", 60.0) or 60.0):
             reasons.append(f"necesita > {round(float(risk_cfg.get('max_alloc_per_trade_usd', 60.0) or 60.0),2)} usd")
+    if cash >= min_notional:
+        alloc = min(cash, float(risk_cfg.get("max_alloc_per_trade_usd", 60.0) or 60.0))
+        risk_reason = risk_engine.entry_blocker("long", ticker, alloc, risk_cfg, float(portfolio.get("equity_usd") or cash))
+        if risk_reason:
+            reasons.append(risk_reason)
 
     if reasons:
         return {"execution_state": "NO COMPRADA", "execution_reason": "; ".join(reasons), "risk_mode_live": mode}
@@ -468,16 +1422,21 @@ def explain_crypto_short_execution_blockers(candidate: dict, crypto_orders: dict
     cash = float(portfolio.get("cash_usd") or 0)
     if cash < float(risk_cfg.get("min_notional_usd", 10.0) or 10.0):
         reasons.append("cash insuficiente")
+    else:
+        alloc = min(cash, float(risk_cfg.get("max_alloc_per_trade_usd", 60.0) or 60.0))
+        risk_reason = risk_engine.entry_blocker("short", ticker, alloc, risk_cfg, float(portfolio.get("equity_usd") or cash))
+        if risk_reason:
+            reasons.append(risk_reason)
     if reasons:
         return {"execution_state": "NO SHORT", "execution_reason": "; ".join(reasons), "risk_mode_live": mode}
     return {"execution_state": "LISTO SHORT", "execution_reason": "cumple filtros del ejecutor short", "risk_mode_live": mode}
 
 
 def load_research_panel():
-    agents = _load_json_file(RESEARCH_AGENTS_PATH, {})
-    queue = _load_json_file(RESEARCH_QUEUE_PATH, {})
-    results = _load_json_file(RESEARCH_RESULTS_PATH, {})
-    deployments = _load_json_file(RESEARCH_DEPLOYMENTS_PATH, {})
+    agents = load_watched_json(RESEARCH_AGENTS_PATH, {})
+    queue = load_watched_json(RESEARCH_QUEUE_PATH, {})
+    results = load_watched_json(RESEARCH_RESULTS_PATH, {})
+    deployments = load_watched_json(RESEARCH_DEPLOYMENTS_PATH, {})
     return {
         "agents": agents if isinstance(agents, dict) else {},
         "queue": queue if isinstance(queue, dict) else {},
@@ -487,30 +1446,30 @@ def load_research_panel():
 
 
 def load_crypto_stream_status():
-    if not CRYPTO_STREAM_STATUS_PATH.exists():
+    if file_watcher.stat(CRYPTO_STREAM_STATUS_PATH) is None:
         return {"stream_active": False, "latency_ms": None, "last_signal_sec": None}
     try:
-        d = json.loads(CRYPTO_STREAM_STATUS_PATH.read_text(encoding="utf-8"))
+        d = load_watched_json(CRYPTO_STREAM_STATUS_PATH, None)
         return d if isinstance(d, dict) else {"stream_active": False, "latency_ms": None, "last_signal_sec": None}
     except Exception:
         return {"stream_active": False, "latency_ms": None, "last_signal_sec": None}
 
 
 def load_agents_runtime():
-    if not AGENTS_RUNTIME.exists():
+    if file_watcher.stat(AGENTS_RUNTIME) is None:
         return []
     try:
-        data = json.loads(AGENTS_RUNTIME.read_text(encoding="utf-8"))
+        data = load_watched_json(AGENTS_RUNTIME, None)
         return data.get("agents", []) if isinstance(data, dict) else []
     except Exception:
         return []
 
 
 def load_sources_config():
-    if not SOURCES_CONFIG_PATH.exists():
+    if file_watcher.stat(SOURCES_CONFIG_PATH) is None:
         return {}
     try:
-        data = json.loads(SOURCES_CONFIG_PATH.read_text(encoding="utf-8"))
+        data = load_watched_json(SOURCES_CONFIG_PATH, None)
         return data if isinstance(data, dict) else {}
     except Exception:
         return {}
@@ -599,46 +1558,353 @@ def normalize_crypto_pair(ticker: str) -> str:
     return f"{raw}USDT"
 
 
-def load_trade_candles(ticker: str, opened_at: str | None, closed_at: str | None):
-    pair = normalize_crypto_pair(ticker)
-    if not pair:
-        return {"candles": [], "interval": None}
+# --- REGISTROS COMPACTOS: velas en columnas y filas de ordenes con __slots__ ---
+class CandleSeries:
+    """Velas OHLCV en arrays tipados (48 bytes/vela); a JSON solo al responder."""
+
+    __slots__ = ("t", "o", "h", "l", "c", "v")
+
+    def __init__(self):
+        self.t = array("q")
+        self.o = array("d")
+        self.h = array("d")
+        self.l = array("d")
+        self.c = array("d")
+        self.v = array("d")
+
+    def append(self, t: int, o: float, h: float, l: float, c: float, v: float = 0.0):
+        # `t` va la ultima: len() la cuenta, asi quien lee sin lock nunca ve una vela a medias
+        self.o.append(o)
+        self.h.append(h)
+        self.l.append(l)
+        self.c.append(c)
+        self.v.append(v)
+        self.t.append(t)
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    def tail(self, n: int) -> "CandleSeries":
+        end = len(self)
+        if end <= n:
+            return self
+        out = CandleSeries()
+        for name in self.__slots__:
+            setattr(out, name, getattr(self, name)[end - n:end])
+        return out
+
+    def to_json(self) -> list[dict]:
+        return [{"t": t, "o": o, "h": h, "l": l, "c": c} for t, o, h, l, c in zip(self.t, self.o, self.h, self.l, self.c)]
+
+
+@dataclass(slots=True)
+class ClosedOrderRow:
+    """Fila de orden cerrada para las tablas de la home (sin copiar el dict de la orden)."""
+
+    market: str
+    ticker: str | None
+    entry_price: object
+    exit_price: object
+    result: object
+    pnl_usd: object
+    opened_at_raw: str | None
+    closed_at_raw: str | None
+    order_id: object = None
+    order_book: str | None = None
+    order_state: str = "completed"
+    strategy_mode: str | None = None
+    opened_at: str = "-"
+    closed_at: str = "-"
+
+    @classmethod
+    def from_order(cls, order: dict, market: str, book: str | None = None):
+        pnl = order.get("pnl_usd")
+        return cls(
+            market,
+            order.get("ticker"),
+            order.get("entry_price"),
+            order.get("close_price") or order.get("exit_price"),
+            order.get("result"),
+            pnl if pnl is not None or book else order.get("pnl_usd_est"),
+            order.get("opened_at") if book else (order.get("created_at") or order.get("opened_at")),
+            order.get("closed_at"),
+            order.get("id") if book else None,
+            book,
+            "completed",
+            order.get("strategy_mode"),
+        )
 
-    opened_dt = parse_iso_utc(opened_at) or (datetime.now(UTC) - timedelta(hours=8))
-    closed_dt = parse_iso_utc(closed_at) or datetime.now(UTC)
-    trade_minutes = max(30, int((closed_dt - opened_dt).total_seconds() // 60))
-    interval = "5m" if trade_minutes <= 24 * 60 else "15m"
-    path = CRYPTO_HISTORY_DIR / f"{pair}_{interval}.csv"
-    if not path.exists() and interval == "5m":
-        interval = "15m"
-        path = CRYPTO_HISTORY_DIR / f"{pair}_{interval}.csv"
-    if not path.exists():
-        return {"candles": [], "interval": interval}
+    def format_dates(self):
+        self.opened_at = date_iso_to_es(self.opened_at_raw)
+        self.closed_at = date_iso_to_es(self.closed_at_raw)
+        return self
 
-    pad_before = timedelta(minutes=90 if interval == "5m" else 240)
-    pad_after = timedelta(minutes=90 if interval == "5m" else 240)
-    start_dt = opened_dt - pad_before
-    end_dt = closed_dt + pad_after
-    candles = []
-    with path.open(encoding="utf-8") as f:
-        for row in csv.DictReader(f):
+
+# --- HISTORIAL DE CERRADAS: los libros se escriben en orden de cierre -> merge perezoso ---
+UNIFIED_COMPLETED_ROWS = 40
+CRYPTO_COMPLETED_ROWS = 20
+_book_order_cache: dict[str, tuple[str, bool]] = {}  # ruta -> (version, ya ordenado por cierre)
+
+
+def _portfolio_closed_key(order: dict) -> str:
+    return str(order.get("closed_at") or order.get("created_at") or order.get("opened_at") or "")
+
+
+def _crypto_closed_key(order: dict) -> str:
+    return str(order.get("closed_at") or order.get("opened_at") or "")
+
+
+def _closed_row_key(row: ClosedOrderRow) -> str:
+    return str(row.closed_at_raw or row.opened_at_raw or "")
+
+
+def newest_closed_first(path: Path, rows: list, key):
+    """Itera de la mas reciente a la mas antigua; solo ordena si el libro no viene ya en orden."""
+    version = file_version(path)
+    cached = _book_order_cache.get(str(path))
+    if cached is None or cached[0] != version:
+        keys = [key(r) for r in rows if isinstance(r, dict)]
+        cached = (version, all(a <= b for a, b in zip(keys, keys[1:])))
+        _book_order_cache[str(path)] = cached
+    if cached[1]:
+        return (r for r in reversed(rows) if isinstance(r, dict))
+    return iter(sorted((r for r in rows if isinstance(r, dict)), key=key, reverse=True))
+
+
+def trade_detail_json(detail: dict) -> dict:
+    candles = detail.get("candles")
+    if isinstance(candles, CandleSeries):
+        return {**detail, "candles": candles.to_json()}
+    return detail
+
+
+# --- HISTORICO DE VELAS: CSV leidos de forma incremental + piramide 1h/4h/1d remuestreada ---
+HISTORY_INTERVAL_RE = re.compile(r"^[0-9]{1,3}[mhdw]$")
+PYRAMID_LEVELS = ("15m", "30m", "1h", "4h", "1d")
+TRADE_CHART_BARS = 180
+_INTERVAL_UNIT_MS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}
+_history_cache: dict[tuple[str, str], dict] = {}  # (par, intervalo) -> serie + offset leido del CSV
+_history_intervals_cache: dict[str, tuple[str, list[str]]] = {}  # par -> (version del dir, intervalos en disco)
+_history_pairs_cache: tuple[str | None, list[str]] = (None, [])  # (version del dir, pares con algun CSV)
+_pyramid_cache: dict[tuple[str, str], dict] = {}  # (par, nivel) -> velas cerradas + vela en curso
+_series_locks: dict[tuple, threading.Lock] = {}
+_series_locks_guard = threading.Lock()
+
+
+def series_lock(kind: str, pair: str, interval: str) -> threading.Lock:
+    """Un lock por (tipo, par, intervalo): leer-parsear-anadir o extender es atomico por serie."""
+    key = (kind, pair, interval)
+    lock = _series_locks.get(key)
+    if lock is None:
+        with _series_locks_guard:
+            lock = _series_locks.setdefault(key, threading.Lock())
+    return lock
+
+
+def interval_ms(interval: str) -> int:
+    return int(interval[:-1]) * _INTERVAL_UNIT_MS[interval[-1]]
+
+
+def load_candle_history(pair: str, interval: str) -> CandleSeries | None:
+    """Historico completo del par; si el CSV solo crece se parsean unicamente las lineas nuevas."""
+    path = CRYPTO_HISTORY_DIR / f"{pair}_{interval}.csv"
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    key = (pair, interval)
+    version = (st.st_ino, st.st_size, st.st_mtime_ns)
+    entry = _history_cache.get(key)
+    if entry is not None and entry["version"] == version:
+        return entry["series"]
+    with series_lock("history", pair, interval):
+        # stat de nuevo: otro hilo puede haber avanzado el offset mientras se esperaba el lock
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        version = (st.st_ino, st.st_size, st.st_mtime_ns)
+        entry = _history_cache.get(key)
+        if entry is not None and entry["version"] == version:
+            return entry["series"]
+        if entry is None or entry["ino"] != st.st_ino or st.st_size < entry["offset"]:
+            # fichero nuevo o reescrito (rename atomico): se relee entero
+            entry = {"ino": st.st_ino, "offset": 0, "columns": None, "series": CandleSeries(), "version": None}
+        with path.open("rb") as f:
+            f.seek(entry["offset"])
+            data = f.read(st.st_size - entry["offset"])
+        cut = data.rfind(b"\n") + 1  # una linea a medio escribir se lee en la siguiente vuelta
+        series = entry["series"]
+        for row in csv.reader(io.StringIO(data[:cut].decode("utf-8", errors="ignore"))):
+            if entry["columns"] is None:
+                entry["columns"] = {name.strip(): i for i, name in enumerate(row)}
+                continue
+            cols = entry["columns"]
             try:
-                open_ms = int(float(row.get("open_time") or 0))
-                dt = datetime.fromtimestamp(open_ms / 1000, tz=UTC)
-                if dt < start_dt:
-                    continue
-                if dt > end_dt:
-                    break
-                candles.append({
-                    "t": open_ms,
-                    "o": float(row.get("open") or 0),
-                    "h": float(row.get("high") or 0),
-                    "l": float(row.get("low") or 0),
-                    "c": float(row.get("close") or 0),
-                })
+                t = int(float(row[cols["open_time"]]))
+                if len(series) and t <= series.t[-1]:
+                    continue  # solo se anaden velas cerradas posteriores
+                series.append(
+                    t,
+                    float(row[cols["open"]] or 0),
+                    float(row[cols["high"]] or 0),
+                    float(row[cols["low"]] or 0),
+                    float(row[cols["close"]] or 0),
+                    float(row[cols["volume"]] or 0) if "volume" in cols else 0.0,
+                )
             except Exception:
                 continue
-    return {"candles": candles[-180:], "interval": interval}
+        entry["offset"] += cut
+        entry["version"] = version if cut == len(data) else None
+        _history_cache[key] = entry
+        return series
+
+
+def history_csv_version(pair: str) -> str:
+    """(ino, tamaño, mtime_ns) de cada CSV del par: cambia con cada append, el mtime del directorio no."""
+    parts = []
+    for interval in history_intervals(pair):
+        try:
+            st = (CRYPTO_HISTORY_DIR / f"{pair}_{interval}.csv").stat()
+        except OSError:
+            continue
+        parts.append(f"{interval}:{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}")
+    return ",".join(parts)
+
+
+def history_intervals(pair: str) -> list[str]:
+    """Intervalos con CSV propio para el par, del mas fino al mas grueso."""
+    version = file_version(CRYPTO_HISTORY_DIR)
+    cached = _history_intervals_cache.get(pair)
+    if cached is None or cached[0] != version:
+        found = []
+        try:
+            for p in CRYPTO_HISTORY_DIR.glob(f"{pair}_*.csv"):
+                interval = p.stem[len(pair) + 1:]
+                if HISTORY_INTERVAL_RE.match(interval):
+                    found.append(interval)
+        except OSError:
+            pass
+        cached = (version, sorted(found, key=interval_ms))
+        _history_intervals_cache[pair] = cached
+    return cached[1]
+
+
+def history_pairs() -> list[str]:
+    global _history_pairs_cache
+    version = file_version(CRYPTO_HISTORY_DIR)
+    if _history_pairs_cache[0] != version:
+        pairs = set()
+        try:
+            for p in CRYPTO_HISTORY_DIR.glob("*_*.csv"):
+                pair, _, interval = p.stem.rpartition("_")
+                if pair and HISTORY_INTERVAL_RE.match(interval):
+                    pairs.add(pair)
+        except OSError:
+            pass
+        _history_pairs_cache = (version, sorted(pairs))
+    return _history_pairs_cache[1]
+
+
+def pyramid_level(pair: str, level: str) -> dict | None:
+    """Nivel remuestreado desde el intervalo mas fino; solo se agregan las velas base nuevas."""
+    base_intervals = [i for i in history_intervals(pair) if interval_ms(i) < interval_ms(level) and interval_ms(level) % interval_ms(i) == 0]
+    if not base_intervals:
+        return None
+    base_interval = base_intervals[0]
+    base = load_candle_history(pair, base_interval)
+    if base is None:
+        return None
+    key = (pair, level)
+    with series_lock("pyramid", pair, level):
+        entry = _pyramid_cache.get(key)
+        if (entry is None or entry["base"] is not base or entry["base_interval"] != base_interval
+                or entry["processed"] > len(base)):
+            entry = {"base": base, "base_interval": base_interval, "processed": 0, "series": CandleSeries(), "partial": None}
+            _pyramid_cache[key] = entry
+        bucket_ms = interval_ms(level)
+        series, partial = entry["series"], entry["partial"]
+        end = len(base)  # la base puede crecer en otro hilo mientras se agrega
+        for i in range(entry["processed"], end):
+            bucket = base.t[i] - base.t[i] % bucket_ms
+            if partial is not None and bucket == partial[0]:
+                partial[2] = max(partial[2], base.h[i])
+                partial[3] = min(partial[3], base.l[i])
+                partial[4] = base.c[i]
+                partial[5] += base.v[i]
+                continue
+            if partial is not None:
+                series.append(*partial)  # empieza otro bucket: el anterior queda cerrado
+            partial = [bucket, base.o[i], base.h[i], base.l[i], base.c[i], base.v[i]]
+        entry["partial"] = partial
+        entry["processed"] = end
+        return entry
+
+
+def candle_series(pair: str, interval: str) -> CandleSeries | None:
+    """Velas cerradas del intervalo: CSV propio si existe, si no el nivel de la piramide."""
+    if interval in history_intervals(pair):
+        return load_candle_history(pair, interval)
+    if interval in PYRAMID_LEVELS:
+        entry = pyramid_level(pair, interval)
+        return entry["series"] if entry else None
+    return None
+
+
+def candle_window(pair: str, interval: str, start_ms: int, end_ms: int) -> CandleSeries:
+    out = CandleSeries()
+    partial = None
+    if interval in history_intervals(pair):
+        series = load_candle_history(pair, interval)
+    else:
+        entry = pyramid_level(pair, interval) if interval in PYRAMID_LEVELS else None
+        series = entry["series"] if entry else None
+        partial = entry["partial"] if entry else None
+    if series is not None:
+        lo, hi = bisect_left(series.t, start_ms), bisect_right(series.t, end_ms)
+        for name in CandleSeries.__slots__:
+            setattr(out, name, getattr(series, name)[lo:hi])
+    if partial is not None and start_ms <= partial[0] <= end_ms:
+        out.append(*partial)
+    return out
+
+
+def trade_window_ms(opened_at: str | None, closed_at: str | None) -> tuple[int, int]:
+    """Ventana del grafico del trade: apertura/cierre con un margen de max(duracion/4, 90 min)."""
+    opened_dt = parse_iso_utc(opened_at) or (datetime.now(UTC) - timedelta(hours=8))
+    closed_dt = parse_iso_utc(closed_at) or datetime.now(UTC)
+    pad = max((closed_dt - opened_dt) / 4, timedelta(minutes=90))
+    return int((opened_dt - pad).timestamp() * 1000), int((closed_dt + pad).timestamp() * 1000)
+
+
+def trade_window_complete(ticker: str, interval: str | None, opened_at: str | None, closed_at: str | None) -> bool:
+    # completa cuando ya hay una vela cerrada que abre en o tras cierre + margen (el bucket parcial no cuenta)
+    pair = normalize_crypto_pair(ticker)
+    if not pair or not interval or not parse_iso_utc(closed_at):
+        return False
+    series = candle_series(pair, interval)
+    _, end_ms = trade_window_ms(opened_at, closed_at)
+    return bool(series) and series.t[-1] >= end_ms
+
+
+def load_trade_candles(ticker: str, opened_at: str | None, closed_at: str | None):
+    pair = normalize_crypto_pair(ticker)
+    if not pair:
+        return {"candles": CandleSeries(), "interval": None}
+
+    start_ms, end_ms = trade_window_ms(opened_at, closed_at)
+
+    # Resolucion mas fina que deja la ventana en ~TRADE_CHART_BARS velas; si no hay datos, la siguiente
+    levels = sorted(set(history_intervals(pair)) | set(PYRAMID_LEVELS), key=interval_ms)
+    if not history_intervals(pair):
+        return {"candles": CandleSeries(), "interval": None}
+    fitting = [i for i in levels if (end_ms - start_ms) // interval_ms(i) <= TRADE_CHART_BARS] or levels[-1:]
+    interval = fitting[0]
+    for interval in fitting:
+        candles = candle_window(pair, interval, start_ms, end_ms)
+        if len(candles):
+            return {"candles": candles.tail(TRADE_CHART_BARS), "interval": interval}
+    return {"candles": CandleSeries(), "interval": interval}
 
 
 def build_trade_detail(order: dict, book: str, state: str):
@@ -711,12 +1977,67 @@ def build_trade_detail(order: dict, book: str, state: str):
         "pnl_usd": order.get("pnl_usd") if order.get("pnl_usd") is not None else order.get("pnl_usd_est"),
         "notional_usd": order.get("notional_usd"),
         "interval": candle_pack.get("interval"),
-        "candles": candle_pack.get("candles") or [],
+        "candles": candle_pack.get("candles") or CandleSeries(),
         "markers": markers,
         "summary": summary,
     }
 
 
+# --- DETALLE DE TRADES: indice por version del libro + cache inmutable de cerradas ---
+ORDER_DETAIL_CACHE_MAX = 2000
+ORDER_DETAIL_BATCH_MAX = 100
+_order_index_cache: dict[str, dict] = {}  # book -> {"version", "index": {(state, id): order}}
+_order_detail_cache: OrderedDict = OrderedDict()  # (book, version del libro, id) -> detalle de orden cerrada
+_order_detail_lock = threading.Lock()
+_order_index_lock = threading.Lock()  # una sola reconstruccion del indice por version del libro
+
+
+def crypto_book_path(book: str) -> Path:
+    return CRYPTO_SHORT_ORDERS_PATH if book == "short" else CRYPTO_ORDERS_PATH
+
+
+def crypto_order_index(book: str) -> dict:
+    version = file_version(crypto_book_path(book))
+    cached = _order_index_cache.get(book)
+    if cached is not None and cached["version"] == version:
+        return cached["index"]
+    with _order_index_lock:
+        # otro hilo puede haberlo reconstruido mientras se esperaba el lock
+        cached = _order_index_cache.get(book)
+        if cached is None or cached["version"] != version:
+            order_book = load_crypto_order_book(book)
+            index = {}
+            for state in ("active", "completed"):
+                for row in ((order_book.get(state) or []) if isinstance(order_book, dict) else []):
+                    if isinstance(row, dict) and row.get("id") is not None:
+                        index.setdefault((state, str(row.get("id"))), row)
+            cached = {"version": version, "index": index}
+            _order_index_cache[book] = cached
+    return cached["index"]
+
+
+def crypto_order_detail(book: str, state: str, order_id: str):
+    # la version del libro va en la clave: si se reescribe la orden, la entrada vieja deja de acertar
+    key = (book, file_version(crypto_book_path(book)), str(order_id))
+    if state == "completed":
+        with _order_detail_lock:
+            detail = _order_detail_cache.get(key)
+            if detail is not None:
+                _order_detail_cache.move_to_end(key)
+                return detail
+    order = crypto_order_index(book).get((state, str(order_id)))
+    if order is None:
+        return None
+    detail = build_trade_detail(order, book, state)
+    # Una orden cerrada no cambia; se cachea cuando las velas ya cubren la ventana completa (cierre + margen)
+    if state == "completed" and trade_window_complete(detail["ticker"], detail.get("interval"), order.get("opened_at"), order.get("closed_at")):
+        with _order_detail_lock:
+            _order_detail_cache[key] = detail
+            while len(_order_detail_cache) > ORDER_DETAIL_CACHE_MAX:
+                _order_detail_cache.popitem(last=False)
+    return detail
+
+
 def summarize_strategy_modes(rows: list[dict], short_mode_label: str = "SHORT") -> dict:
     counts = {"NORMAL": 0, "LATERAL": 0, "ALCISTA": 0, short_mode_label: 0}
     for row in rows or []:
@@ -750,10 +2071,10 @@ def append_journal(entry: dict):
 
 
 def load_agents_health():
-    if not AGENTS_HEALTH.exists():
+    if file_watcher.stat(AGENTS_HEALTH) is None:
         return []
     try:
-        data = json.loads(AGENTS_HEALTH.read_text(encoding="utf-8"))
+        data = load_watched_json(AGENTS_HEALTH, None)
         if isinstance(data, dict):
             return data.get("results", [])
         return []
@@ -762,13 +2083,10 @@ def load_agents_health():
 
 
 def minutes_since_file(path: Path):
-    try:
-        if not path.exists():
-            return None
-        m = datetime.fromtimestamp(path.stat().st_mtime, tz=UTC)
-        return int((datetime.now(UTC) - m).total_seconds() // 60)
-    except Exception:
+    m = file_watcher.mtime(path)
+    if m is None:
         return None
+    return int((time.time() - m) // 60)
 
 
 def tail_text(path: Path, lines: int = 120) -> str:
@@ -903,14 +2221,10 @@ def terminal_snapshot():
 
 def system_status():
     snap_m = minutes_since_file(SNAPSHOT_PATH)
-    auto_m = minutes_since_file(AUTOPILOT_LOG)
-    backup_m = None
-    try:
-        if BACKUP_ROOT.exists():
-            latest = max(BACKUP_ROOT.iterdir(), key=lambda p: p.stat().st_mtime)
-            backup_m = minutes_since_file(latest)
-    except Exception:
-        backup_m = None
+    # Lo mas reciente de BACKUP_ROOT (hijos y un nivel dentro) solo se recalcula con eventos del arbol
+    # El hijo mas reciente de BACKUP_ROOT solo se recalcula con eventos del directorio
+    latest = file_watcher.newest_child_mtime(BACKUP_ROOT)
+    backup_m = int((time.time() - latest) // 60) if latest is not None else None
 
     ok_core = (snap_m is not None and snap_m <= 20) and (auto_m is not None and auto_m <= 30)
     llm_ok = True
@@ -956,26 +2270,151 @@ def gpt53_limits(mode: str):
     return {"mode": "ahorro", "max_calls": 4, "max_tokens": 120000}
 
 
-def load_gpt53_budget():
-    lim = gpt53_limits(GPT53_MODE)
-    today = datetime.now(UTC).date().isoformat()
-    data = {"date": today, "calls_used": 0, "tokens_used": 0, **lim}
-    try:
-        if GPT53_BUDGET_PATH.exists():
-            raw = json.loads(GPT53_BUDGET_PATH.read_text(encoding="utf-8"))
-            if isinstance(raw, dict):
-                data.update(raw)
-        if data.get("date") != today:
-            data.update({"date": today, "calls_used": 0, "tokens_used": 0})
-        data.update(lim)
-    except Exception:
-        pass
-    return data
+# --- LEDGER DE PRESUPUESTO LLM: reservas atomicas en SQLite (BEGIN IMMEDIATE serializa a los reservadores) ---
+GPT53_BUDGET_MODEL = "gpt53"
+BUDGET_RESERVATION_TTL_S = 600
+BUDGET_LIVE_SQL = "day=? AND model=? AND (state='committed' OR (state='reserved' AND expires_at > ?))"
+_budget_lock = threading.Lock()  # en proceso se hace cola aqui; el lock de SQLite queda para otros procesos
 
 
-def save_gpt53_budget(data: dict):
-    GPT53_BUDGET_PATH.parent.mkdir(parents=True, exist_ok=True)
-    GPT53_BUDGET_PATH.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+def budget_connect():
+    # timeout: con 50 reservadores a la vez cada uno espera su turno del lock de escritura
+    return sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+
+
+def _budget_limits(conn, model: str, mode: str):
+    return conn.execute(
+        "SELECT max_calls, max_tokens FROM llm_budget_limits WHERE model=? AND mode=?", (model, mode)
+    ).fetchone()
+
+
+def _budget_spent(conn, model: str, day: str, now: str) -> tuple[int, int]:
+    row = conn.execute(f"SELECT COALESCE(SUM(calls),0), COALESCE(SUM(tokens),0) FROM llm_budget_ledger WHERE {BUDGET_LIVE_SQL}",
+                       (day, model, now)).fetchone()
+    return int(row[0]), int(row[1])
+
+
+def budget_reserve(model: str, calls: int = 1, tokens: int = 0, holder: str = "", mode: str | None = None,
+                   ttl_s: int = BUDGET_RESERVATION_TTL_S) -> tuple[int | None, str]:
+    """Reserva calls/tokens del dia si caben en el limite (modelo, modo); devuelve (id de reserva, motivo)."""
+    mode = (mode or GPT53_MODE).lower()
+    now_dt = datetime.now(UTC)
+    now, day = now_dt.isoformat(timespec="seconds").replace("+00:00", "Z"), now_dt.date().isoformat()
+    expires = (now_dt + timedelta(seconds=max(1, int(ttl_s)))).isoformat(timespec="seconds").replace("+00:00", "Z")
+    with _budget_lock:
+        return _budget_reserve_txn(model, mode, day, now, expires, int(calls), int(tokens), holder)
+
+
+def _budget_reserve_txn(model: str, mode: str, day: str, now: str, expires: str, calls: int, tokens: int, holder: str):
+    conn = budget_connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            limits = _budget_limits(conn, model, mode)
+            if limits is None:
+                conn.execute("ROLLBACK")
+                return None, "modelo_sin_limites"
+            # las reservas caducadas (agente caido) devuelven su cupo
+            conn.execute("UPDATE llm_budget_ledger SET state='expired', updated_at=? WHERE state='reserved' AND expires_at <= ?", (now, now))
+            used_calls, used_tokens = _budget_spent(conn, model, day, now)
+            if used_calls + calls > int(limits[0]):
+                conn.execute("COMMIT")
+                return None, "limite_llamadas"
+            if used_tokens + tokens > int(limits[1]):
+                conn.execute("COMMIT")
+                return None, "limite_tokens"
+            cur = conn.execute(
+                "INSERT INTO llm_budget_ledger(day, model, mode, holder, calls, tokens, state, created_at, updated_at, expires_at) "
+                "VALUES(?,?,?,?,?,?,'reserved',?,?,?)",
+                (day, model, mode, holder, calls, tokens, now, now, expires),
+            )
+            conn.execute("COMMIT")
+            return cur.lastrowid, "reservado"
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def budget_commit(reservation_id: int, tokens: int | None = None) -> bool:
+    """Confirma una reserva viva; `tokens` sustituye la estimacion por el consumo real."""
+    conn = budget_connect()
+    try:
+        cur = conn.execute(
+            "UPDATE llm_budget_ledger SET state='committed', tokens=COALESCE(?, tokens), updated_at=? "
+            "WHERE id=? AND state='reserved' AND expires_at > ?",
+            (None if tokens is None else max(0, int(tokens)), now_iso(), int(reservation_id), now_iso()),
+        )
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+
+def budget_release(reservation_id: int) -> bool:
+    conn = budget_connect()
+    try:
+        cur = conn.execute(
+            "UPDATE llm_budget_ledger SET state='released', updated_at=? WHERE id=? AND state='reserved'",
+            (now_iso(), int(reservation_id)),
+        )
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+
+def budget_status(model: str = GPT53_BUDGET_MODEL, mode: str | None = None) -> dict:
+    mode = (mode or GPT53_MODE).lower()
+    now, day = now_iso(), datetime.now(UTC).date().isoformat()
+    conn = budget_connect()
+    try:
+        limits = _budget_limits(conn, model, mode)
+        rows = conn.execute(
+            f"SELECT state, COALESCE(SUM(calls),0), COALESCE(SUM(tokens),0) FROM llm_budget_ledger WHERE {BUDGET_LIVE_SQL} GROUP BY state",
+            (day, model, now),
+        ).fetchall()
+    finally:
+        conn.close()
+    by_state = {r[0]: (int(r[1]), int(r[2])) for r in rows}
+    reserved = by_state.get("reserved", (0, 0))
+    committed = by_state.get("committed", (0, 0))
+    return {
+        "date": day,
+        "model": model,
+        "mode": mode,
+        "calls_used": reserved[0] + committed[0],
+        "tokens_used": reserved[1] + committed[1],
+        "calls_reserved": reserved[0],
+        "tokens_reserved": reserved[1],
+        "max_calls": int(limits[0]) if limits else 0,
+        "max_tokens": int(limits[1]) if limits else 0,
+    }
+
+
+def budget_hourly(model: str = GPT53_BUDGET_MODEL, day: str | None = None) -> list[dict]:
+    day = day or datetime.now(UTC).date().isoformat()
+    rows = q(
+        "SELECT CAST(substr(created_at, 12, 2) AS INTEGER) hour, SUM(calls) calls, SUM(tokens) tokens "
+        f"FROM llm_budget_ledger WHERE {BUDGET_LIVE_SQL} GROUP BY hour",
+        (day, model, now_iso()),
+    )
+    by_hour = {r["hour"]: r for r in rows}
+    curve, calls_acc, tokens_acc = [], 0, 0
+    for hour in range(24):
+        r = by_hour.get(hour)
+        calls, tokens = (int(r["calls"]), int(r["tokens"])) if r else (0, 0)
+        calls_acc += calls
+        tokens_acc += tokens
+        curve.append({"hour": hour, "calls": calls, "tokens": tokens, "calls_cum": calls_acc, "tokens_cum": tokens_acc})
+    return curve
+
+
+def load_gpt53_budget():
+    try:
+        return budget_status(GPT53_BUDGET_MODEL)
+    except Exception:
+        return {"date": datetime.now(UTC).date().isoformat(), "calls_used": 0, "tokens_used": 0, **gpt53_limits(GPT53_MODE)}
 
 
 def should_use_gpt53(top: dict, budget: dict):
@@ -997,6 +2436,68 @@ def should_use_gpt53(top: dict, budget: dict):
     return False, "no_critico"
 
 
+@app.get("/api/budget")
+def api_budget(model: str = GPT53_BUDGET_MODEL, mode: str | None = None):
+    return {**budget_status(model, mode), "hourly": budget_hourly(model)}
+
+
+@app.post("/api/budget/reserve")
+def api_budget_reserve(payload: dict = Body(...)):
+    model = str(payload.get("model") or GPT53_BUDGET_MODEL).strip()
+    try:
+        calls = max(0, int(payload.get("calls", 1)))
+        tokens = max(0, int(payload.get("tokens", 0)))
+        ttl_s = int(payload.get("ttl_s") or BUDGET_RESERVATION_TTL_S)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="calls/tokens/ttl_s invalidos")
+    mode = payload.get("mode")
+    if mode is not None and not isinstance(mode, str):
+        raise HTTPException(status_code=400, detail="mode debe ser texto")
+    reservation_id, reason = budget_reserve(model, calls, tokens, str(payload.get("holder") or ""), mode, ttl_s)
+    if reservation_id is None:
+        return JSONResponse({"ok": False, "reason": reason}, status_code=409)
+    return {"ok": True, "reservation_id": reservation_id, "reason": reason}
+
+
+@app.post("/api/budget/{reservation_id}/commit")
+def api_budget_commit(reservation_id: int, payload: dict = Body(default={})):
+    tokens = payload.get("tokens")
+    if tokens is not None and not isinstance(tokens, int):
+        raise HTTPException(status_code=400, detail="tokens debe ser entero")
+    if not budget_commit(reservation_id, tokens):
+        raise HTTPException(status_code=404, detail="reserva inexistente, caducada o ya cerrada")
+    return {"ok": True}
+
+
+@app.post("/api/budget/{reservation_id}/release")
+def api_budget_release(reservation_id: int):
+    if not budget_release(reservation_id):
+        raise HTTPException(status_code=404, detail="reserva inexistente o ya cerrada")
+    return {"ok": True}
+
+
+@app.post("/api/budget/limits")
+def api_budget_limits(payload: dict = Body(...)):
+    model = str(payload.get("model") or "").strip()
+    mode = str(payload.get("mode") or "").strip().lower()
+    try:
+        max_calls, max_tokens = int(payload["max_calls"]), int(payload["max_tokens"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="max_calls/max_tokens invalidos")
+    if not model or not mode or max_calls < 0 or max_tokens < 0:
+        raise HTTPException(status_code=400, detail="model y mode obligatorios")
+    conn = budget_connect()
+    try:
+        conn.execute(
+            "INSERT INTO llm_budget_limits(model, mode, max_calls, max_tokens) VALUES(?,?,?,?) "
+            "ON CONFLICT(model, mode) DO UPDATE SET max_calls=excluded.max_calls, max_tokens=excluded.max_tokens",
+            (model, mode, max_calls, max_tokens),
+        )
+    finally:
+        conn.close()
+    return {"ok": True, "model": model, "mode": mode, "max_calls": max_calls, "max_tokens": max_tokens}
+
+
 def load_autopilot_log(limit: int = 15):
     if not AUTOPILOT_LOG.exists():
         return []
@@ -1023,6 +2524,11 @@ def save_autopilot_entry(entry: dict):
     AUTOPILOT_LOG.write_text(json.dumps(rows[-500:], ensure_ascii=False, indent=2), encoding="utf-8")
 
 
+# Reglas de salida del simulador; el replay (/api/backtest) parte de estos mismos valores
+ORDER_TARGET_PCT = 6.0
+ORDER_STOP_PCT = 3.0
+
+
 def upsert_order_pending(ticker: str, score: int, state: str, entry_price: float | None = None):
     ORDERS_PATH.parent.mkdir(parents=True, exist_ok=True)
     orders = load_orders()
@@ -1033,8 +2539,8 @@ def upsert_order_pending(ticker: str, score: int, state: str, entry_price: float
     target_price = None
     stop_price = None
     if entry_price is not None and entry_price > 0:
-        target_price = round(entry_price * 1.06, 4)  # +6%
-        stop_price = round(entry_price * 0.97, 4)    # -3%
+        target_price = round(entry_price * (1 + ORDER_TARGET_PCT / 100), 4)
+        stop_price = round(entry_price * (1 - ORDER_STOP_PCT / 100), 4)
 
     pending.append({
         "id": f"ord_{hashlib.sha1((ticker + now_iso()).encode()).hexdigest()[:10]}",
@@ -1111,31 +2617,364 @@ def auto_close_orders_from_signals(signals: dict):
     return closed
 
 
-def latest_commits(limit: int = 6):
-    try:
-        out = subprocess.check_output(
-            ["git", "log", f"-n{limit}", "--pretty=format:%h|%ad|%s", "--date=short"],
-            cwd=str(BASE_DIR),
-            text=True,
-            stderr=subprocess.DEVNULL,
-        )
+# ===== FEED DE COMMITS (sin subprocess por render) =====
+_GIT_OBJ_TYPES = {1: b"commit", 2: b"tree", 3: b"blob", 4: b"tag"}
+
+
+class GitPack:
+    """Un .pack con su .idx (v2): busca objetos por sha y resuelve deltas (ofs/ref)."""
+
+    def __init__(self, idx_path: Path):
+        self.pack_path = idx_path.with_suffix(".pack")
+        raw = idx_path.read_bytes()
+        if raw[:4] != b"\377tOc" or int.from_bytes(raw[4:8], "big") != 2:
+            raise ValueError(f"idx no soportado: {idx_path}")
+        self._fanout = [int.from_bytes(raw[8 + i * 4:12 + i * 4], "big") for i in range(256)]
+        n = self._fanout[255]
+        base = 8 + 256 * 4
+        self._shas = raw[base:base + 20 * n]
+        self._offsets = raw[base + 24 * n:base + 28 * n]  # tras shas (20n) y crc32 (4n)
+        self._large = raw[base + 28 * n:]
+        self._n = n
+
+    def offset(self, sha: str) -> int | None:
+        key = bytes.fromhex(sha)
+        lo = self._fanout[key[0] - 1] if key[0] else 0
+        hi = self._fanout[key[0]]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cur = self._shas[mid * 20:mid * 20 + 20]
+            if cur < key:
+                lo = mid + 1
+            elif cur > key:
+                hi = mid
+            else:
+                off = int.from_bytes(self._offsets[mid * 4:mid * 4 + 4], "big")
+                if off & 0x80000000:
+                    i = off & 0x7FFFFFFF
+                    off = int.from_bytes(self._large[i * 8:i * 8 + 8], "big")
+                return off
+        return None
+
+    def read(self, offset: int, resolve_ref) -> tuple[bytes, bytes]:
+        with open(self.pack_path, "rb") as f:
+            return self._read_at(f, offset, resolve_ref)
+
+    def _read_at(self, f, offset: int, resolve_ref) -> tuple[bytes, bytes]:
+        f.seek(offset)
+        c = f.read(1)[0]
+        kind = (c >> 4) & 7
+        shift = 4
+        while c & 0x80:
+            c = f.read(1)[0]
+            shift += 7
+        if kind == 6:  # OFS_DELTA: base a una distancia negativa dentro del mismo pack
+            c = f.read(1)[0]
+            dist = c & 0x7F
+            while c & 0x80:
+                c = f.read(1)[0]
+                dist = ((dist + 1) << 7) | (c & 0x7F)
+            delta = self._inflate(f)
+            kind_name, base = self._read_at(f, offset - dist, resolve_ref)
+            return kind_name, _git_apply_delta(base, delta)
+        if kind == 7:  # REF_DELTA: base por sha (puede estar en otro pack o suelta)
+            base_sha = f.read(20).hex()
+            delta = self._inflate(f)
+            kind_name, base = resolve_ref(base_sha)
+            return kind_name, _git_apply_delta(base, delta)
+        if kind not in _GIT_OBJ_TYPES:
+            raise ValueError(f"tipo de objeto {kind} en {self.pack_path}")
+        return _GIT_OBJ_TYPES[kind], self._inflate(f)
+
+    @staticmethod
+    def _inflate(f) -> bytes:
+        d = zlib.decompressobj()
+        out = []
+        while not d.eof:
+            chunk = f.read(16384)
+            if not chunk:
+                break
+            out.append(d.decompress(chunk))
+        return b"".join(out)
+
+
+def _git_delta_varint(delta: bytes, i: int) -> tuple[int, int]:
+    value, shift = 0, 0
+    while True:
+        c = delta[i]
+        i += 1
+        value |= (c & 0x7F) << shift
+        shift += 7
+        if not c & 0x80:
+            return value, i
+
+
+def _git_apply_delta(base: bytes, delta: bytes) -> bytes:
+    _, i = _git_delta_varint(delta, 0)  # tamaño de la base
+    size, i = _git_delta_varint(delta, i)
+    out = bytearray()
+    while i < len(delta):
+        op = delta[i]
+        i += 1
+        if op & 0x80:  # copia desde la base: offset (4 bytes) y tamaño (3) segun los bits del opcode
+            off = n = 0
+            for bit in range(4):
+                if op & (1 << bit):
+                    off |= delta[i] << (8 * bit)
+                    i += 1
+            for bit in range(3):
+                if op & (1 << (4 + bit)):
+                    n |= delta[i] << (8 * bit)
+                    i += 1
+            out += base[off:off + (n or 0x10000)]
+        elif op:
+            out += delta[i:i + op]
+            i += op
+        else:
+            raise ValueError("delta corrupto")
+    if len(out) != size:
+        raise ValueError("delta con tamaño inesperado")
+    return bytes(out)
+
+
+class CommitFeed:
+    """Lee HEAD/refs/objetos (sueltos y empaquetados) de .git directamente y cachea el log hasta que HEAD cambia."""
+
+    def __init__(self, repo_dir: Path):
+        self.repo_dir = repo_dir
+        self._lock = threading.Lock()
+        self._commits: dict[str, dict] = {}  # sha -> commit parseado (inmutable)
+        self._head = None
+        self._order: list[str] = []
+        self._frontier: list = []
+        self._seen: set[str] = set()
+        self._fallback: list[dict] | None = None
+        self._packs: list[GitPack] | None = None  # se vuelven a listar cuando cambia HEAD (git gc reempaqueta)
+
+    def _git_dir(self) -> Path | None:
+        git = self.repo_dir / ".git"
+        if git.is_file():
+            # worktree / submodulo: ".git" es un fichero "gitdir: <ruta>"
+            raw = git.read_text(encoding="utf-8").strip()
+            if raw.startswith("gitdir:"):
+                git = (self.repo_dir / raw.split(":", 1)[1].strip()).resolve()
+        return git if git.is_dir() else None
+
+    def _resolve_ref(self, git_dir: Path, ref: str) -> str | None:
+        loose = git_dir / ref
+        if loose.is_file():
+            return loose.read_text(encoding="utf-8").strip() or None
+        packed = git_dir / "packed-refs"
+        if packed.is_file():
+            for line in packed.read_text(encoding="utf-8").splitlines():
+                if not line or line[0] in "#^":
+                    continue
+                sha, _, name = line.partition(" ")
+                if name.strip() == ref:
+                    return sha.strip()
+        return None
+
+    def head_sha(self) -> str | None:
+        git_dir = self._git_dir()
+        if git_dir is None:
+            return None
+        try:
+            head = (git_dir / "HEAD").read_text(encoding="utf-8").strip()
+            if head.startswith("ref:"):
+                return self._resolve_ref(git_dir, head.split(":", 1)[1].strip())
+            return head or None
+        except Exception:
+            return None
+
+    def _load_packs(self, git_dir: Path) -> list[GitPack]:
+        if self._packs is None:
+            packs = []
+            for idx in sorted((git_dir / "objects" / "pack").glob("*.idx")):
+                try:
+                    packs.append(GitPack(idx))
+                except Exception:
+                    continue
+            self._packs = packs
+        return self._packs
+
+    def _read_object(self, sha: str) -> tuple[bytes, bytes] | None:
+        git_dir = self._git_dir()
+        if git_dir is None:
+            return None
+        path = git_dir / "objects" / sha[:2] / sha[2:]
+        if path.is_file():
+            header, _, body = zlib.decompress(path.read_bytes()).partition(b"\0")
+            return header.split(b" ", 1)[0], body
+        for pack in self._load_packs(git_dir):
+            offset = pack.offset(sha)
+            if offset is not None:
+                return pack.read(offset, self._read_object_strict)
+        return None
+
+    def _read_object_strict(self, sha: str) -> tuple[bytes, bytes]:
+        obj = self._read_object(sha)
+        if obj is None:
+            raise KeyError(sha)
+        return obj
+
+    def _read_commit(self, sha: str) -> dict | None:
+        cached = self._commits.get(sha)
+        if cached is not None:
+            return cached
+        try:
+            obj = self._read_object(sha)
+        except Exception:
+            obj = None
+        if obj is None or obj[0] != b"commit":
+            return None
+        headers, _, message = obj[1].decode("utf-8", errors="replace").partition("\n\n")
+        parents = []
+        ts, date = 0, ""
+        for line in headers.splitlines():
+            if line.startswith("parent "):
+                parents.append(line[7:].strip())
+            elif line.startswith("author "):
+                # "author Nombre <mail> 1700000000 +0100" -> fecha corta en la zona del autor
+                parts = line.rsplit(" ", 2)
+                try:
+                    ts = int(parts[1])
+                    tz = parts[2]
+                    offset = (int(tz[1:3]) * 60 + int(tz[3:5])) * (-1 if tz[0] == "-" else 1)
+                    date = (datetime.fromtimestamp(ts, tz=UTC) + timedelta(minutes=offset)).date().isoformat()
+                except Exception:
+                    date = ""
+        commit = {
+            "sha": sha,
+            "hash": sha[:7],
+            "date": date,
+            "msg": (message.strip().splitlines() or [""])[0],
+            "ts": ts,
+            "parents": parents,
+        }
+        self._commits[sha] = commit
+        return commit
+
+    def _reset(self, head: str | None):
+        self._head = head
+        self._order = []
+        self._frontier = []
+        self._seen = set()
+        self._fallback = None
+        self._packs = None
+        if head:
+            commit = self._read_commit(head)
+            if commit is None:
+                self._fallback = self._git_log_fallback()
+                return
+            heapq.heappush(self._frontier, (-commit["ts"], head))
+            self._seen.add(head)
+
+    def _extend(self, upto: int):
+        # Recorrido por fecha (como "git log") que solo avanza lo que se pide
+        while len(self._order) < upto and self._frontier:
+            _, sha = heapq.heappop(self._frontier)
+            self._order.append(sha)
+            for parent in self._commits[sha]["parents"]:
+                if parent in self._seen:
+                    continue
+                self._seen.add(parent)
+                commit = self._read_commit(parent)
+                if commit is None:
+                    # objeto ilegible (pack de version no soportada, repo superficial...): git log para todo
+                    self._fallback = self._git_log_fallback()
+                    return
+                heapq.heappush(self._frontier, (-commit["ts"], parent))
+
+    def _git_log_fallback(self) -> list[dict]:
+        try:
+            out = subprocess.check_output(
+                ["git", "log", "-n500", "--pretty=format:%H|%h|%ad|%s", "--date=short"],
+                cwd=str(self.repo_dir),
+                text=True,
+                stderr=subprocess.DEVNULL,
+            )
+        except Exception:
+            return []
         rows = []
         for line in out.splitlines():
-            parts = line.split("|", 2)
-            if len(parts) == 3:
-                rows.append({"hash": parts[0], "date": parts[1], "msg": parts[2]})
+            parts = line.split("|", 3)
+            if len(parts) == 4:
+                rows.append({"sha": parts[0], "hash": parts[1], "date": parts[2], "msg": parts[3]})
         return rows
+
+    def page(self, limit: int = 6, offset: int = 0) -> dict:
+        limit = max(1, min(200, int(limit)))
+        offset = max(0, int(offset))
+        with self._lock:
+            head = self.head_sha()
+            if head != self._head:
+                self._reset(head)
+            if self._fallback is None:
+                self._extend(offset + limit + 1)  # puede pasar a fallback si un objeto no se puede leer
+            if self._fallback is not None:
+                rows = self._fallback[offset:offset + limit]
+                has_more = len(self._fallback) > offset + limit
+            else:
+                rows = [
+                    {k: self._commits[sha][k] for k in ("sha", "hash", "date", "msg")}
+                    for sha in self._order[offset:offset + limit]
+                ]
+                has_more = len(self._order) > offset + limit
+        return {
+            "head": head,
+            "commits": rows,
+            "offset": offset,
+            "limit": limit,
+            "next_offset": offset + limit if has_more else None,
+        }
+
+
+commit_feed = CommitFeed(BASE_DIR)
+
+
+def latest_commits(limit: int = 6):
+    try:
+        return commit_feed.page(limit=limit)["commits"]
     except Exception:
         return []
 
 
+@app.get("/api/commits")
+def api_commits(limit: int = 20, offset: int = 0):
+    return JSONResponse(commit_feed.page(limit=limit, offset=offset))
+
+
 @app.get("/health")
 def health():
-    return {"ok": True, "db_path": str(DB_PATH), "exists": DB_PATH.exists()}
+    ready_ms = _startup_timing.get("ready_ms")
+    return {
+        "ok": True,
+        "db_path": str(DB_PATH),
+        "exists": DB_PATH.exists(),
+        "startup": {
+            **_startup_timing,
+            "budget_ms": STARTUP_BUDGET_MS,
+            "within_budget": ready_ms is not None and ready_ms <= STARTUP_BUDGET_MS,
+            "subsystems": sorted(_registered_subsystems),
+        },
+        "providers": {name: p.stats for name, p in PROVIDERS.items()},
+        "watcher": {
+            "backend": file_watcher.backend,
+            "paths": len(file_watcher._paths),
+            "events": file_watcher.events,
+            "last_event_id": change_feed.last_id,
+        },
+        "telemetry": {**token_telemetry.stats, "pending": token_telemetry.pending()},
+        "active_tasks": len(active_tasks),
+        "risk_config_error": RISK_CONFIG_ERROR,
+    }
 
 
-@app.get("/api/summary")
-def api_summary():
+def summary_version() -> str:
+    return make_etag("summary", db_version(), file_version(PORTFOLIO_PATH), datetime.now(UTC).date())
+
+
+def summary_data():
     task_counts = q("SELECT status, COUNT(*) c FROM tasks GROUP BY status ORDER BY c DESC")
     token_by_model = q(
         "SELECT model, SUM(tokens_in) tin, SUM(tokens_out) tout, "
@@ -1169,6 +3008,208 @@ def api_summary():
     }
 
 
+@app.get("/api/summary")
+def api_summary(request: Request):
+    etag = summary_version()
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    return with_etag(JSONResponse(summary_data()), etag)
+
+
+SSE_HEARTBEAT_SECONDS = 15
+
+
+def event_input_filter(scope: str | None, inputs: str | None) -> set[str] | None:
+    """Entradas que le interesan al cliente; None = todas."""
+    if scope == "home":
+        home = {str(p) for p in HOME_INPUT_PATHS}
+        return {name for name, p in watched_inputs().items() if str(p) in home}
+    if inputs:
+        return {name.strip() for name in inputs.split(",") if name.strip()}
+    return None
+
+
+@app.get("/api/events")
+async def api_events(request: Request, scope: str | None = None, inputs: str | None = None):
+    # Server-Sent Events: un aviso por entrada cambiada (ya agrupado por el debounce del watcher)
+    wanted = event_input_filter(scope, inputs)
+    try:
+        last_id = int(request.headers.get("last-event-id") or change_feed.last_id)
+    except ValueError:
+        last_id = change_feed.last_id
+
+    async def stream():
+        nonlocal last_id
+        yield "retry: 5000\n\n"
+        idle = 0.0
+        while not await request.is_disconnected():
+            events = change_feed.since(last_id)
+            for event in events:
+                last_id = event["id"]
+                if wanted is not None:
+                    # LSTM_LOG, CRYPTO_HISTORY_DIR... cambian cada pocos segundos y no todos los clientes los pintan
+                    names = [name for name in event["inputs"] if name in wanted]
+                    if not names:
+                        continue
+                    event = {**event, "inputs": names}
+                yield f"id: {event['id']}\nevent: change\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            if events:
+                idle = 0.0
+            elif idle >= SSE_HEARTBEAT_SECONDS:
+                idle = 0.0
+                yield ": ping\n\n"
+            await asyncio.sleep(1)
+            idle += 1
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# --- PROVEEDORES HTTP: una sesion keep-alive por proveedor (timeouts, reintentos, limite y cache) ---
+class ProviderError(Exception):
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+class ProviderSession:
+    """Pool pequeno de conexiones http.client; PROVIDER_URL_<NOMBRE> redirige a un proveedor local."""
+
+    def __init__(self, name: str, base_url: str, *, timeout: float = 8.0, retries: int = 2, backoff: float = 0.5,
+                 rate_per_sec: float = 5.0, max_idle: int = 4, cache_max: int = 256):
+        parsed = urllib.parse.urlsplit(os.getenv(f"PROVIDER_URL_{name.upper()}", base_url))
+        self.name = name
+        self.scheme = parsed.scheme or "https"
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.base_path = parsed.path.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.min_interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self.max_idle = max_idle
+        self.cache_max = cache_max
+        self.headers = {"User-Agent": "agent-ops-dashboard/1.0", "Connection": "keep-alive"}
+        self.stats = {"requests": 0, "reused": 0, "retries": 0, "cache_hits": 0, "errors": 0}
+        self._idle = []
+        self._cache: OrderedDict = OrderedDict()  # ruta -> (expira, status, body)
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def _checkout(self, timeout: float):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is not None:
+            conn.timeout = timeout
+            try:
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+            except OSError:
+                conn.close()  # socket ya cerrado: se abre otra conexion
+        import http.client
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=timeout), False
+
+    def _checkin(self, conn):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _throttle(self):
+        if self.min_interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def get(self, path: str, *, cache_ttl: float = 0, timeout: float | None = None, retries: int | None = None) -> tuple[int, bytes]:
+        if cache_ttl:
+            with self._lock:
+                hit = self._cache.get(path)
+                if hit is not None and hit[0] > time.monotonic():
+                    self._cache.move_to_end(path)
+                    self.stats["cache_hits"] += 1
+                    return hit[1], hit[2]
+        timeout = timeout or self.timeout
+        retries = self.retries if retries is None else retries
+        attempt = 0
+        while True:
+            self._throttle()
+            conn, reused = self._checkout(timeout)
+            self.stats["requests"] += 1
+            status = None
+            try:
+                conn.request("GET", self.base_path + path, headers=self.headers)
+                resp = conn.getresponse()
+                body = resp.read()
+                status = resp.status
+            except Exception as exc:
+                conn.close()
+                if reused:
+                    continue  # el servidor cerro la conexion ociosa: se repite con una nueva
+                error = exc
+            else:
+                self.stats["reused"] += int(reused)
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._checkin(conn)
+                if status != 429 and status < 500:
+                    if cache_ttl and status < 400:
+                        with self._lock:
+                            self._cache[path] = (time.monotonic() + cache_ttl, status, body)
+                            while len(self._cache) > self.cache_max:
+                                self._cache.popitem(last=False)
+                    return status, body
+                error = ProviderError(f"{self.name}: HTTP {status}", status)
+            if attempt >= retries:
+                self.stats["errors"] += 1
+                raise ProviderError(f"{self.name}: {error}", status) from error
+            attempt += 1
+            self.stats["retries"] += 1
+            time.sleep(self.backoff * (2 ** (attempt - 1)))
+
+    def get_json(self, path: str, **kwargs):
+        status, body = self.get(path, **kwargs)
+        if status >= 400:
+            raise ProviderError(f"{self.name}: HTTP {status}", status)
+        return json.loads(body.decode("utf-8", errors="ignore"))
+
+    def probe(self, path: str, timeout: float = 4) -> bool:
+        try:
+            return self.get(path, timeout=timeout, retries=0)[0] < 400
+        except ProviderError:
+            return False
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+PROVIDERS = {
+    "yahoo": ProviderSession("yahoo", "https://query1.finance.yahoo.com", timeout=12),
+    "finnhub": ProviderSession("finnhub", "https://finnhub.io"),
+    "fmp": ProviderSession("fmp", "https://financialmodelingprep.com"),
+    # plan gratuito: 5 peticiones/minuto
+    "alpha_vantage": ProviderSession("alpha_vantage", "https://www.alphavantage.co", rate_per_sec=5 / 60),
+    "fred": ProviderSession("fred", "https://api.stlouisfed.org"),
+    "newsapi": ProviderSession("newsapi", "https://newsapi.org"),
+    "coingecko": ProviderSession("coingecko", "https://api.coingecko.com", rate_per_sec=0.5),
+}
+
+
+def provider(name: str) -> ProviderSession:
+    return PROVIDERS[name]
+
+
 @app.get("/api/analysis/{ticker}")
 def api_analysis(ticker: str):
     tkr = (ticker or "").upper().strip()
@@ -1197,13 +3238,10 @@ def api_analysis(ticker: str):
         except Exception:
             pass
 
-    # vela simple desde Yahoo (Ãºltimas 60)
+    # vela simple desde Yahoo (Ãºltimas 60); velas diarias: 5 min de cache bastan
     candles = []
     try:
-        url = f"https://query1.finance.yahoo.com/v8/finance/chart/{urllib.parse.quote(tkr)}?range=3mo&interval=1d"
-        req = urllib.request.Request(url, headers={"User-Agent": "agent-ops-dashboard/1.0"})
-        with urllib.request.urlopen(req, timeout=12) as r:
-            data = json.loads(r.read().decode("utf-8", errors="ignore"))
+        data = provider("yahoo").get_json(f"/v8/finance/chart/{urllib.parse.quote(tkr)}?range=3mo&interval=1d", cache_ttl=300)
         res = (((data or {}).get("chart") or {}).get("result") or [{}])[0]
         ts = res.get("timestamp") or []
         q = ((res.get("indicators") or {}).get("quote") or [{}])[0]
@@ -1224,51 +3262,881 @@ def api_analysis(ticker: str):
     confidence = (base.get("confidence_pct") if isinstance(base, dict) else None) or (base.get("score_final") if isinstance(base, dict) else None) or (base.get("score") if isinstance(base, dict) else 0) or 0
     bubble = (base.get("bubble_level") if isinstance(base, dict) else None) or "Bajo"
 
-    narrativa = (
-        f"{ctkr if crow else tkr}: confianza {confidence}%, burbuja {bubble}. "
-        f"SeÃ±ales a favor: {', '.join(reasons[:4]) if reasons else 'sin seÃ±ales fuertes'}. "
-        f"Principal objeciÃ³n: {contra}. DecisiÃ³n actual: {decision}."
-    )
+    narrativa = (
+        f"{ctkr if crow else tkr}: confianza {confidence}%, burbuja {bubble}. "
+        f"SeÃ±ales a favor: {', '.join(reasons[:4]) if reasons else 'sin seÃ±ales fuertes'}. "
+        f"Principal objeciÃ³n: {contra}. DecisiÃ³n actual: {decision}."
+    )
+
+    if crow and isinstance(crow, dict):
+        sr = crow.get("senior_report") or {}
+        tr = crow.get("technical_report") or {}
+        se = crow.get("sentiment_report") or {}
+        narrativa += (
+            f" | Setup rÃ¡pido: entrada {sr.get('setup',{}).get('entry','-')}, TP1 {sr.get('setup',{}).get('tp1','-')}, SL {sr.get('setup',{}).get('sl','-')}."
+            f" Sesgo tÃ©cnico: {tr.get('sesgo','-')}."
+            f" Catalizador: {se.get('catalizador','-')}."
+        )
+
+    return JSONResponse({
+        "ticker": tkr,
+        "price": price,
+        "entry_price": (ord_row or {}).get("entry_price"),
+        "target_price": (ord_row or {}).get("target_price"),
+        "stop_price": (ord_row or {}).get("stop_price"),
+        "decision": decision,
+        "confidence": confidence,
+        "bubble": bubble,
+        "narrativa": narrativa,
+        "candles": candles,
+    })
+
+
+@app.get("/api/crypto-order-detail/{book}/{state}/{order_id}")
+def api_crypto_order_detail(request: Request, book: str, state: str, order_id: str):
+    book = (book or "long").strip().lower()
+    state = (state or "completed").strip().lower()
+    if book not in {"long", "short"}:
+        raise HTTPException(status_code=400, detail="book invalido")
+    if state not in {"active", "completed"}:
+        raise HTTPException(status_code=400, detail="state invalido")
+    book_path = crypto_book_path(book)
+    order = crypto_order_index(book).get((state, str(order_id)))
+    pair = normalize_crypto_pair(str((order or {}).get("ticker") or ""))
+    # las activas llegan hasta "ahora": la ventana de velas cambia cada minuto
+    etag = make_etag(
+        "order", book, state, order_id, file_version(book_path),
+        file_version(CRYPTO_HISTORY_DIR), history_csv_version(pair) if pair else "",
+        datetime.now(UTC).strftime("%Y%m%d%H%M") if state == "active" else "",
+    )
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    detail = crypto_order_detail(book, state, order_id)
+    if detail is None:
+        raise HTTPException(status_code=404, detail="orden no encontrada")
+    return with_etag(JSONResponse(trade_detail_json(detail)), etag)
+
+
+@app.post("/api/crypto-order-detail/batch")
+def api_crypto_order_detail_batch(payload: dict = Body(...)):
+    items = payload.get("orders")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="orders debe ser una lista")
+    if len(items) > ORDER_DETAIL_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"como maximo {ORDER_DETAIL_BATCH_MAX} ordenes por lote")
+    details = {}
+    missing = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        book = str(item.get("book") or "long").strip().lower()
+        state = str(item.get("state") or "completed").strip().lower()
+        order_id = str(item.get("order_id") or "")
+        key = f"{book}/{state}/{order_id}"
+        if book not in {"long", "short"} or state not in {"active", "completed"}:
+            missing.append(key)
+            continue
+        detail = crypto_order_detail(book, state, order_id)
+        if detail is None:
+            missing.append(key)
+        else:
+            details[key] = trade_detail_json(detail)
+    return JSONResponse({"details": details, "missing": missing})
+
+
+# ===== INDICADORES TECNICOS (EMA, RSI, Bollinger, ATR, VWAP) sobre CRYPTO_HISTORY_DIR =====
+INDICATOR_MAX_BARS = 5000
+_indicator_state: dict[tuple[str, str], "IndicatorState"] = {}
+_indicator_payload_cache: OrderedDict = OrderedDict()  # (par, intervalo, ultima vela, limite) -> payload
+
+
+class IndicatorState:
+    """Indicadores por vela con su estado de arrastre: las velas nuevas se calculan en O(1) cada una."""
+
+    EMA_FAST, EMA_SLOW, RSI_PERIOD, BB_PERIOD, BB_K, ATR_PERIOD = 20, 50, 14, 20, 2.0, 14
+    COLUMNS = ("ema20", "ema50", "rsi14", "bb_mid", "bb_up", "bb_low", "atr14", "vwap")
+
+    def __init__(self):
+        self.n = 0
+        self.last_t = None
+        self.cols = {name: array("d") for name in self.COLUMNS}
+        self._ema = {self.EMA_FAST: [0.0, None], self.EMA_SLOW: [0.0, None]}  # periodo -> [suma inicial, ema]
+        self._gain = self._loss = 0.0
+        self._rsi_ready = False
+        self._bb_sum = self._bb_sq = 0.0
+        self._tr_sum = 0.0
+        self._atr = None
+        self._vwap_day = None
+        self._vwap_pv = self._vwap_v = 0.0
+
+    def extend(self, s: CandleSeries):
+        nan = float("nan")
+        cols = self.cols
+        end = len(s)  # la serie puede seguir creciendo en otro hilo: se procesa hasta aqui
+        for i in range(self.n, end):
+            c, h, l = s.c[i], s.h[i], s.l[i]
+            for period, st in self._ema.items():
+                if st[1] is None:
+                    st[0] += c
+                    if i == period - 1:
+                        st[1] = st[0] / period
+                else:
+                    k = 2.0 / (period + 1)
+                    st[1] = c * k + st[1] * (1 - k)
+            cols["ema20"].append(nan if self._ema[self.EMA_FAST][1] is None else self._ema[self.EMA_FAST][1])
+            cols["ema50"].append(nan if self._ema[self.EMA_SLOW][1] is None else self._ema[self.EMA_SLOW][1])
+
+            # RSI de Wilder
+            rsi = nan
+            if i > 0:
+                p = self.RSI_PERIOD
+                change = c - s.c[i - 1]
+                gain, loss = max(change, 0.0), max(-change, 0.0)
+                if not self._rsi_ready:
+                    self._gain += gain
+                    self._loss += loss
+                    if i == p:
+                        self._gain, self._loss, self._rsi_ready = self._gain / p, self._loss / p, True
+                else:
+                    self._gain = (self._gain * (p - 1) + gain) / p
+                    self._loss = (self._loss * (p - 1) + loss) / p
+                if self._rsi_ready:
+                    rsi = 100.0 if self._loss == 0 else 100.0 - 100.0 / (1.0 + self._gain / self._loss)
+            cols["rsi14"].append(rsi)
+
+            # Bollinger (media y desviacion poblacional con sumas deslizantes)
+            p = self.BB_PERIOD
+            self._bb_sum += c
+            self._bb_sq += c * c
+            if i >= p:
+                old = s.c[i - p]
+                self._bb_sum -= old
+                self._bb_sq -= old * old
+            if i >= p - 1:
+                mean = self._bb_sum / p
+                std = max(self._bb_sq / p - mean * mean, 0.0) ** 0.5
+                cols["bb_mid"].append(mean)
+                cols["bb_up"].append(mean + self.BB_K * std)
+                cols["bb_low"].append(mean - self.BB_K * std)
+            else:
+                for name in ("bb_mid", "bb_up", "bb_low"):
+                    cols[name].append(nan)
+
+            # ATR de Wilder
+            p = self.ATR_PERIOD
+            tr = h - l if i == 0 else max(h - l, abs(h - s.c[i - 1]), abs(l - s.c[i - 1]))
+            if self._atr is None:
+                self._tr_sum += tr
+                if i == p - 1:
+                    self._atr = self._tr_sum / p
+            else:
+                self._atr = (self._atr * (p - 1) + tr) / p
+            cols["atr14"].append(nan if self._atr is None else self._atr)
+
+            # VWAP de sesion (dia UTC)
+            day = s.t[i] // 86_400_000
+            if day != self._vwap_day:
+                self._vwap_day, self._vwap_pv, self._vwap_v = day, 0.0, 0.0
+            self._vwap_pv += (h + l + c) / 3.0 * s.v[i]
+            self._vwap_v += s.v[i]
+            cols["vwap"].append(self._vwap_pv / self._vwap_v if self._vwap_v > 0 else nan)
+        self.n = end
+        self.last_t = s.t[end - 1] if end else None
+
+
+def indicator_state(pair: str, interval: str, series: CandleSeries) -> IndicatorState:
+    key = (pair, interval)
+    with series_lock("indicator", pair, interval):
+        state = _indicator_state.get(key)
+        # la serie solo crece por la cola; si no coincide el punto de enganche se recalcula desde cero
+        if state is None or state.n > len(series) or (state.n and series.t[state.n - 1] != state.last_t):
+            state = IndicatorState()
+            _indicator_state[key] = state
+        if state.n < len(series):
+            state.extend(series)
+        return state
+
+
+def _json_floats(values) -> list:
+    return [None if v != v else round(v, 8) for v in values]
+
+
+def indicator_payload(pair: str, interval: str, series: CandleSeries, limit: int) -> dict:
+    key = (pair, interval, series.t[-1], limit)
+    cached = _indicator_payload_cache.get(key)
+    if cached is not None:
+        _indicator_payload_cache.move_to_end(key)
+        return cached
+    state = indicator_state(pair, interval, series)
+    start = max(0, len(series) - limit)
+    payload = {
+        "pair": pair,
+        "interval": interval,
+        "last_bar": series.t[-1],
+        "bars": len(series) - start,
+        "params": {"ema": [IndicatorState.EMA_FAST, IndicatorState.EMA_SLOW], "rsi": IndicatorState.RSI_PERIOD,
+                   "bollinger": [IndicatorState.BB_PERIOD, IndicatorState.BB_K], "atr": IndicatorState.ATR_PERIOD, "vwap": "session_utc"},
+        "t": list(series.t[start:]),
+        "close": list(series.c[start:]),
+        **{name: _json_floats(col[start:]) for name, col in state.cols.items()},
+    }
+    _indicator_payload_cache[key] = payload
+    while len(_indicator_payload_cache) > 64:
+        _indicator_payload_cache.popitem(last=False)
+    return payload
+
+
+@app.get("/api/indicators/{ticker}")
+def api_indicators(request: Request, ticker: str, interval: str = "5m", limit: int = 300):
+    pair = normalize_crypto_pair(ticker)
+    interval = (interval or "").strip()
+    if not pair or not HISTORY_INTERVAL_RE.match(interval):
+        raise HTTPException(status_code=400, detail="ticker o intervalo invalido")
+    limit = max(1, min(int(limit), INDICATOR_MAX_BARS))
+    series = candle_series(pair, interval)
+    if series is None or not len(series):
+        raise HTTPException(status_code=404, detail="sin historico para ese par/intervalo")
+    etag = make_etag("indicators", pair, interval, series.t[-1], limit)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    return with_etag(JSONResponse(indicator_payload(pair, interval, series, limit)), etag)
+
+
+# ===== REPLAY / BACKTEST de las reglas de cierre sobre CRYPTO_HISTORY_DIR =====
+BACKTEST_WORKERS = max(1, int(os.getenv("BACKTEST_WORKERS", str(os.cpu_count() or 1))))
+BACKTEST_MAX_COMBOS = 400
+BACKTEST_INLINE_PAIRS = 2  # con menos pares no hay nada que repartir
+# Arrancar el pool (spawn + importar la app en cada hijo) cuesta segundos; en linea van ~100k velas/s y
+# apenas depende del numero de combinaciones (las velas sin nuevo maximo/minimo se saltan)
+BACKTEST_INLINE_BARS = int(os.getenv("BACKTEST_INLINE_BARS", "500000"))
+BACKTEST_STAT_KEYS = ("trades", "ganadas", "perdidas", "timeouts", "abiertas", "ambiguas", "bars")
+_backtest_lock = threading.Lock()
+
+
+def _new_backtest_stats() -> dict:
+    return {**{k: 0 for k in BACKTEST_STAT_KEYS}, "sum_ret": 0.0, "gross_win": 0.0, "gross_loss": 0.0, "best": None, "worst": None}
+
+
+def _record_exit(st: dict, result: str, ret: float, bars: int):
+    st["trades"] += 1
+    st[result] += 1
+    st["bars"] += bars
+    st["sum_ret"] += ret
+    if ret > 0:
+        st["gross_win"] += ret
+    else:
+        st["gross_loss"] -= ret
+    st["best"] = ret if st["best"] is None else max(st["best"], ret)
+    st["worst"] = ret if st["worst"] is None else min(st["worst"], ret)
+
+
+def replay_entry(series: CandleSeries, start: int, entry_price: float, combos: list, max_hold_bars: int, stats: list):
+    """Una entrada contra todas las combinaciones objetivo/stop en una sola pasada por las velas.
+
+    Fills con maximo/minimo intrabar (o la apertura si abre con hueco). Si una vela toca objetivo y
+    stop a la vez no se sabe el orden: se cuenta el stop y se marca como ambigua.
+    """
+    o, h, l = series.o, series.h, series.l
+    n = len(series)
+    end = n if max_hold_bars <= 0 else min(n, start + max_hold_bars)
+    pending = [(k, entry_price * (1 + tp / 100), entry_price * (1 - sp / 100)) for k, (tp, sp) in enumerate(combos)]
+    hi = lo = entry_price
+    for i in range(start, end):
+        hb, lb = h[i], l[i]
+        if hb <= hi and lb >= lo:
+            continue  # sin nuevo maximo ni minimo no puede saltar ninguna combinacion pendiente
+        hi, lo = max(hi, hb), min(lo, lb)
+        still = []
+        for k, target, stop in pending:
+            if lb <= stop:
+                if hb >= target:
+                    stats[k]["ambiguas"] += 1
+                _record_exit(stats[k], "perdidas", (min(o[i], stop) / entry_price - 1) * 100, i - start + 1)
+            elif hb >= target:
+                _record_exit(stats[k], "ganadas", (max(o[i], target) / entry_price - 1) * 100, i - start + 1)
+            else:
+                still.append((k, target, stop))
+        pending = still
+        if not pending:
+            return
+    if max_hold_bars > 0 and start + max_hold_bars <= n:
+        ret = (series.c[end - 1] / entry_price - 1) * 100
+        for k, _, _ in pending:
+            _record_exit(stats[k], "timeouts", ret, end - start)
+    else:
+        for k, _, _ in pending:
+            stats[k]["abiertas"] += 1  # sin velas suficientes: ni gana ni pierde todavia
+
+
+def backtest_pair(job: dict) -> dict:
+    """Trabajo por par (se ejecuta en un proceso del pool): carga su historico y reproduce las entradas."""
+    combos = [tuple(c) for c in job["combos"]]
+    stats = [_new_backtest_stats() for _ in combos]
+    series = candle_series(job["pair"], job["interval"])
+    out = {"pair": job["pair"], "interval": job["interval"], "bars": len(series) if series else 0, "entries": 0, "stats": stats}
+    if not series or len(series) < 2:
+        return out
+    t, c = series.t, series.c
+    if job.get("entries") is not None:
+        starts = []
+        for ts, price in job["entries"]:
+            start = bisect_right(t, ts)  # la vela que contiene la entrada ya tiene maximo/minimo previos
+            if ts >= t[0] and start < len(t) and price > 0:
+                starts.append((start, price))
+    else:
+        every = max(1, int(job.get("every_bars") or 1))
+        starts = [(k + 1, c[k]) for k in range(every - 1, len(t) - 1, every) if c[k] > 0]
+    for start, price in starts:
+        replay_entry(series, start, float(price), combos, int(job.get("max_hold_bars") or 0), stats)
+    out["entries"] = len(starts)
+    return out
+
+
+def backtest_order_entries() -> dict[str, list]:
+    """Entradas reales del simulador y del libro cripto largo, agrupadas por par con historico."""
+    entries: dict[str, list] = {}
+    orders = load_orders()
+    book = load_crypto_orders()
+    rows = [(o, o.get("created_at")) for o in orders.get("pending", []) + orders.get("completed", [])]
+    rows += [(o, o.get("opened_at")) for o in book.get("active", []) + book.get("completed", [])]
+    for o, opened in rows:
+        if not isinstance(o, dict):
+            continue
+        dt = parse_iso_utc(opened)
+        try:
+            price = float(o.get("entry_price") or 0)
+        except (TypeError, ValueError):
+            price = 0.0
+        pair = normalize_crypto_pair(o.get("ticker"))
+        if dt is None or price <= 0 or not pair:
+            continue
+        entries.setdefault(pair, []).append((int(dt.timestamp() * 1000), price))
+    return entries
+
+
+def backtest_combos(targets, stops) -> list[tuple[float, float]]:
+    combos = {(ORDER_TARGET_PCT, ORDER_STOP_PCT)}  # la regla en vivo siempre entra como referencia
+    for tp in targets or []:
+        for sp in stops or []:
+            if float(tp) > 0 and 0 < float(sp) < 100:
+                combos.add((round(float(tp), 4), round(float(sp), 4)))
+    return sorted(combos)
+
+
+def history_bars_estimate(pair: str, interval: str) -> int:
+    """Velas del CSV a partir de su tamaño y la longitud de las primeras lineas, sin parsearlo."""
+    path = CRYPTO_HISTORY_DIR / f"{pair}_{interval}.csv"
+    try:
+        size = path.stat().st_size
+        with path.open("rb") as f:
+            head = f.read(4096)
+    except OSError:
+        return 0
+    lines = head.count(b"\n")
+    return size * lines // len(head) if lines else 0
+
+
+def backtest_inline(jobs: list[dict]) -> bool:
+    if len(jobs) < BACKTEST_INLINE_PAIRS or BACKTEST_WORKERS == 1:
+        return True
+    return sum(history_bars_estimate(j["pair"], j["interval"]) for j in jobs) < BACKTEST_INLINE_BARS
+
+
+def run_backtest_jobs(jobs: list[dict]) -> tuple[list[dict], int]:
+    """Resultados por par y procesos usados (1 = en linea)."""
+    if backtest_inline(jobs):
+        return [backtest_pair(j) for j in jobs], 1
+    # spawn: los hijos no heredan hilos (watcher, cron) ni conexiones abiertas del servidor
+    ctx = multiprocessing.get_context("spawn")
+    workers = min(BACKTEST_WORKERS, len(jobs))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        return list(pool.map(backtest_pair, jobs, chunksize=max(1, len(jobs) // (workers * 4)))), workers
+
+
+def backtest_report(params: dict, combos: list, results: list[dict], skipped: list[str], elapsed_s: float, workers: int = 1) -> dict:
+    totals = [_new_backtest_stats() for _ in combos]
+    for res in results:
+        for st, add in zip(totals, res["stats"]):
+            for key in (*BACKTEST_STAT_KEYS, "sum_ret", "gross_win", "gross_loss"):
+                st[key] += add[key]
+            for key, pick in (("best", max), ("worst", min)):
+                if add[key] is not None:
+                    st[key] = add[key] if st[key] is None else pick(st[key], add[key])
+    rows = []
+    for (tp, sp), st in zip(combos, totals):
+        n = st["trades"]
+        rows.append({
+            "target_pct": tp,
+            "stop_pct": sp,
+            "baseline": (tp, sp) == (ORDER_TARGET_PCT, ORDER_STOP_PCT),
+            **{k: st[k] for k in BACKTEST_STAT_KEYS if k != "bars"},
+            "win_rate": round(st["ganadas"] / n * 100, 2) if n else None,
+            "avg_return_pct": round(st["sum_ret"] / n, 4) if n else None,
+            "total_return_pct": round(st["sum_ret"], 4),
+            "profit_factor": round(st["gross_win"] / st["gross_loss"], 3) if st["gross_loss"] else None,
+            "avg_bars_held": round(st["bars"] / n, 1) if n else None,
+            "best_pct": round(st["best"], 4) if st["best"] is not None else None,
+            "worst_pct": round(st["worst"], 4) if st["worst"] is not None else None,
+        })
+    base = next((r for r in rows if r["baseline"]), None)
+    for r in rows:
+        r["delta_total_vs_baseline"] = round(r["total_return_pct"] - base["total_return_pct"], 4) if base else None
+    rows.sort(key=lambda r: r["total_return_pct"], reverse=True)
+    return {
+        "params": params,
+        "elapsed_s": round(elapsed_s, 3),
+        "workers": workers,
+        "pairs": [{"pair": r["pair"], "interval": r["interval"], "bars": r["bars"], "entries": r["entries"]} for r in results],
+        "skipped_no_history": skipped,
+        "combos": rows,
+    }
+
+
+def _run_backtest(run_id: int, params: dict):
+    status, report, error = "done", None, None
+    started = time.perf_counter()
+    try:
+        combos = backtest_combos(params.get("targets"), params.get("stops"))
+        pairs = history_pairs()
+        if params.get("pairs"):
+            pairs = [p for p in pairs if p in {normalize_crypto_pair(x) for x in params["pairs"]}]
+        by_pair = backtest_order_entries() if params["source"] == "orders" else None
+        skipped = sorted(set(by_pair) - set(pairs)) if by_pair is not None else []
+        jobs = []
+        for pair in pairs:
+            if by_pair is not None and pair not in by_pair:
+                continue
+            available = history_intervals(pair)
+            interval = params.get("interval") or (available[0] if available else None)
+            if not interval:
+                continue
+            jobs.append({
+                "pair": pair,
+                "interval": interval,
+                "combos": combos,
+                "entries": by_pair[pair] if by_pair is not None else None,
+                "every_bars": params["every_bars"],
+                "max_hold_bars": params["max_hold_bars"],
+            })
+        results, workers = run_backtest_jobs(jobs)
+        report = backtest_report(params, combos, results, skipped, time.perf_counter() - started, workers)
+    except Exception as exc:
+        status, error = "error", str(exc)[:500]
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            conn.execute(
+                "UPDATE backtest_runs SET status=?, report=?, error=?, finished_at=? WHERE id=?",
+                (status, json.dumps(report, ensure_ascii=False) if report is not None else None, error, now_iso(), run_id),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    finally:
+        _backtest_lock.release()
+
+
+@app.post("/api/backtest/run")
+def api_backtest_run(payload: dict = Body(default={})):
+    source = str(payload.get("source") or "orders").strip().lower()
+    interval = str(payload.get("interval") or "").strip()
+    if source not in {"orders", "cadence"} or (interval and not HISTORY_INTERVAL_RE.match(interval)):
+        raise HTTPException(status_code=400, detail="source (orders|cadence) o intervalo invalido")
+    try:
+        targets = [float(x) for x in payload.get("targets") or [ORDER_TARGET_PCT]]
+        stops = [float(x) for x in payload.get("stops") or [ORDER_STOP_PCT]]
+        every_bars = max(1, int(payload.get("every_bars") or 24))
+        max_hold_bars = max(0, int(payload.get("max_hold_bars") or 0))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="targets/stops/every_bars/max_hold_bars invalidos")
+    if len(targets) * len(stops) > BACKTEST_MAX_COMBOS:
+        raise HTTPException(status_code=400, detail=f"maximo {BACKTEST_MAX_COMBOS} combinaciones")
+    pairs = payload.get("pairs")
+    params = {
+        "source": source,
+        "interval": interval or None,
+        "targets": targets,
+        "stops": stops,
+        "every_bars": every_bars,
+        "max_hold_bars": max_hold_bars,
+        "pairs": [str(p) for p in pairs] if isinstance(pairs, list) else None,
+    }
+    if not _backtest_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="ya hay un backtest en curso")
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            cur = conn.execute(
+                "INSERT INTO backtest_runs(status, params, created_at) VALUES('running', ?, ?)",
+                (json.dumps(params, ensure_ascii=False), now_iso()),
+            )
+            conn.commit()
+            run_id = cur.lastrowid
+        finally:
+            conn.close()
+        threading.Thread(target=_run_backtest, args=(run_id, params), name=f"backtest-{run_id}", daemon=True).start()
+    except Exception:
+        _backtest_lock.release()
+        raise
+    return {"ok": True, "run_id": run_id, "status": "running"}
+
+
+@app.get("/api/backtest/runs")
+def api_backtest_runs(limit: int = 20):
+    rows = q(
+        "SELECT id, status, params, error, created_at, finished_at FROM backtest_runs ORDER BY id DESC LIMIT ?",
+        (max(1, min(int(limit), 200)),),
+    )
+    return {"runs": [{**dict(r), "params": json.loads(r["params"] or "{}")} for r in rows]}
+
+
+@app.get("/api/backtest/report")
+def api_backtest_report(request: Request, run_id: int | None = None):
+    if run_id is None:
+        rows = q("SELECT id, status, report, error, finished_at FROM backtest_runs WHERE status='done' ORDER BY id DESC LIMIT 1")
+    else:
+        rows = q("SELECT id, status, report, error, finished_at FROM backtest_runs WHERE id=?", (int(run_id),))
+    if not rows:
+        raise HTTPException(status_code=404, detail="backtest no encontrado")
+    row = rows[0]
+    etag = make_etag("backtest", row["id"], row["status"], row["finished_at"])
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    payload = {"run_id": row["id"], "status": row["status"], "error": row["error"], "finished_at": row["finished_at"]}
+    if row["report"]:
+        payload.update(json.loads(row["report"]))
+    return with_etag(JSONResponse(payload), etag)
+
+
+# ===== NAVEGADOR DE TAREAS (keyset + FTS5) =====
+TASK_BROWSER_COLUMNS = (
+    "id, task_id, status, assigned_by, assigned_to, title, details, priority, source, "
+    "created_at, updated_at, start_at, due_at, next_check_at"
+)
+# Tareas escritas desde fuera pueden no tener updated_at: NULL pagina como '' (al final), nunca se pierde
+TASK_UPDATED_KEY = "COALESCE(updated_at, '')"
+_tasks_fts_available = None
+
+
+def tasks_fts_available(conn) -> bool:
+    global _tasks_fts_available
+    if _tasks_fts_available is None:
+        _tasks_fts_available = bool(conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='tasks_fts'"
+        ).fetchone())
+    return _tasks_fts_available
+
+
+def encode_task_cursor(updated_at: str | None, row_id: int) -> str:
+    raw = json.dumps([updated_at or "", int(row_id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_task_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, row_id = json.loads(raw)
+        return str(updated_at), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="cursor invalido")
+
+
+def fts_query(text: str) -> str:
+    # Cada palabra como frase con prefijo: evita errores de sintaxis FTS5
+    terms = [t for t in (text or "").split() if t]
+    return " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+
+
+@app.get("/api/tasks")
+def api_tasks(
+    status: str | None = None,
+    assigned_to: str | None = None,
+    priority: str | None = None,
+    source: str | None = None,
+    search: str | None = None,
+    cursor: str | None = None,
+    limit: int = 50,
+):
+    limit = max(1, min(500, int(limit)))
+    where = []
+    params: list = []
+    for col, value in (("status", status), ("assigned_to", assigned_to), ("priority", priority), ("source", source)):
+        if value:
+            where.append(f"{col} = ?")
+            params.append(value)
+    conn = db_connect_readonly()
+    try:
+        if search and search.strip():
+            if tasks_fts_available(conn):
+                where.append("id IN (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ?)")
+                params.append(fts_query(search))
+            else:
+                where.append("(title LIKE ? OR details LIKE ?)")
+                params.extend([f"%{search.strip()}%"] * 2)
+        if cursor:
+            updated_at, row_id = decode_task_cursor(cursor)
+            # la cota simple delante deja a SQLite buscar en el indice de expresion en vez de recorrerlo
+            where.append(f"{TASK_UPDATED_KEY} <= ? AND ({TASK_UPDATED_KEY}, id) < (?, ?)")
+            params.extend([updated_at, updated_at, row_id])
+        sql = f"SELECT {TASK_BROWSER_COLUMNS} FROM tasks"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {TASK_UPDATED_KEY} DESC, id DESC LIMIT ?"
+        rows = [dict(r) for r in conn.execute(sql, (*params, limit + 1)).fetchall()]
+    finally:
+        conn.close()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "tasks": rows,
+        "limit": limit,
+        "next_cursor": encode_task_cursor(rows[-1]["updated_at"], rows[-1]["id"]) if has_more and rows else None,
+    }
+
 
-    if crow and isinstance(crow, dict):
-        sr = crow.get("senior_report") or {}
-        tr = crow.get("technical_report") or {}
-        se = crow.get("sentiment_report") or {}
-        narrativa += (
-            f" | Setup rÃ¡pido: entrada {sr.get('setup',{}).get('entry','-')}, TP1 {sr.get('setup',{}).get('tp1','-')}, SL {sr.get('setup',{}).get('sl','-')}."
-            f" Sesgo tÃ©cnico: {tr.get('sesgo','-')}."
-            f" Catalizador: {se.get('catalizador','-')}."
-        )
+# ===== EXPORT API (NDJSON/CSV en streaming) =====
+EXPORT_BATCH_SIZE = 1000
+EXPORT_SQL_SOURCES = {
+    "tasks": ("tasks", "updated_at"),
+    "token_usage": ("token_usage", "recorded_at"),
+}
 
-    return JSONResponse({
-        "ticker": tkr,
-        "price": price,
-        "entry_price": (ord_row or {}).get("entry_price"),
-        "target_price": (ord_row or {}).get("target_price"),
-        "stop_price": (ord_row or {}).get("stop_price"),
-        "decision": decision,
-        "confidence": confidence,
-        "bubble": bubble,
-        "narrativa": narrativa,
-        "candles": candles,
-    })
 
+def db_connect_readonly():
+    # Conexion de solo lectura: un export nunca toma un lock de escritura
+    conn = sqlite3.connect(f"file:{urllib.parse.quote(DB_PATH.as_posix(), safe='/:')}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def iter_sql_export(table: str, time_col: str, since: str | None, until: str | None, limit: int | None):
+    """Filas en lotes keyset por id: cada lote es una lectura corta, memoria constante."""
+    last_id = 0
+    sent = 0
+    while True:
+        where = ["id > ?"]
+        params: list = [last_id]
+        if since:
+            where.append(f"{time_col} >= ?")
+            params.append(since)
+        if until:
+            where.append(f"{time_col} < ?")
+            params.append(until)
+        batch = EXPORT_BATCH_SIZE if limit is None else min(EXPORT_BATCH_SIZE, limit - sent)
+        if batch <= 0:
+            return
+        # una conexion por lote: StreamingResponse puede reanudar el generador en otro hilo del threadpool
+        conn = db_connect_readonly()
+        try:
+            rows = conn.execute(
+                f"SELECT * FROM {table} WHERE {' AND '.join(where)} ORDER BY id LIMIT ?",
+                (*params, batch),
+            ).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return
+        for row in rows:
+            yield dict(row)
+        sent += len(rows)
+        last_id = rows[-1]["id"]
+
+
+def sql_export_columns(table: str) -> list[str]:
+    conn = db_connect_readonly()
+    try:
+        return [r["name"] for r in conn.execute(f"PRAGMA table_info({table})")]
+    finally:
+        conn.close()
 
-@app.get("/api/crypto-order-detail/{book}/{state}/{order_id}")
-def api_crypto_order_detail(book: str, state: str, order_id: str):
-    book = (book or "long").strip().lower()
-    state = (state or "completed").strip().lower()
-    if book not in {"long", "short"}:
-        raise HTTPException(status_code=400, detail="book invalido")
-    if state not in {"active", "completed"}:
-        raise HTTPException(status_code=400, detail="state invalido")
 
-    order_book = load_crypto_order_book(book)
-    rows = (order_book.get(state) or []) if isinstance(order_book, dict) else []
-    order = next((row for row in rows if str(row.get("id") or "") == str(order_id)), None)
-    if not order:
-        raise HTTPException(status_code=404, detail="orden no encontrada")
-    return JSONResponse(build_trade_detail(order, book, state))
+def export_columns(rows: list[dict]) -> list[str]:
+    # libros de acciones y cripto tienen claves distintas: cabecera con la union, en orden de aparicion
+    seen = {}
+    for row in rows:
+        for key in row:
+            seen.setdefault(key, None)
+    return list(seen)
+
+
+def _in_range(ts, since: str | None, until: str | None) -> bool:
+    ts = str(ts or "")
+    if since and ts < since:
+        return False
+    if until and ts >= until:
+        return False
+    return True
+
+
+def iter_orders_export(since: str | None, until: str | None):
+    books = [
+        ("stocks", load_orders(), ("pending", "completed")),
+        ("crypto_long", load_crypto_orders(), ("active", "completed")),
+        ("crypto_short", load_crypto_order_book("short"), ("active", "completed")),
+    ]
+    for book, data, states in books:
+        for state in states:
+            for order in (data.get(state) or []):
+                if not isinstance(order, dict):
+                    continue
+                ts = order.get("closed_at") or order.get("opened_at") or order.get("created_at")
+                if _in_range(ts, since, until):
+                    yield {"book": book, "book_state": state, **order}
+
+
+def iter_journal_export(since: str | None, until: str | None):
+    for entry in load_journal():
+        if isinstance(entry, dict) and _in_range(entry.get("ts"), since, until):
+            yield entry
+
+
+def _encode_ndjson(rows):
+    buf = []
+    for row in rows:
+        buf.append(json.dumps(row, ensure_ascii=False, default=str))
+        if len(buf) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(buf) + "\n"
+            buf = []
+    if buf:
+        yield "\n".join(buf) + "\n"
+
+
+def _encode_csv(rows, columns: list[str]):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    pending = 0
+    for row in rows:
+        writer.writerow({k: (json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v) for k, v in row.items()})
+        pending += 1
+        if pending >= EXPORT_BATCH_SIZE:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+            pending = 0
+    if out.getvalue():
+        yield out.getvalue()
+
+
+@app.get("/api/export/{dataset}")
+def api_export(dataset: str, format: str = "ndjson", since: str | None = None, until: str | None = None, limit: int | None = None):
+    dataset = (dataset or "").strip().lower()
+    fmt = (format or "ndjson").strip().lower()
+    if fmt not in {"ndjson", "csv"}:
+        raise HTTPException(status_code=400, detail="format invalido")
+    if limit is not None and limit < 0:
+        raise HTTPException(status_code=400, detail="limit invalido")
+    if dataset in EXPORT_SQL_SOURCES:
+        table, time_col = EXPORT_SQL_SOURCES[dataset]
+        rows = iter_sql_export(table, time_col, since, until, limit)
+        columns = sql_export_columns(table) if fmt == "csv" else None
+    elif dataset in {"orders", "journal"}:
+        # los JSON ya estan en memoria: se recorren una vez para la union de columnas
+        source = iter_orders_export(since, until) if dataset == "orders" else iter_journal_export(since, until)
+        rows = list(islice(source, limit))
+        columns = export_columns(rows)
+    else:
+        raise HTTPException(status_code=404, detail="dataset desconocido")
+    if fmt == "csv":
+        return StreamingResponse(
+            _encode_csv(rows, columns), media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{dataset}.csv"'},
+        )
+    return StreamingResponse(_encode_ndjson(rows), media_type="application/x-ndjson")
+
+
+# ===== INDICE DE FINGERPRINTS ACTIVOS (dedupe de tareas sin consultar SQLite) =====
+class ActiveTaskIndex:
+    """fingerprint -> task_ids en pending/running. Se recarga cuando cambia la base (otro proceso o esta misma app)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_fp: dict[str, set[str]] = {}
+        self._fp_of: dict[str, str] = {}  # task_id -> fingerprint
+        self._unsettled: dict[str, str] = {}  # reservas aun sin commit: sobreviven a las recargas
+        self._conn = None  # conexion propia de solo lectura, usada con el lock tomado
+        self._version = None  # PRAGMA data_version de la ultima carga
+
+    def _data_version_locked(self) -> int:
+        # data_version cambia con cada commit de cualquier otra conexion (de este proceso o de otro)
+        # y no depende de mtime/tamaño del fichero ni del debounce de file_watcher
+        if self._conn is None:
+            self._conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        return self._conn.execute("PRAGMA data_version").fetchall()[0][0]
+
+    def _reload_locked(self) -> int:
+        self._version = self._data_version_locked()  # antes de leer: un commit posterior fuerza otra recarga
+        rows = self._conn.execute(
+            "SELECT task_id, fingerprint FROM tasks WHERE status IN ('pending','running') AND fingerprint IS NOT NULL"
+        ).fetchall()
+        self._by_fp, self._fp_of = {}, {}
+        for task_id, fp in [*rows, *self._unsettled.items()]:
+            self._by_fp.setdefault(fp, set()).add(task_id)
+            self._fp_of[task_id] = fp
+        return len(rows)
+
+    def _sync_locked(self):
+        if self._version is None or self._version != self._data_version_locked():
+            self._reload_locked()
+
+    def load(self) -> int:
+        with self._lock:
+            return self._reload_locked()
+
+    def __contains__(self, fp: str) -> bool:
+        with self._lock:
+            self._sync_locked()
+            return fp in self._by_fp
+
+    def __len__(self) -> int:
+        return len(self._fp_of)
+
+    def claim(self, fp: str, task_id: str) -> bool:
+        """Comprueba y reserva en un paso: dos escritores a la vez no pueden crear el mismo fingerprint."""
+        with self._lock:
+            self._sync_locked()
+            if fp in self._by_fp:
+                return False
+            self._by_fp[fp] = {task_id}
+            self._fp_of[task_id] = fp
+            self._unsettled[task_id] = fp
+            return True
+
+    def add(self, task_id: str, fp: str | None):
+        if not fp:
+            return
+        with self._lock:
+            self._by_fp.setdefault(fp, set()).add(task_id)
+            self._fp_of[task_id] = fp
+            self._unsettled[task_id] = fp
+
+    def settle(self, *task_ids: str):
+        """Tras el commit: la base ya refleja estas tareas y la siguiente recarga las trae de alli."""
+        with self._lock:
+            for task_id in task_ids:
+                self._unsettled.pop(task_id, None)
+
+    def discard(self, *task_ids: str):
+        with self._lock:
+            for task_id in task_ids:
+                self._unsettled.pop(task_id, None)
+                fp = self._fp_of.pop(task_id, None)
+                ids = self._by_fp.get(fp)
+                if ids is not None:
+                    ids.discard(task_id)
+                    if not ids:
+                        del self._by_fp[fp]
+
+    def fingerprints(self) -> set[str]:
+        with self._lock:
+            return set(self._by_fp)
+
+
+active_tasks = ActiveTaskIndex()
 
 
 @app.post("/tasks/create")
@@ -1284,22 +4152,22 @@ def create_task(
         priority = "media"
     details = f"[conviction:{conviction}] creada desde dashboard"
     fp = fingerprint(title, details)
+    task_id = f"tsk_{hashlib.sha1((title + now_iso()).encode()).hexdigest()[:10]}"
+    if not active_tasks.claim(fp, task_id):
+        return RedirectResponse(url="/", status_code=303)
     conn = sqlite3.connect(DB_PATH)
     try:
-        cur = conn.cursor()
-        row = cur.execute(
-            "SELECT task_id FROM tasks WHERE fingerprint=? AND status IN ('pending','running')",
-            (fp,),
-        ).fetchone()
-        if not row:
-            task_id = f"tsk_{hashlib.sha1((title + now_iso()).encode()).hexdigest()[:10]}"
-            ts = now_iso()
-            cur.execute(
-                "INSERT INTO tasks(task_id,title,details,assigned_by,assigned_to,status,fingerprint,source,created_at,updated_at,priority,start_at,due_at,next_check_at) "
-                "VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
-                (task_id, title, details, "fernando", assigned_to, "pending", fp, "dashboard", ts, ts, priority, ts, None, None),
-            )
-            conn.commit()
+        ts = now_iso()
+        conn.execute(
+            "INSERT INTO tasks(task_id,title,details,assigned_by,assigned_to,status,fingerprint,source,created_at,updated_at,priority,start_at,due_at,next_check_at) "
+            "VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            (task_id, title, details, "fernando", assigned_to, "pending", fp, "dashboard", ts, ts, priority, ts, None, None),
+        )
+        conn.commit()
+        active_tasks.settle(task_id)
+    except Exception:
+        active_tasks.discard(task_id)
+        raise
     finally:
         conn.close()
     return RedirectResponse(url="/", status_code=303)
@@ -1313,11 +4181,25 @@ def update_task_status(task_id: str = Form(...), status: str = Form(...)):
 
     conn = sqlite3.connect(DB_PATH)
     try:
+        # IMMEDIATE: el indice se toca con el lock de escritura cogido, en el mismo orden que los commits
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT fingerprint FROM tasks WHERE task_id=?", (task_id,)).fetchone()
         conn.execute(
             "UPDATE tasks SET status=?, updated_at=? WHERE task_id=?",
             (status, now_iso(), task_id),
         )
+        if row:
+            if status in {"pending", "running"}:
+                active_tasks.add(task_id, row[0])
+            else:
+                active_tasks.discard(task_id)
         conn.commit()
+        active_tasks.settle(task_id)
+    except Exception:
+        conn.rollback()
+        active_tasks.settle(task_id)
+        active_tasks.load()
+        raise
     finally:
         conn.close()
     return RedirectResponse(url="/", status_code=303)
@@ -1330,7 +4212,7 @@ def complete_order(order_id: str = Form(...)):
     completed = orders.get("completed", [])
 
     # Precio actual desde snapshot para calcular resultado automÃ¡tico
-    signals = load_signals_snapshot()
+    signals = load_signals_snapshot("prices")
     market = signals.get("market", []) if isinstance(signals, dict) else []
     price_map = {}
     for m in market:
@@ -1431,8 +4313,16 @@ def kill_switch():
     
     conn = sqlite3.connect(DB_PATH)
     try:
+        conn.execute("BEGIN IMMEDIATE")
+        # solo las filas ya escritas: las reservas de inserts en curso siguen activas
+        cancelled = [r[0] for r in conn.execute("SELECT task_id FROM tasks WHERE status IN ('pending', 'running')")]
         conn.execute("UPDATE tasks SET status='cancelled', updated_at=? WHERE status IN ('pending', 'running')", (now_iso(),))
+        active_tasks.discard(*cancelled)
         conn.commit()
+    except Exception:
+        conn.rollback()
+        active_tasks.load()
+        raise
     finally:
         conn.close()
     return RedirectResponse(url="/?kill=activated", status_code=303)
@@ -1440,10 +4330,11 @@ def kill_switch():
 
 @app.post("/signals/autotasks")
 def create_tasks_from_top(threshold: int = Form(60), assigned_to: str = Form("alpha-scout")):
-    signals = load_signals_snapshot()
+    signals = load_signals_snapshot("top")
     top = signals.get("top_opportunities", []) if isinstance(signals, dict) else []
     conn = sqlite3.connect(DB_PATH)
     created = 0
+    claimed = []
     try:
         cur = conn.cursor()
         for o in top:
@@ -1454,13 +4345,10 @@ def create_tasks_from_top(threshold: int = Form(60), assigned_to: str = Form("al
             title = f"Analizar oportunidad {ticker} (score {score})"
             details = f"[conviction:4] auto desde top_opportunities score>={threshold}"
             fp = fingerprint(title, details)
-            row = cur.execute(
-                "SELECT task_id FROM tasks WHERE fingerprint=? AND status IN ('pending','running')",
-                (fp,),
-            ).fetchone()
-            if row:
-                continue
             task_id = f"tsk_{hashlib.sha1((title + now_iso()).encode()).hexdigest()[:10]}"
+            if not active_tasks.claim(fp, task_id):
+                continue
+            claimed.append(task_id)
             ts = now_iso()
             cur.execute(
                 "INSERT INTO tasks(task_id,title,details,assigned_by,assigned_to,status,fingerprint,source,created_at,updated_at,priority) "
@@ -1469,6 +4357,10 @@ def create_tasks_from_top(threshold: int = Form(60), assigned_to: str = Form("al
             )
             created += 1
         conn.commit()
+        active_tasks.settle(*claimed)
+    except Exception:
+        active_tasks.discard(*claimed)
+        raise
     finally:
         conn.close()
     return RedirectResponse(url=f"/?created={created}", status_code=303)
@@ -1493,13 +4385,15 @@ def autopilot_run(threshold: int = Form(60), assigned_to: str = Form("alpha-scou
     top = signals.get("top_opportunities", []) if isinstance(signals, dict) else []
     gpt53_budget = load_gpt53_budget()
     gpt53_allowed, gpt53_reason = should_use_gpt53(top[0] if top else None, gpt53_budget)
-    # Reserva de presupuesto cuando el caso cumple umbral crÃ­tico
+    # Reserva de presupuesto cuando el caso cumple umbral crÃ­tico (atomica: otro ciclo a la vez no puede pasarse)
+    gpt53_reservation = None
     if gpt53_allowed:
-        gpt53_budget["calls_used"] = int(gpt53_budget.get("calls_used", 0)) + 1
-        gpt53_budget["tokens_used"] = int(gpt53_budget.get("tokens_used", 0)) + 6000
-        save_gpt53_budget(gpt53_budget)
+        gpt53_reservation, reserve_reason = budget_reserve(GPT53_BUDGET_MODEL, calls=1, tokens=6000, holder="autopilot")
+        if gpt53_reservation is None:
+            gpt53_allowed, gpt53_reason = False, reserve_reason
     created = 0
     orders_created = 0
+    claimed = []
     conn = sqlite3.connect(DB_PATH)
     try:
         cur = conn.cursor()
@@ -1516,17 +4410,14 @@ def autopilot_run(threshold: int = Form(60), assigned_to: str = Form("alpha-scou
             title = f"[AUTO] Ejecutar plan {ticker} (score {score})"
             details = f"[conviction:4] auto-autopilot score>={threshold} reasons={','.join(o.get('reasons', []))}"
             fp = fingerprint(title, details)
-            row = cur.execute(
-                "SELECT task_id FROM tasks WHERE fingerprint=? AND status IN ('pending','running')",
-                (fp,),
-            ).fetchone()
-            if row:
+            task_id = f"tsk_{hashlib.sha1((title + now_iso()).encode()).hexdigest()[:10]}"
+            if not active_tasks.claim(fp, task_id):
                 # Aunque la tarea ya exista, en modo simulador intentamos abrir orden si aplica
                 if state in {"WATCH", "READY", "TRIGGERED"}:
                     if upsert_order_pending(ticker, score, state, entry_price):
                         orders_created += 1
                 continue
-            task_id = f"tsk_{hashlib.sha1((title + now_iso()).encode()).hexdigest()[:10]}"
+            claimed.append(task_id)
             ts = now_iso()
             # prÃ³ximo ciclo aprox cada 15 minutos
             now_dt = datetime.now(UTC)
@@ -1549,28 +4440,31 @@ def autopilot_run(threshold: int = Form(60), assigned_to: str = Form("alpha-scou
                 if upsert_order_pending(ticker, score, state, entry_price):
                     orders_created += 1
 
-        # TelemetrÃ­a de tokens por actor (estimada) para entorno local/offline
-        market_blob = " ".join(json.dumps(x, ensure_ascii=False) for x in (signals.get("market") or []))
-        news_blob = " ".join(
-            (it.get("title_es") or it.get("title") or "")
-            for feed in (signals.get("news") or [])
-            for it in (feed.get("items") or [])
-        )
-        social_blob = " ".join(json.dumps(x, ensure_ascii=False) for x in (signals.get("social") or []))
-        top_blob = " ".join(json.dumps(x, ensure_ascii=False) for x in top)
-
-        register_token_usage(cur, "deterministic/rules", "macro-agent", approx_tokens(market_blob) // 4, 80)
-        register_token_usage(cur, "deterministic/rules", "technical-agent", approx_tokens(market_blob) // 2, 120)
-        register_token_usage(cur, "deterministic/rules", "news-catalyst-agent", approx_tokens(news_blob), 110)
-        register_token_usage(cur, "deterministic/rules", "risk-exec-agent", approx_tokens(social_blob), 70)
-        register_token_usage(cur, "deterministic/rules", "devil-advocate-agent", approx_tokens(top_blob), 95)
+        # TelemetrÃ­a de tokens por actor (estimada): tamaños cacheados por version del snapshot
+        sizes = signals_token_sizes()
+        register_token_usage(cur, "deterministic/rules", "macro-agent", sizes["market"] // 4, 80)
+        register_token_usage(cur, "deterministic/rules", "technical-agent", sizes["market"] // 2, 120)
+        register_token_usage(cur, "deterministic/rules", "news-catalyst-agent", sizes["news"], 110)
+        register_token_usage(cur, "deterministic/rules", "risk-exec-agent", sizes["social"], 70)
+        register_token_usage(cur, "deterministic/rules", "devil-advocate-agent", sizes["top"], 95)
         if gpt53_allowed:
             register_token_usage(cur, "ollama/qwen3:8b", "local-council-agent", 3200, 900)
-        register_token_usage(cur, "deterministic/rules", assigned_to, approx_tokens(top_blob), 140 + created * 25)
+        register_token_usage(cur, "deterministic/rules", assigned_to, sizes["top"], 140 + created * 25)
 
         conn.commit()
+        active_tasks.settle(*claimed)
+        claimed = []
+        if gpt53_reservation is not None:
+            budget_commit(gpt53_reservation, tokens=3200 + 900)
+            gpt53_reservation = None
+    except Exception:
+        active_tasks.discard(*claimed)  # sin commit las tareas no existen: se liberan sus fingerprints
+        raise
     finally:
         conn.close()
+        if gpt53_reservation is not None:
+            budget_release(gpt53_reservation)  # el ciclo fallo antes de consumir la reserva
+    gpt53_budget = load_gpt53_budget()
 
     closed_orders = auto_close_orders_from_signals(signals)
 
@@ -1591,21 +4485,101 @@ def autopilot_run(threshold: int = Form(60), assigned_to: str = Form("alpha-scou
     return RedirectResponse(url=f"/?autopilot_created={created}", status_code=303)
 
 
+# --- ESTADO EN DIRECTO POR AGENTE: una consulta por version de la tabla tasks ---
+AGENT_STATUS_ES = {"running": "trabajando", "pending": "en espera", "done": "terminado", "blocked": "bloqueado"}
+AGENT_TASK_RULES = [
+    (re.compile(r"qqq"), "analizando el ETF tecnolÃ³gico principal de EE.UU."),
+    (re.compile(r"nvda"), "analizando NVIDIA por posible oportunidad"),
+    (re.compile(r"msft"), "analizando Microsoft por posible oportunidad"),
+    (re.compile(r"executar plan|ejecutar plan|\[auto\]"), "evaluando si conviene abrir una operaciÃ³n simulada"),
+]
+AGENT_TASK_DEFAULT = "revisando seÃ±ales del mercado"
+_latest_task_cache = {"version": None, "rows": {}}
+
+
+def latest_task_by_assignee() -> dict:
+    version = db_version()
+    if _latest_task_cache["version"] != version:
+        rows = q(
+            "SELECT assigned_to, status, title, updated_at FROM ("
+            " SELECT assigned_to, status, title, updated_at,"
+            " ROW_NUMBER() OVER (PARTITION BY assigned_to ORDER BY updated_at DESC, id DESC) rn"
+            " FROM tasks WHERE assigned_to IS NOT NULL"
+            ") WHERE rn = 1"
+        )
+        _latest_task_cache["rows"] = {r["assigned_to"]: dict(r) for r in rows}
+        _latest_task_cache["version"] = version
+    return _latest_task_cache["rows"]
+
+
+def describe_agent_task(title: str) -> str:
+    title = (title or "").lower()
+    for pattern, text in AGENT_TASK_RULES:
+        if pattern.search(title):
+            return text
+    return AGENT_TASK_DEFAULT
+
+
+def build_agent_live(agents_runtime) -> list[dict]:
+    try:
+        latest = latest_task_by_assignee()
+    except Exception:
+        return []
+    agent_live = []
+    for a in agents_runtime:
+        aid = a.get("id")
+        row = latest.get(aid)
+        if row:
+            st = row["status"]
+            st_es = AGENT_STATUS_ES.get(st, st)
+            text = f"{aid}: {st_es}; {describe_agent_task(row['title'])}. Ãšltima actualizaciÃ³n: {row['updated_at']}"
+        else:
+            text = f"{aid}: en espera de nuevas seÃ±ales del mercado"
+        agent_live.append({"agent": aid, "text": text})
+    return agent_live
+
+
+HOME_INPUT_PATHS = [
+    SIGNALS_PATH, CRYPTO_SIGNALS_PATH, CRYPTO_SHORT_SIGNALS_PATH, CRYPTO_STREAM_STATUS_PATH,
+    LEARNING_STATUS_PATH, LEARNING_STATUS_SHORT_PATH, MOONSHOT_CANDIDATES_PATH, OPENCLAW_SNAPSHOT_PATH,
+    RESEARCH_AGENTS_PATH, RESEARCH_QUEUE_PATH, RESEARCH_RESULTS_PATH, RESEARCH_DEPLOYMENTS_PATH,
+    CRYPTO_ORDERS_PATH, CRYPTO_SHORT_ORDERS_PATH, CRYPTO_RISK_PATH, CRYPTO_SHORT_RISK_PATH,
+    AUTOPILOT_LOG, AGENTS_RUNTIME, AGENTS_HEALTH, SOURCES_CONFIG_PATH, ORDERS_PATH, JOURNAL_PATH,
+    SNAPSHOT_PATH, BACKUP_ROOT, PRICE_WAREHOUSE_PATH, STOCK_WAREHOUSE_PATH, TRADING_JOURNAL_DB_PATH,
+]
+
+
+def home_version() -> str:
+    # La home muestra frescuras en minutos: el minuto actual forma parte de la version
+    return make_etag(
+        "home",
+        summary_version(),
+        *(file_version(p) for p in HOME_INPUT_PATHS),
+        commit_feed.head_sha(),
+        _api_probe_cache["last_check"],
+        datetime.now(UTC).strftime("%Y%m%d%H%M"),
+    )
+
+
 @app.get("/", response_class=HTMLResponse)
 def home(request: Request):
-    data = api_summary()
+    etag = home_version()
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    data = summary_data()
     portfolio = data["portfolio"]
     positions = portfolio.get("positions", [])
     cash_usd = float(portfolio.get("cash_usd", 0))
     market_value = sum(float(p.get("notional_usd", 0)) for p in positions if p.get("status") == "active")
     equity = cash_usd + market_value
-    signals = load_signals_snapshot()
-    crypto_signals = load_crypto_snapshot()
-    crypto_short_signals = load_crypto_short_snapshot()
+    signals = load_signals_snapshot("home")
+    crypto_signals = load_crypto_snapshot("home")
+    crypto_short_signals = load_crypto_short_snapshot("home")
     crypto_stream = load_crypto_stream_status()
     learning_status = load_learning_status()
     learning_status_short = load_learning_status_short()
-    moonshot = load_moonshot_candidates()
+    moonshot = load_moonshot_candidates("home")
     openclaw_snapshot = load_openclaw_snapshot()
     research_panel = load_research_panel()
     crypto_orders = load_crypto_orders()
@@ -1619,40 +4593,7 @@ def home(request: Request):
     orders = load_orders()
 
     # Estado "en directo" por agente (lenguaje natural)
-    agent_live = []
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        for a in agents_runtime:
-            aid = a.get("id")
-            row = cur.execute(
-                "SELECT status,title,updated_at FROM tasks WHERE assigned_to=? ORDER BY updated_at DESC LIMIT 1",
-                (aid,),
-            ).fetchone()
-            if row:
-                st = row["status"]
-                st_es = "trabajando" if st == "running" else ("en espera" if st == "pending" else ("terminado" if st == "done" else ("bloqueado" if st == "blocked" else st)))
-                title = (row["title"] or "").lower()
-
-                if "qqq" in title:
-                    tarea_humana = "analizando el ETF tecnolÃ³gico principal de EE.UU."
-                elif "nvda" in title:
-                    tarea_humana = "analizando NVIDIA por posible oportunidad"
-                elif "msft" in title:
-                    tarea_humana = "analizando Microsoft por posible oportunidad"
-                elif "executar plan" in title or "ejecutar plan" in title or "[auto]" in title:
-                    tarea_humana = "evaluando si conviene abrir una operaciÃ³n simulada"
-                else:
-                    tarea_humana = "revisando seÃ±ales del mercado"
-
-                text = f"{aid}: {st_es}; {tarea_humana}. Ãšltima actualizaciÃ³n: {row['updated_at']}"
-            else:
-                text = f"{aid}: en espera de nuevas seÃ±ales del mercado"
-            agent_live.append({"agent": aid, "text": text})
-        conn.close()
-    except Exception:
-        pass
+    agent_live = build_agent_live(agents_runtime)
     pending_orders = orders.get("pending", [])
     completed_orders = orders.get("completed", [])
     journal = load_journal()
@@ -1731,17 +4672,8 @@ def home(request: Request):
     except Exception:
         pass
 
-    def api_probe(url: str, timeout: int = 4):
-        try:
-            req = urllib.request.Request(url, headers={"User-Agent": "agent-ops-dashboard/1.0"})
-            with urllib.request.urlopen(req, timeout=timeout) as r:
-                return (r.getcode() or 200) < 400
-        except Exception:
-            return False
-
     # --- API PROBE CACHEADO: solo re-probar cada 5 minutos ---
-    import time as _time
-    now_ts = _time.time()
+    now_ts = time.time()
     if now_ts - _api_probe_cache["last_check"] > _api_probe_cache["ttl_seconds"]:
         finnhub_k = os.getenv("FINNHUB_API_KEY", "").strip()
         fmp_k = os.getenv("FMP_API_KEY", "").strip()
@@ -1751,12 +4683,12 @@ def home(request: Request):
         cg_k = os.getenv("COINGECKO_API_KEY", "").strip()
 
         _api_probe_cache["status"] = {
-            "FINNHUB": ("OK" if (finnhub_k and api_probe(f"https://finnhub.io/api/v1/quote?symbol=AAPL&token={urllib.parse.quote(finnhub_k)}")) else ("FALTA" if not finnhub_k else "ERROR")),
-            "FMP": ("OK" if (fmp_k and api_probe(f"https://financialmodelingprep.com/stable/quote?symbol=AAPL&apikey={urllib.parse.quote(fmp_k)}")) else ("FALTA" if not fmp_k else "ERROR")),
-            "ALPHA_VANTAGE": ("OK" if (av_k and api_probe(f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=IBM&apikey={urllib.parse.quote(av_k)}")) else ("FALTA" if not av_k else "ERROR")),
-            "FRED": ("OK" if (fred_k and api_probe(f"https://api.stlouisfed.org/fred/series/observations?series_id=DGS10&api_key={urllib.parse.quote(fred_k)}&file_type=json&limit=1")) else ("FALTA" if not fred_k else "ERROR")),
-            "NEWSAPI": ("OK" if (news_k and api_probe(f"https://newsapi.org/v2/top-headlines?country=us&pageSize=1&apiKey={urllib.parse.quote(news_k)}")) else ("FALTA" if not news_k else "ERROR")),
-            "COINGECKO": ("OK" if api_probe(f"https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd{('&x_cg_demo_api_key=' + urllib.parse.quote(cg_k)) if cg_k else ''}") else "ERROR"),
+            "FINNHUB": ("OK" if (finnhub_k and provider("finnhub").probe(f"/api/v1/quote?symbol=AAPL&token={urllib.parse.quote(finnhub_k)}")) else ("FALTA" if not finnhub_k else "ERROR")),
+            "FMP": ("OK" if (fmp_k and provider("fmp").probe(f"/stable/quote?symbol=AAPL&apikey={urllib.parse.quote(fmp_k)}")) else ("FALTA" if not fmp_k else "ERROR")),
+            "ALPHA_VANTAGE": ("OK" if (av_k and provider("alpha_vantage").probe(f"/query?function=GLOBAL_QUOTE&symbol=IBM&apikey={urllib.parse.quote(av_k)}")) else ("FALTA" if not av_k else "ERROR")),
+            "FRED": ("OK" if (fred_k and provider("fred").probe(f"/fred/series/observations?series_id=DGS10&api_key={urllib.parse.quote(fred_k)}&file_type=json&limit=1")) else ("FALTA" if not fred_k else "ERROR")),
+            "NEWSAPI": ("OK" if (news_k and provider("newsapi").probe(f"/v2/top-headlines?country=us&pageSize=1&apiKey={urllib.parse.quote(news_k)}")) else ("FALTA" if not news_k else "ERROR")),
+            "COINGECKO": ("OK" if provider("coingecko").probe(f"/api/v3/simple/price?ids=bitcoin&vs_currencies=usd{('&x_cg_demo_api_key=' + urllib.parse.quote(cg_k)) if cg_k else ''}") else "ERROR"),
             "OPENINSIDER": "OK",
             "YAHOO_OPTIONS": "OK",
             "FINVIZ": "OK",
@@ -1792,15 +4724,17 @@ def home(request: Request):
     crypto_short_unrealized = 0.0
     crypto_short_realized = 0.0
 
-    for c in (crypto_signals.get("top_opportunities", []) or []):
-        if not isinstance(c, dict):
-            continue
-        c.update(explain_crypto_execution_blockers(c, crypto_orders, active_crypto_tickers, crypto_risk_cfg))
-
-    for c in (crypto_short_signals.get("top_opportunities", []) or []):
-        if not isinstance(c, dict):
-            continue
-        c.update(explain_crypto_short_execution_blockers(c, crypto_short_orders, active_crypto_short_tickers, crypto_short_risk_cfg))
+    # Los bloqueos de ejecucion consultan el motor de riesgo (VaR/concentracion tras la entrada)
+    risk_engine.sync()
+    # Los snapshots vienen de la cache compartida: se anotan copias, no los originales
+    crypto_signals["top_opportunities"] = [
+        {**c, **explain_crypto_execution_blockers(c, crypto_orders, active_crypto_tickers, crypto_risk_cfg)} if isinstance(c, dict) else c
+        for c in (crypto_signals.get("top_opportunities", []) or [])
+    ]
+    crypto_short_signals["top_opportunities"] = [
+        {**c, **explain_crypto_short_execution_blockers(c, crypto_short_orders, active_crypto_short_tickers, crypto_short_risk_cfg)} if isinstance(c, dict) else c
+        for c in (crypto_short_signals.get("top_opportunities", []) or [])
+    ]
 
     # Calculamos PnL realizado
     for c in crypto_completed:
@@ -1814,60 +4748,21 @@ def home(request: Request):
         except Exception:
             pass
 
-    # Preparamos órdenes completadas unificadas (USANDO FECHAS ORIGINALES PARA ORDENAR)
-    unified_completed_orders = []
-    for o in completed_orders:
-        unified_completed_orders.append({
-            "market": "Cartera",
-            "ticker": o.get("ticker"),
-            "entry_price": o.get("entry_price"),
-            "exit_price": o.get("close_price") or o.get("exit_price"),
-            "result": o.get("result"),
-            "pnl_usd": o.get("pnl_usd") if o.get("pnl_usd") is not None else o.get("pnl_usd_est"),
-            "opened_at_raw": o.get("created_at") or o.get("opened_at"),
-            "closed_at_raw": o.get("closed_at"),
-        })
-
-    for o in crypto_completed:
-        unified_completed_orders.append({
-            "market": "Cripto",
-            "ticker": o.get("ticker"),
-            "order_id": o.get("id"),
-            "order_book": "long",
-            "order_state": "completed",
-            "entry_price": o.get("entry_price"),
-            "exit_price": o.get("close_price") or o.get("exit_price"),
-            "result": o.get("result"),
-            "pnl_usd": o.get("pnl_usd"),
-            "opened_at_raw": o.get("opened_at"),
-            "closed_at_raw": o.get("closed_at"),
-        })
-
-    # Ordenar por fecha de cierre (descendente)
-    def _sort_key(row):
-        return str(row.get("closed_at_raw") or row.get("opened_at_raw") or "")
-    unified_completed_orders = sorted(unified_completed_orders, key=_sort_key, reverse=True)
-
-    # Ahora formateamos las fechas para el display
-    for o in unified_completed_orders:
-        o["opened_at"] = date_iso_to_es(o.get("opened_at_raw"))
-        o["closed_at"] = date_iso_to_es(o.get("closed_at_raw"))
-
-    # También formateamos las listas específicas de cripto (reversas para ver las últimas arriba)
-    crypto_completed_view = []
-    for c in crypto_completed[::-1]:
-        # Creamos una copia para no alterar el objeto original si se usa en otros sitios
-        c_view = dict(c)
-        c_view["opened_at"] = date_iso_to_es(c.get("opened_at"))
-        c_view["closed_at"] = date_iso_to_es(c.get("closed_at"))
-        crypto_completed_view.append(c_view)
-
-    crypto_short_completed_view = []
-    for c in crypto_short_completed[::-1]:
-        c_view = dict(c)
-        c_view["opened_at"] = date_iso_to_es(c.get("opened_at"))
-        c_view["closed_at"] = date_iso_to_es(c.get("closed_at"))
-        crypto_short_completed_view.append(c_view)
+    # Ordenes completadas unificadas (USANDO FECHAS ORIGINALES PARA ORDENAR): top-K perezoso,
+    # solo se construyen y formatean las filas que se muestran
+    unified_completed_orders = [
+        row.format_dates()
+        for row in islice(heapq.merge(
+            (ClosedOrderRow.from_order(o, "Cartera") for o in newest_closed_first(ORDERS_PATH, completed_orders, _portfolio_closed_key)),
+            (ClosedOrderRow.from_order(o, "Cripto", "long") for o in newest_closed_first(CRYPTO_ORDERS_PATH, crypto_completed, _crypto_closed_key)),
+            key=_closed_row_key,
+            reverse=True,
+        ), UNIFIED_COMPLETED_ROWS)
+    ]
+
+    # Listas especificas de cripto: las ultimas cerradas arriba (solo las filas visibles)
+    crypto_completed_view = [ClosedOrderRow.from_order(c, "Cripto", "long").format_dates() for c in islice(reversed(crypto_completed), CRYPTO_COMPLETED_ROWS)]
+    crypto_short_completed_view = [ClosedOrderRow.from_order(c, "Cripto", "short").format_dates() for c in islice(reversed(crypto_short_completed), CRYPTO_COMPLETED_ROWS)]
 
     for o in crypto_active:
         try:
@@ -1896,7 +4791,7 @@ def home(request: Request):
             o["pnl_usd_est"] = None
 
     quant_data = []
-    quant_path = Path(os.getenv("PRICE_WAREHOUSE_PATH", "C:/Users/Fernando/.openclaw/workspace/memory/price_warehouse.csv"))
+    quant_path = PRICE_WAREHOUSE_PATH
     try:
         if quant_path.exists():
             with open(quant_path, newline='', encoding='utf-8') as f:
@@ -1907,7 +4802,7 @@ def home(request: Request):
         pass
 
     stock_quant_data = []
-    stock_quant_path = Path(os.getenv("STOCK_WAREHOUSE_PATH", "C:/Users/Fernando/.openclaw/workspace/memory/stock_price_warehouse.csv"))
+    stock_quant_path = STOCK_WAREHOUSE_PATH
     try:
         if stock_quant_path.exists():
             with open(stock_quant_path, newline='', encoding='utf-8') as f:
@@ -1918,7 +4813,7 @@ def home(request: Request):
         pass
 
     rag_journal = []
-    journal_db = Path("C:/Users/Fernando/.openclaw/workspace/skills/trading-journal/journal_db.json")
+    journal_db = TRADING_JOURNAL_DB_PATH
     try:
         if journal_db.exists():
             jdata = json.loads(journal_db.read_text(encoding="utf-8"))
@@ -1934,7 +4829,7 @@ def home(request: Request):
     except Exception:
         pass
 
-    return templates.TemplateResponse(
+    response = get_templates().TemplateResponse(
         "index.html",
         {
             "request": request,
@@ -1960,10 +4855,12 @@ def home(request: Request):
             "research_panel": research_panel,
             "crypto_orders_active": crypto_active,
             "crypto_orders_completed": crypto_completed_view,
+            "crypto_orders_completed_count": len(crypto_completed),
             "crypto_active_mode_counts": crypto_active_mode_counts,
             "crypto_completed_mode_counts": crypto_completed_mode_counts,
             "crypto_short_orders_active": crypto_short_active,
             "crypto_short_orders_completed": crypto_short_completed_view,
+            "crypto_short_orders_completed_count": len(crypto_short_completed),
             "crypto_short_active_mode_counts": crypto_short_active_mode_counts,
             "crypto_short_completed_mode_counts": crypto_short_completed_mode_counts,
             "crypto_daily": crypto_orders.get("daily", {}),
@@ -1989,7 +4886,7 @@ def home(request: Request):
             "orders_pending": pre_entry_orders,
             "orders_active": active_orders,
             "orders_completed": completed_orders,
-            "unified_completed_orders": unified_completed_orders[:40],
+            "unified_completed_orders": unified_completed_orders,
             "quant_data": quant_data[:100],
             "stock_quant_data": stock_quant_data[:100],
             "rag_journal": rag_journal[:50],
@@ -2011,9 +4908,9 @@ def home(request: Request):
             "gpt53_budget": data.get("gpt53_budget", {"mode": "ahorro", "calls_used": 0, "max_calls": 4}),
         },
     )
+    return with_etag(response, etag)
 
 # ===== BEGIN_LSTM_REAL_SAFE =====
-import re
 
 BASE_LSTM = Path(r"C:\Users\Fernando\.openclaw\workspace\proyectos\analisis-mercados")
 LSTM_LOG = BASE_LSTM / "logs" / "history_update_and_train.log"
@@ -2022,14 +4919,6 @@ LSTM_REGISTRY = BASE_LSTM / "models" / "registry.json"
 LSTM_LEARNING_STATUS = BASE_LSTM / "data" / "learning_status.json"
 LSTM_WALKFORWARD = BASE_LSTM / "reports" / "walkforward_report.md"
 
-def _tail(path: Path, n: int = 200) -> str:
-    if not path.exists():
-        return ""
-    with path.open("r", encoding="utf-8", errors="replace") as f:
-        lines = f.readlines()
-    return "".join(lines[-n:])
-
-
 def _json_or(path: Path, default):
     try:
         if not path.exists():
@@ -2040,28 +4929,117 @@ def _json_or(path: Path, default):
         return default
 
 
-def _walkforward_rows() -> list[dict]:
-    if not LSTM_WALKFORWARD.exists():
-        return []
+_WALKFORWARD_ROW_RE = re.compile(r"\|\s*([A-Z0-9_]+)\s*\|\s*([0-9.]+)\s*\|\s*([0-9.]+)\s*\|")
+LSTM_TREND_MAX_RUNS = 200
+_lstm_ingested: dict[str, str] = {}  # fuente -> version de fichero ya volcada a SQLite
+_lstm_store_lock = threading.Lock()
+
+
+def _walkforward_rows(text: str) -> list[dict]:
     rows = []
-    try:
-        for line in LSTM_WALKFORWARD.read_text(encoding="utf-8", errors="replace").splitlines():
-            m = re.match(r"\|\s*([A-Z0-9_]+)\s*\|\s*([0-9.]+)\s*\|\s*([0-9.]+)\s*\|", line)
-            if not m or m.group(1) == "Symbol":
-                continue
-            baseline = float(m.group(2))
-            lstm = float(m.group(3))
-            rows.append({
-                "symbol": m.group(1),
-                "baseline_acc": baseline,
-                "lstm_acc": lstm,
-                "delta": round(lstm - baseline, 3),
-            })
-    except Exception:
-        return []
+    for line in text.splitlines():
+        m = _WALKFORWARD_ROW_RE.match(line)
+        if not m or m.group(1) == "Symbol":
+            continue
+        baseline = float(m.group(2))
+        lstm = float(m.group(3))
+        rows.append({
+            "symbol": m.group(1),
+            "baseline_acc": baseline,
+            "lstm_acc": lstm,
+            "delta": round(lstm - baseline, 3),
+        })
+    return rows
+
+
+def _registry_rows(raw: bytes) -> list[tuple]:
+    data = json.loads(raw.decode("utf-8"))
+    symbols = data.get("symbols") if isinstance(data, dict) else None
+    rows = []
+    for symbol, entry in (symbols or {}).items():
+        best = entry.get("best_val_mse") if isinstance(entry, dict) else None
+        rows.append((symbol, best if isinstance(best, (int, float)) else None, json.dumps(entry, ensure_ascii=False)))
     return rows
 
-@app.get("/lstm-real", response_class=HTMLResponse)
+
+def ingest_lstm_reports() -> bool:
+    """Vuelca walk-forward y registro a SQLite una vez por version; si el contenido cambia es una ejecucion nueva.
+
+    Devuelve False si algun fichero aun se esta escribiendo (se reintenta en la siguiente llamada).
+    """
+    sources = (("walkforward", LSTM_WALKFORWARD), ("registry", LSTM_REGISTRY))
+    if all(_lstm_ingested.get(name) == file_version(path) for name, path in sources):
+        return True
+    settled = True
+    with _lstm_store_lock:
+        for name, path in sources:
+            version = file_version(path)
+            if _lstm_ingested.get(name) == version:
+                continue
+            try:
+                st = path.stat()
+                # mismo criterio que el debounce del watcher: hasta que el fichero no lleva un rato quieto
+                # una lectura puede ver media tabla, y cada contenido distinto seria una ejecucion nueva
+                if time.time() - st.st_mtime < FILE_WATCH_DEBOUNCE_SECONDS:
+                    settled = False
+                    continue
+                raw = path.read_bytes()
+                if path.stat().st_mtime_ns != st.st_mtime_ns:
+                    settled = False
+                    continue
+                mtime = datetime.fromtimestamp(st.st_mtime, UTC).isoformat(timespec="seconds").replace("+00:00", "Z")
+                if name == "walkforward":
+                    rows = [(r["symbol"], r["baseline_acc"], r["lstm_acc"], r["delta"])
+                            for r in _walkforward_rows(raw.decode("utf-8", errors="replace"))]
+                else:
+                    rows = _registry_rows(raw)
+            except Exception:
+                _lstm_ingested[name] = version  # ausente o ilegible: se reintenta con la siguiente version
+                continue
+            if not rows:
+                _lstm_ingested[name] = version  # un informe sin filas (truncado o recien creado) no es una ejecucion
+                continue
+            digest = hashlib.sha1(raw).hexdigest()
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                last = conn.execute(
+                    "SELECT content_sha1 FROM lstm_runs WHERE source=? ORDER BY id DESC LIMIT 1", (name,)
+                ).fetchone()
+                if last is None or last[0] != digest:
+                    run_id = conn.execute(
+                        "INSERT INTO lstm_runs(source, content_sha1, file_mtime, ingested_at) VALUES(?,?,?,?)",
+                        (name, digest, mtime, now_iso()),
+                    ).lastrowid
+                    if name == "walkforward":
+                        conn.executemany(
+                            "INSERT INTO lstm_walkforward(run_id, symbol, baseline_acc, lstm_acc, delta) VALUES(?,?,?,?,?)",
+                            [(run_id, *r) for r in rows],
+                        )
+                    else:
+                        conn.executemany(
+                            "INSERT INTO lstm_registry(run_id, symbol, best_val_mse, entry) VALUES(?,?,?,?)",
+                            [(run_id, *r) for r in rows],
+                        )
+                    conn.commit()
+            finally:
+                conn.close()
+            _lstm_ingested[name] = version
+    return settled
+
+
+def lstm_ingest_state() -> str:
+    # parte de los ETag: lo servido mientras un informe se asentaba no queda cacheado para esa version de fichero
+    return ",".join(_lstm_ingested.get(name, "-") for name in ("walkforward", "registry"))
+
+
+def lstm_latest_rows(source: str) -> list[sqlite3.Row]:
+    table = "lstm_walkforward" if source == "walkforward" else "lstm_registry"
+    return q(
+        f"SELECT * FROM {table} WHERE run_id=(SELECT MAX(id) FROM lstm_runs WHERE source=?) ORDER BY rowid",
+        (source,),
+    )
+
+
 def lstm_real_page(request: Request):
     html = """
     <!doctype html><html><head><meta charset="utf-8"/>
@@ -2103,10 +5081,39 @@ def lstm_real_page(request: Request):
       </div>
       <script>
         function badge(text, cls){ return `<span class="badge ${cls||''}">${text}</span>` }
+        let statusEtag = null;
+        const LOG_LINES = 220;
+        const st = {logOffset: null, version: null, logLines: [], training: false, last_end: null, learning: null, registry: new Map(), walkforward: new Map()};
+        function applyRows(map, full, changed, removed){
+          if (full) { map.clear(); full.forEach(r => map.set(r.symbol, r)); }
+          (changed||[]).forEach(r => map.set(r.symbol, r));
+          (removed||[]).forEach(s => map.delete(s));
+        }
+        function applyStatus(j){
+          if (j.mode === 'full') {
+            st.logLines = (j.log_tail || '').split('\\n');
+            st.last_end = j.last_end || null;
+          } else if (j.log_append) {
+            const lines = j.log_append.split('\\n');
+            if (st.logLines.length && st.logLines[st.logLines.length - 1] === '') st.logLines.pop();
+            st.logLines = st.logLines.concat(lines).slice(-LOG_LINES - 1);
+          }
+          if (j.last_end) st.last_end = j.last_end;
+          if ('learning' in j) st.learning = j.learning;
+          applyRows(st.registry, j.registry_rows, j.registry_changed, j.registry_removed);
+          applyRows(st.walkforward, j.walkforward, j.walkforward_changed, j.walkforward_removed);
+          st.training = !!j.training;
+          st.logOffset = j.log_offset;
+          st.version = j.version;
+        }
         async function load(){
           try {
-            const r = await fetch('/api/lstm-real/status');
-            const j = await r.json();
+            const qs = st.logOffset === null ? '' : `?log_offset=${st.logOffset}&version=${encodeURIComponent(st.version || '')}`;
+            const r = await fetch('/api/lstm-real/status' + qs, {cache: 'no-store', headers: statusEtag ? {'If-None-Match': statusEtag} : {}});
+            if (r.status === 304) return;
+            statusEtag = r.headers.get('ETag');
+            applyStatus(await r.json());
+            const j = {training: st.training, last_end: st.last_end, learning: st.learning, registry_rows: [...st.registry.values()], walkforward: [...st.walkforward.values()]};
             const statusNode = document.getElementById('st');
             statusNode.textContent = j.training ? 'ENTRENANDO' : 'EN ESPERA';
             statusNode.className = 'kpi ' + (j.training ? 'warn' : 'ok');
@@ -2144,7 +5151,7 @@ def lstm_real_page(request: Request):
               return `<tr><td>${row.symbol}</td><td>${row.baseline_acc}</td><td>${row.lstm_acc}</td><td><span class="${cls}">${row.delta > 0 ? '+' : ''}${row.delta}</span></td><td>${verdict}</td></tr>`;
             }).join('');
             document.getElementById('wfRows').innerHTML = wfRows || '<tr><td colspan="5">Sin comparativa walk-forward.</td></tr>';
-            document.getElementById('log').textContent = j.log_tail || '(sin log disponible)';
+            document.getElementById('log').textContent = st.logLines.join('\\n').trim() || '(sin log disponible)';
           } catch(e) {
             document.getElementById('log').textContent = 'Error cargando datos: ' + e;
           }
@@ -2155,20 +5162,92 @@ def lstm_real_page(request: Request):
     """
     return HTMLResponse(html)
 
-@app.get("/api/lstm-real/status")
-def lstm_real_status():
-    log_tail = _tail(LSTM_LOG, n=220)
+def lstm_status_version() -> str:
+    return make_etag(
+        "lstm",
+        file_version(LSTM_LOG), file_version(LSTM_REGISTRY), file_version(LSTM_LEARNING_STATUS),
+        file_version(LSTM_WALKFORWARD), LSTM_LOCK.exists(), lstm_ingest_state(),
+    )
+
+
+LSTM_LOG_TAIL_LINES = 220
+LSTM_LOG_DELTA_MAX_BYTES = 256 * 1024
+_LSTM_END_RE = re.compile(r"\[(?P<ts>[^\]]+)\]\s+END\s+exit=(?P<exit>-?\d+)")
+_lstm_models_cache: dict[str, dict] = {}  # version -> filas ya calculadas (ultimas versiones)
+
+
+def _tail_with_offset(path: Path, n: int) -> tuple[str, int]:
+    """Ultimas n lineas completas leyendo desde el final; devuelve (texto, offset tras la ultima linea)."""
+    try:
+        with path.open("rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            pos = size
+            data = b""
+            while pos > 0 and data.count(b"\n") <= n:
+                step = min(64 * 1024, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+    except Exception:
+        return "", 0
+    cut = data.rfind(b"\n") + 1
+    end_offset = pos + cut
+    lines = data[:cut].splitlines(keepends=True)
+    if pos > 0:
+        lines = lines[1:]  # la primera puede estar cortada
+    return b"".join(lines[-n:]).decode("utf-8", errors="replace"), end_offset
+
+
+def _read_log_from(path: Path, offset: int) -> tuple[str, int] | None:
+    """Bytes nuevos desde offset hasta la ultima linea completa; None si hay que reenviar el tail."""
+    try:
+        size = path.stat().st_size
+    except Exception:
+        return None
+    if offset > size or size - offset > LSTM_LOG_DELTA_MAX_BYTES:
+        return None  # log rotado/truncado o demasiado atrasado
+    if offset == size:
+        return "", offset
+    with path.open("rb") as f:
+        f.seek(offset)
+        chunk = f.read(size - offset)
+    cut = chunk.rfind(b"\n") + 1
+    return chunk[:cut].decode("utf-8", errors="replace"), offset + cut
+
+
+def _last_end(text: str):
     last_end = None
-    if log_tail:
-        for m in re.finditer(r"\[(?P<ts>[^\]]+)\]\s+END\s+exit=(?P<exit>-?\d+)", log_tail):
-            last_end = {"ended_at": m.group("ts"), "exit": int(m.group("exit"))}
-    registry = _json_or(LSTM_REGISTRY, {"symbols": {}})
+    for m in _LSTM_END_RE.finditer(text or ""):
+        last_end = {"ended_at": m.group("ts"), "exit": int(m.group("exit"))}
+    return last_end
+
+
+def lstm_models_version() -> str:
+    return make_etag(
+        "lstm-models", file_version(LSTM_REGISTRY), file_version(LSTM_LEARNING_STATUS), file_version(LSTM_WALKFORWARD),
+        lstm_ingest_state(),
+    ).strip('"')
+
+
+def lstm_models_payload(version: str) -> dict:
+    cached = _lstm_models_cache.get(version)
+    if cached is not None:
+        return cached
+    ingest_lstm_reports()
     learning = _json_or(LSTM_LEARNING_STATUS, {})
-    walkforward = _walkforward_rows()
+    walkforward = []
+    if file_watcher.stat(LSTM_WALKFORWARD) is not None:
+        walkforward = [
+            {"symbol": r["symbol"], "baseline_acc": r["baseline_acc"], "lstm_acc": r["lstm_acc"], "delta": r["delta"]}
+            for r in lstm_latest_rows("walkforward")
+        ]
+    wf_by_symbol = {}
+    for r in walkforward:
+        wf_by_symbol.setdefault(r["symbol"], r)
     registry_rows = []
-    for symbol, payload in (registry.get("symbols") or {}).items():
-        best = payload.get("best_val_mse")
-        wf = next((r for r in walkforward if r.get("symbol") == symbol), None)
+    for row in lstm_latest_rows("registry") if file_watcher.stat(LSTM_REGISTRY) is not None else []:
+        symbol, best = row["symbol"], row["best_val_mse"]
+        wf = wf_by_symbol.get(symbol)
         delta_text = f"{wf['lstm_acc']} vs {wf['baseline_acc']}" if wf else "Sin walk-forward"
         reading = "Fino" if isinstance(best, (int, float)) and best < 0.001 else "Aceptable"
         registry_rows.append({
@@ -2177,20 +5256,126 @@ def lstm_real_status():
             "delta_text": delta_text,
             "reading": reading,
         })
-    return {
+    payload = {"learning": learning, "walkforward": walkforward, "registry_rows": registry_rows}
+    _lstm_models_cache[version] = payload
+    while len(_lstm_models_cache) > 8:
+        _lstm_models_cache.pop(next(iter(_lstm_models_cache)))
+    return payload
+
+
+def _diff_rows(old: list[dict], new: list[dict], key: str = "symbol") -> tuple[list[dict], list[str]]:
+    before = {r.get(key): r for r in old}
+    changed = [r for r in new if before.get(r.get(key)) != r]
+    present = {r.get(key) for r in new}
+    removed = [k for k in before if k not in present]
+    return changed, removed
+
+
+def lstm_real_status(request: Request, log_offset: int | None = None, version: str | None = None):
+    ingest_lstm_reports()
+    etag = lstm_status_version()
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    models_version = lstm_models_version()
+    models = lstm_models_payload(models_version)
+    delta = _read_log_from(LSTM_LOG, log_offset) if log_offset is not None and log_offset >= 0 else None
+
+    if delta is None:
+        log_tail, new_offset = _tail_with_offset(LSTM_LOG, LSTM_LOG_TAIL_LINES)
+        return with_etag(JSONResponse({
+            "ok": True,
+            "mode": "full",
+            "training": LSTM_LOCK.exists(),
+            "log_path": str(LSTM_LOG),
+            "last_end": _last_end(log_tail),
+            "log_tail": log_tail,
+            "log_offset": new_offset,
+            "version": models_version,
+            **models,
+        }), etag)
+
+    log_append, new_offset = delta
+    body = {
         "ok": True,
+        "mode": "delta",
         "training": LSTM_LOCK.exists(),
         "log_path": str(LSTM_LOG),
-        "last_end": last_end,
-        "log_tail": log_tail,
-        "learning": learning,
-        "walkforward": walkforward,
-        "registry_rows": registry_rows,
+        "log_append": log_append,
+        "log_offset": new_offset,
+        "version": models_version,
     }
+    last_end = _last_end(log_append)
+    if last_end:
+        body["last_end"] = last_end
+    if version != models_version:
+        previous = _lstm_models_cache.get(version or "")
+        body["learning"] = models["learning"]
+        if previous is None:
+            body["walkforward"] = models["walkforward"]
+            body["registry_rows"] = models["registry_rows"]
+        else:
+            body["walkforward_changed"], body["walkforward_removed"] = _diff_rows(previous["walkforward"], models["walkforward"])
+            body["registry_changed"], body["registry_removed"] = _diff_rows(previous["registry_rows"], models["registry_rows"])
+    return with_etag(JSONResponse(body), etag)
+
+
+def lstm_real_trend(request: Request, symbol: str | None = None, limit: int = 50):
+    """Evolucion por simbolo del walk-forward (delta LSTM vs base) y del val_mse entre entrenamientos."""
+    ingest_lstm_reports()
+    limit = max(2, min(int(limit), LSTM_TREND_MAX_RUNS))
+    last_run = q("SELECT MAX(id) AS id FROM lstm_runs")[0]["id"]
+    symbol = (symbol or "").strip().upper() or None
+    etag = make_etag("lstm-trend", last_run, symbol, limit)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    if symbol:
+        wf = q(
+            "SELECT w.run_id, r.file_mtime, w.baseline_acc, w.lstm_acc, w.delta FROM lstm_walkforward w "
+            "JOIN lstm_runs r ON r.id = w.run_id WHERE w.symbol=? ORDER BY w.run_id DESC LIMIT ?",
+            (symbol, limit),
+        )
+        reg = q(
+            "SELECT g.run_id, r.file_mtime, g.best_val_mse FROM lstm_registry g "
+            "JOIN lstm_runs r ON r.id = g.run_id WHERE g.symbol=? ORDER BY g.run_id DESC LIMIT ?",
+            (symbol, limit),
+        )
+        points = [dict(r) for r in reversed(wf)]
+        for prev, cur in zip(points, points[1:]):
+            cur["delta_change"] = round(cur["delta"] - prev["delta"], 3)
+        payload = {
+            "symbol": symbol,
+            "walkforward": points,
+            "registry": [dict(r) for r in reversed(reg)],
+        }
+        return with_etag(JSONResponse(payload), etag)
+
+    # Resumen: primera/ultima delta de cada simbolo dentro de las ultimas `limit` ejecuciones
+    rows = q(
+        "SELECT w.run_id, w.symbol, w.delta FROM lstm_walkforward w WHERE w.run_id IN "
+        "(SELECT id FROM lstm_runs WHERE source='walkforward' ORDER BY id DESC LIMIT ?) ORDER BY w.run_id",
+        (limit,),
+    )
+    by_symbol: dict[str, dict] = {}
+    for r in rows:
+        st = by_symbol.get(r["symbol"])
+        if st is None:
+            by_symbol[r["symbol"]] = {"symbol": r["symbol"], "runs": 1, "first_delta": r["delta"], "last_delta": r["delta"],
+                                      "best_delta": r["delta"], "worst_delta": r["delta"]}
+            continue
+        st["runs"] += 1
+        st["last_delta"] = r["delta"]
+        st["best_delta"] = max(st["best_delta"], r["delta"])
+        st["worst_delta"] = min(st["worst_delta"], r["delta"])
+    symbols = list(by_symbol.values())
+    for st in symbols:
+        st["trend"] = round(st["last_delta"] - st["first_delta"], 3)
+    symbols.sort(key=lambda st: st["trend"], reverse=True)
+    return with_etag(JSONResponse({"runs": len({r["run_id"] for r in rows}), "symbols": symbols}), etag)
 # ===== END_LSTM_REAL_SAFE =====
 
 
-@app.get("/sysadmin", response_class=HTMLResponse)
 def sysadmin_page(request: Request):
     html = """
     <!doctype html><html><head><meta charset="utf-8"/>
@@ -2260,12 +5445,10 @@ def sysadmin_page(request: Request):
     return HTMLResponse(html)
 
 
-@app.get("/api/sysadmin/status")
 def api_sysadmin_status():
     return JSONResponse(sysadmin_snapshot())
 
 
-@app.get("/terminal", response_class=HTMLResponse)
 def terminal_page(request: Request):
     html = """
     <!doctype html><html><head><meta charset="utf-8"/>
@@ -2318,11 +5501,459 @@ def terminal_page(request: Request):
     return HTMLResponse(html)
 
 
-@app.get("/api/terminal/status")
 def api_terminal_status():
     return JSONResponse(terminal_snapshot())
 
 
+# ===== SUBSISTEMAS OPCIONALES (registro perezoso) =====
+_registered_subsystems: set[str] = set()
+
+
+def register_optional_subsystems():
+    routes = {
+        "lstm": [
+            ("/lstm-real", lstm_real_page, HTMLResponse),
+            ("/api/lstm-real/status", lstm_real_status, JSONResponse),
+            ("/api/lstm-real/trend", lstm_real_trend, JSONResponse),
+        ],
+        "sysadmin": [
+            ("/sysadmin", sysadmin_page, HTMLResponse),
+            ("/api/sysadmin/status", api_sysadmin_status, JSONResponse),
+        ],
+        "terminal": [
+            ("/terminal", terminal_page, HTMLResponse),
+            ("/api/terminal/status", api_terminal_status, JSONResponse),
+        ],
+    }
+    for name, entries in routes.items():
+        if name not in OPTIONAL_SUBSYSTEMS or name in _registered_subsystems:
+            continue
+        for path, endpoint, response_class in entries:
+            app.add_api_route(path, endpoint, methods=["GET"], response_class=response_class)
+        _registered_subsystems.add(name)
+
+
+# ===== TELEMETRIA DE TOKENS (buffer en memoria + group commit a token_usage) =====
+TELEMETRY_FLUSH_INTERVAL_S = float(os.getenv("TELEMETRY_FLUSH_INTERVAL_S", "0.5"))
+TELEMETRY_FLUSH_ROWS = 2000
+TELEMETRY_MAX_BUFFER = int(os.getenv("TELEMETRY_MAX_BUFFER", "50000"))
+TELEMETRY_MAX_BATCH = 1000
+
+
+class TokenTelemetryBuffer:
+    """Filas de token_usage en memoria; un hilo las escribe en una sola transaccion por intervalo o por tamano."""
+
+    def __init__(self, flush_interval_s: float, flush_rows: int, max_rows: int):
+        self.flush_interval_s = flush_interval_s
+        self.flush_rows = flush_rows
+        self.max_rows = max_rows
+        self._cond = threading.Condition()
+        self._rows: list[tuple] = []
+        self._thread = None
+        self._stopping = False
+        self._write_lock = threading.Lock()
+        self.stats = {"accepted": 0, "rejected": 0, "flushes": 0, "rows_written": 0, "errors": 0, "last_flush_ms": None}
+
+    def offer(self, rows: list[tuple]) -> bool:
+        """Encola el lote entero o nada; False si no cabe (el cliente debe reintentar mas tarde)."""
+        with self._cond:
+            if len(self._rows) + len(rows) > self.max_rows:
+                self.stats["rejected"] += len(rows)
+                return False
+            self._rows.extend(rows)
+            self.stats["accepted"] += len(rows)
+            if len(self._rows) >= self.flush_rows:
+                self._cond.notify()
+            return True
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._rows)
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._loop, name="token-telemetry", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+            self._thread = None
+        thread.join(timeout=5)
+        self.flush()  # lo que quede en memoria no se pierde al apagar
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._rows) < self.flush_rows:
+                    self._cond.wait(self.flush_interval_s)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def flush(self) -> int:
+        with self._write_lock:
+            with self._cond:
+                batch, self._rows = self._rows, []
+            if not batch:
+                return 0
+            t0 = time.perf_counter()
+            try:
+                conn = sqlite3.connect(DB_PATH, timeout=30)
+                try:
+                    conn.executemany(
+                        "INSERT INTO token_usage(model, session_key, tokens_in, tokens_out, recorded_at, recorded_by) VALUES(?,?,?,?,?,?)",
+                        batch,
+                    )
+                    conn.commit()
+                finally:
+                    conn.close()
+            except Exception:
+                with self._cond:
+                    self._rows[:0] = batch  # se reintenta en la siguiente vuelta, en orden
+                    self.stats["errors"] += 1
+                return 0
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(batch)
+            self.stats["last_flush_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            return len(batch)
+
+
+token_telemetry = TokenTelemetryBuffer(TELEMETRY_FLUSH_INTERVAL_S, TELEMETRY_FLUSH_ROWS, TELEMETRY_MAX_BUFFER)
+
+
+def telemetry_row(record: dict, now: str) -> tuple:
+    model = str(record.get("model") or "").strip()
+    if not model:
+        raise ValueError("model obligatorio")
+    tin, tout = int(record.get("tokens_in") or 0), int(record.get("tokens_out") or 0)
+    if tin < 0 or tout < 0:
+        raise ValueError("tokens negativos")
+    recorded_at = str(record.get("recorded_at") or "").strip()
+    if recorded_at:
+        # se guarda con el formato de now_iso(): los filtros since/until del export comparan texto
+        parsed = parse_iso_utc(recorded_at)
+        if parsed is None:
+            raise ValueError("recorded_at no es ISO-8601")
+        if parsed.tzinfo is None:
+            raise ValueError("recorded_at necesita zona horaria (Z o +hh:mm)")
+        recorded_at = parsed.astimezone(UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return (
+        model[:120],
+        str(record.get("session_key") or "agent")[:120],
+        tin,
+        tout,
+        recorded_at or now,
+        str(record.get("actor") or record.get("recorded_by") or "-")[:120],
+    )
+
+
+@app.post("/api/telemetry/tokens", status_code=202)
+def api_telemetry_tokens(payload: dict | list = Body(...)):
+    records = payload.get("records", [payload]) if isinstance(payload, dict) else payload
+    if not isinstance(records, list) or not records:
+        raise HTTPException(status_code=400, detail="se espera un registro, una lista o {records: [...]}")
+    if len(records) > TELEMETRY_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"maximo {TELEMETRY_MAX_BATCH} registros por peticion")
+    now = now_iso()
+    try:
+        rows = [telemetry_row(r, now) for r in records if isinstance(r, dict)]
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=f"registro invalido: {exc}")
+    if len(rows) != len(records):
+        raise HTTPException(status_code=400, detail="cada registro debe ser un objeto")
+    if not token_telemetry.offer(rows):
+        # buffer lleno: el escritor va por detras, el cliente reintenta tras el siguiente flush
+        return JSONResponse(
+            {"ok": False, "reason": "buffer_lleno", "pending": token_telemetry.pending()},
+            status_code=429,
+            headers={"Retry-After": str(max(1, math.ceil(TELEMETRY_FLUSH_INTERVAL_S)))},
+        )
+    return {"ok": True, "accepted": len(rows), "pending": token_telemetry.pending()}
+
+
+# ===== CRON SCHEDULER (cron_tasks en proceso) =====
+CRON_ALIASES = {
+    "@yearly": "0 0 1 1 *", "@annually": "0 0 1 1 *", "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0", "@daily": "0 0 * * *", "@midnight": "0 0 * * *", "@hourly": "0 * * * *",
+}
+CRON_RELOAD_SECONDS = 60
+
+
+class CronExpr:
+    """Expresion cron de 5 campos (min hora dia-mes mes dia-semana), evaluada en UTC."""
+
+    def __init__(self, expr: str):
+        fields = CRON_ALIASES.get(expr.strip().lower(), expr).split()
+        if len(fields) != 5:
+            raise ValueError(f"cron invalido: {expr!r}")
+        self.expr = expr
+        self.minutes = self._field(fields[0], 0, 59)
+        self.hours = self._field(fields[1], 0, 23)
+        self.days = self._field(fields[2], 1, 31)
+        self.months = self._field(fields[3], 1, 12)
+        self.weekdays = {d % 7 for d in self._field(fields[4], 0, 7)}  # 0 y 7 = domingo
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+        self._sorted_minutes = sorted(self.minutes)
+
+    @staticmethod
+    def _field(raw: str, lo: int, hi: int) -> set[int]:
+        values = set()
+        for part in raw.split(","):
+            rng, _, step = part.partition("/")
+            step_n = int(step) if step else 1
+            if rng == "*":
+                start, end = lo, hi
+            elif "-" in rng:
+                a, b = rng.split("-", 1)
+                start, end = int(a), int(b)
+            else:
+                start = int(rng)
+                end = hi if step else start
+            if start < lo or end > hi or start > end or step_n < 1:
+                raise ValueError(f"campo cron fuera de rango: {raw!r}")
+            values.update(range(start, end + 1, step_n))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        dom = dt.day in self.days
+        dow = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return dow
+        if self.any_weekday:
+            return dom
+        return dom or dow  # semantica cron: si ambos estan restringidos basta uno
+
+    def next_after(self, dt: datetime) -> datetime | None:
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            minute = next((m for m in self._sorted_minutes if m >= t.minute), None)
+            if minute is None:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            return t.replace(minute=minute)
+        return None
+
+
+def _cron_autopilot():
+    autopilot_run(threshold=60, assigned_to="alpha-scout")
+
+
+def _cron_autotasks():
+    create_tasks_from_top(threshold=60, assigned_to="alpha-scout")
+
+
+# task_ref de cron_tasks -> trabajo en proceso
+CRON_JOB_HANDLERS = {
+    "autopilot_run": _cron_autopilot,
+    "signals_refresh": refresh_signals,
+    "signals_autotasks": _cron_autotasks,
+}
+
+
+class CronScheduler:
+    """Heap de proximas ejecuciones: O(log n) por disparo, un hilo fuera del request path."""
+
+    def __init__(self, handlers: dict, max_workers: int = 4):
+        self.handlers = handlers
+        self.max_workers = max_workers
+        self._cond = threading.Condition()
+        self._heap: list = []  # (fire_ts, seq, cron_id, generation, nominal_ts)
+        self._jobs: dict[int, dict] = {}
+        self._generations: dict[int, int] = {}  # solo crece y sobrevive al borrado: invalida entradas huerfanas
+        self._running: dict[int, int] = {}
+        self._seq = 0
+        self._thread = None
+        self._executor = None
+        self._stopping = False
+        self._next_reload = 0.0
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            from concurrent.futures import ThreadPoolExecutor
+            self._stopping = False
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cron")
+            self._thread = threading.Thread(target=self._loop, name="cron-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+            thread, executor = self._thread, self._executor
+            self._thread = None
+        thread.join(timeout=5)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _push(self, job: dict, after: datetime):
+        nominal = job["expr"].next_after(after)
+        if nominal is None:
+            return
+        nominal_ts = nominal.timestamp()
+        fire_ts = nominal_ts + (secrets.randbelow(job["jitter_s"] + 1) if job["jitter_s"] > 0 else 0)
+        self._seq += 1
+        job["next_run"] = nominal.isoformat(timespec="seconds").replace("+00:00", "Z")
+        heapq.heappush(self._heap, (fire_ts, self._seq, job["id"], job["generation"], nominal_ts))
+
+    def reload(self):
+        try:
+            rows = q(
+                "SELECT id, name, cron_expr, task_ref, COALESCE(jitter_s, 0) jitter_s, "
+                "COALESCE(max_concurrency, 1) max_concurrency, COALESCE(misfire_grace_s, 300) misfire_grace_s "
+                "FROM cron_tasks WHERE active = 1"
+            )
+        except Exception:
+            return
+        now = datetime.now(UTC)
+        seen = set()
+        for r in rows:
+            if r["task_ref"] not in self.handlers:
+                continue
+            key = (r["cron_expr"], r["task_ref"], r["jitter_s"], r["max_concurrency"], r["misfire_grace_s"])
+            seen.add(r["id"])
+            job = self._jobs.get(r["id"])
+            if job is not None and job["key"] == key:
+                continue
+            try:
+                expr = CronExpr(r["cron_expr"] or "")
+            except ValueError:
+                continue
+            generation = self._generations.get(r["id"], -1) + 1
+            self._generations[r["id"]] = generation
+            job = {
+                "id": r["id"],
+                "name": r["name"],
+                "task_ref": r["task_ref"],
+                "expr": expr,
+                "key": key,
+                "jitter_s": max(0, int(r["jitter_s"])),
+                "max_concurrency": max(1, int(r["max_concurrency"])),
+                "misfire_grace_s": max(0, int(r["misfire_grace_s"])),
+                "generation": generation,
+                "next_run": None,
+            }
+            self._jobs[r["id"]] = job
+            self._push(job, now)
+        for cron_id in [cid for cid in self._jobs if cid not in seen]:
+            del self._jobs[cron_id]  # las entradas del heap quedan huerfanas y se descartan al salir
+
+    def _loop(self):
+        with self._cond:
+            while not self._stopping:
+                now_ts = time.time()
+                if now_ts >= self._next_reload:
+                    self.reload()
+                    self._next_reload = now_ts + CRON_RELOAD_SECONDS
+                while self._heap and self._heap[0][0] <= now_ts:
+                    _, _, cron_id, generation, nominal_ts = heapq.heappop(self._heap)
+                    job = self._jobs.get(cron_id)
+                    if job is None or job["generation"] != generation:
+                        continue
+                    self._fire(job, nominal_ts, now_ts)
+                wait = self._next_reload - now_ts
+                if self._heap:
+                    wait = min(wait, self._heap[0][0] - now_ts)
+                self._cond.wait(timeout=max(0.05, wait))
+
+    def _fire(self, job: dict, nominal_ts: float, now_ts: float):
+        scheduled_at = datetime.fromtimestamp(nominal_ts, tz=UTC)
+        # se reprograma desde "ahora": varias ejecuciones perdidas se agrupan en una sola
+        self._push(job, max(scheduled_at, datetime.fromtimestamp(now_ts, tz=UTC)))
+        if now_ts - nominal_ts > job["misfire_grace_s"] + job["jitter_s"]:
+            self._record(job, scheduled_at, None, "missed", "fuera de misfire_grace_s")
+            return
+        if self._running.get(job["id"], 0) >= job["max_concurrency"]:
+            self._record(job, scheduled_at, None, "skipped", "max_concurrency alcanzado")
+            return
+        self._running[job["id"]] = self._running.get(job["id"], 0) + 1
+        self._executor.submit(self._run, job, scheduled_at)
+
+    def _run(self, job: dict, scheduled_at: datetime):
+        started_at = now_iso()
+        status, error = "ok", None
+        try:
+            self.handlers[job["task_ref"]]()
+        except Exception as exc:
+            status, error = "error", str(exc)[:500]
+        finally:
+            with self._cond:
+                self._running[job["id"]] = max(0, self._running.get(job["id"], 1) - 1)
+        self._record(job, scheduled_at, started_at, status, error)
+
+    def _record(self, job: dict, scheduled_at: datetime, started_at: str | None, status: str, error: str | None):
+        try:
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                conn.execute(
+                    "INSERT INTO cron_runs(cron_id,name,task_ref,scheduled_at,started_at,finished_at,status,error) VALUES(?,?,?,?,?,?,?,?)",
+                    (job["id"], job["name"], job["task_ref"], scheduled_at.isoformat(timespec="seconds").replace("+00:00", "Z"),
+                     started_at, now_iso(), status, error),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            pass
+
+    def snapshot(self) -> list[dict]:
+        with self._cond:
+            return [
+                {
+                    "id": job["id"],
+                    "name": job["name"],
+                    "task_ref": job["task_ref"],
+                    "cron_expr": job["expr"].expr,
+                    "next_run": job["next_run"],
+                    "running": self._running.get(job["id"], 0),
+                    "max_concurrency": job["max_concurrency"],
+                }
+                for job in sorted(self._jobs.values(), key=lambda j: j["next_run"] or "")
+            ]
+
+
+cron_scheduler = CronScheduler(CRON_JOB_HANDLERS)
+
+
+@app.get("/api/cron/status")
+def api_cron_status(limit: int = 50):
+    runs = q(
+        "SELECT cron_id, name, task_ref, scheduled_at, started_at, finished_at, status, error "
+        "FROM cron_runs ORDER BY id DESC LIMIT ?",
+        (max(1, min(500, int(limit))),),
+    )
+    return {
+        "enabled": CRON_SCHEDULER_ENABLED,
+        "running": cron_scheduler._thread is not None,
+        "jobs": cron_scheduler.snapshot(),
+        "handlers": sorted(CRON_JOB_HANDLERS),
+        "runs": [dict(r) for r in runs],
+    }
+
+
 # ===== BEGIN_CONTROL_PAGE =====
 @app.get("/control", response_class=HTMLResponse)
 def control_page():
@@ -2339,19 +5970,545 @@ REGIME_PATH = Path(os.getenv("REGIME_PATH", "C:/Users/Fernando/.openclaw/workspa
 CORRELATION_PATH = Path(os.getenv("CORRELATION_PATH", "C:/Users/Fernando/.openclaw/workspace/proyectos/analisis-mercados/data/correlation_analysis.json"))
 
 
-@app.get("/api/risk-metrics")
-def api_risk_metrics():
-    return JSONResponse(_load_json_file(RISK_METRICS_PATH, {"error": "no risk metrics available"}))
-
-
 @app.get("/api/market-regime")
 def api_market_regime():
-    return JSONResponse(_load_json_file(REGIME_PATH, {"error": "no regime data available"}))
+    return JSONResponse(load_watched_json(REGIME_PATH, {"error": "no regime data available"}))
+
+
+# --- CORRELACION MOVIL: covarianza por ventana actualizada vela a vela sobre CRYPTO_HISTORY_DIR ---
+CORRELATION_INTERVAL = os.getenv("CORRELATION_INTERVAL", "1h").strip()
+CORRELATION_WINDOWS = tuple(sorted({int(w) for w in os.getenv("CORRELATION_WINDOWS", "24,72,168").split(",") if w.strip().isdigit() and int(w) >= 3}))
+CORRELATION_MAX_PAIRS = 60
+CORRELATION_CLUSTER_MIN = 0.7
+CORRELATION_RESYNC_BARS = 2000  # se rehacen las sumas de vez en cuando para acotar el error acumulado
+CORRELATION_STALE_BARS = int(os.getenv("CORRELATION_STALE_BARS", "3"))  # sin vela en N intervalos del mas reciente: fuera
+_correlation_engines: dict[str, "CorrelationEngine"] = {}
+
+
+class RollingCovariance:
+    """Sumas y productos cruzados de los ultimos `size` vectores de retornos; entrar/salir es O(n^2)."""
+
+    def __init__(self, size: int, n: int):
+        self.size = size
+        self.n = n
+        self.rows: deque = deque()
+        self.pushes = 0
+        self._reset_sums()
+
+    def _reset_sums(self):
+        self.s = [0.0] * self.n
+        self.sp = [[0.0] * self.n for _ in range(self.n)]  # solo el triangulo superior
+
+    def _apply(self, r, sign: float):
+        s, sp, n = self.s, self.sp, self.n
+        for i in range(n):
+            ri = r[i] * sign
+            s[i] += ri
+            row = sp[i]
+            for j in range(i, n):
+                row[j] += ri * r[j]
+
+    def push(self, r):
+        self.rows.append(r)
+        self._apply(r, 1.0)
+        if len(self.rows) > self.size:
+            self._apply(self.rows.popleft(), -1.0)
+        self.pushes += 1
+        if self.pushes % CORRELATION_RESYNC_BARS == 0:
+            self._reset_sums()
+            for row in self.rows:
+                self._apply(row, 1.0)
+
+    def matrix(self) -> list[list[float | None]] | None:
+        m = len(self.rows)
+        if m < 3:
+            return None
+        s, sp, n = self.s, self.sp, self.n
+        var = [(sp[i][i] - s[i] * s[i] / m) for i in range(n)]
+        out = [[None] * n for _ in range(n)]
+        for i in range(n):
+            if var[i] <= 1e-18:
+                continue
+            out[i][i] = 1.0
+            for j in range(i + 1, n):
+                if var[j] <= 1e-18:
+                    continue
+                corr = (sp[i][j] - s[i] * s[j] / m) / math.sqrt(var[i] * var[j])
+                out[i][j] = out[j][i] = round(max(-1.0, min(1.0, corr)), 4)
+        return out
+
+
+class CorrelationEngine:
+    """Retornos log alineados por open_time entre pares; cada vela comun nueva alimenta todas las ventanas."""
+
+    def __init__(self, interval: str, windows: tuple[int, ...]):
+        self.interval = interval
+        self.windows = windows
+        self.pairs: list[str] = []
+        self.last_t = None
+        self._sources: list = []
+        self._last_close: list[float] = []
+        self.covs: dict[int, RollingCovariance] = {}
+        self.excluded: dict[str, str] = {}  # par -> "stale" | "short"
+        self.lock = threading.Lock()
+
+    def _reset(self, pairs: list[str], sources: list):
+        self.pairs = pairs
+        self._sources = sources
+        self.last_t = None
+        self._last_close = []
+        self.covs = {w: RollingCovariance(w, len(pairs)) for w in self.windows}
+
+    def sync(self, pairs: list[str]):
+        if not self.windows:
+            return  # CORRELATION_WINDOWS sin ventanas validas: nada que calcular (se informa en /health)
+        with self.lock:
+            sources = []
+            for pair in pairs:
+                series = candle_series(pair, self.interval)
+                if series is not None and len(series) >= 2:
+                    sources.append((pair, series))
+            sources, self.excluded = self._usable(sources)
+            sources = sources[:CORRELATION_MAX_PAIRS]
+            names = [p for p, _ in sources]
+            series_list = [s for _, s in sources]
+            # otro universo o un CSV reescrito (serie nueva): se recalcula desde el historico
+            if names != self.pairs or any(a is not b for a, b in zip(series_list, self._sources)):
+                self._reset(names, series_list)
+            if len(series_list) < 2:
+                return
+            starts = [bisect_right(s.t, self.last_t) if self.last_t is not None else 0 for s in series_list]
+            common = set(series_list[0].t[starts[0]:])
+            for s, start in zip(series_list[1:], starts[1:]):
+                common.intersection_update(s.t[start:])
+            if not common:
+                return
+            stamps = sorted(common)
+            if self.last_t is None:
+                stamps = stamps[-(max(self.windows) + 1):]  # solo hace falta llenar la ventana mas larga
+            cursors = list(starts)
+            for t in stamps:
+                closes = []
+                for k, s in enumerate(series_list):
+                    idx = bisect_left(s.t, t, cursors[k])
+                    cursors[k] = idx
+                    closes.append(s.c[idx])
+                if self._last_close:
+                    r = [math.log(c / p) if c > 0 and p > 0 else 0.0 for c, p in zip(closes, self._last_close)]
+                    for cov in self.covs.values():
+                        cov.push(r)
+                self._last_close = closes
+                self.last_t = t
+
+    def _usable(self, sources: list) -> tuple[list, dict[str, str]]:
+        """Fuera los pares parados (su ultima vela congelaria la interseccion) y los de poco historico (encogen las ventanas)."""
+        if not sources:
+            return sources, {}
+        newest = max(s.t[-1] for _, s in sources)
+        cutoff = newest - CORRELATION_STALE_BARS * interval_ms(self.interval)
+        excluded = {pair: "stale" for pair, s in sources if s.t[-1] < cutoff}
+        fresh = [(pair, s) for pair, s in sources if pair not in excluded]
+        # historico minimo: la ventana mas larga, o lo que tenga el par fresco mas largo si aun no llega
+        min_bars = min(max(self.windows) + 1, max((len(s) for _, s in fresh), default=0))
+        for pair, s in fresh:
+            if len(s) < min_bars:
+                excluded[pair] = "short"
+        return [(pair, s) for pair, s in fresh if pair not in excluded], excluded
+
+    def payload(self, windows: tuple[int, ...], long_pairs: set[str], short_pairs: set[str]) -> dict:
+        with self.lock:
+            out = {}
+            for w in windows:
+                cov = self.covs.get(w)
+                matrix = cov.matrix() if cov else None
+                out[str(w)] = {
+                    "bars": len(cov.rows) if cov else 0,
+                    "matrix": matrix,
+                    "clusters": correlation_clusters(self.pairs, matrix) if matrix else [],
+                    "books": book_cross_correlation(self.pairs, matrix, long_pairs, short_pairs) if matrix else None,
+                }
+            return {"pairs": list(self.pairs), "excluded": dict(self.excluded), "last_t": self.last_t, "windows": out}
+
+
+def correlation_clusters(pairs: list[str], matrix, threshold: float = CORRELATION_CLUSTER_MIN) -> list[list[str]]:
+    """Componentes conexas del grafo corr >= umbral (union-find); solo grupos de 2 o mas pares."""
+    parent = list(range(len(pairs)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(pairs)):
+        for j in range(i + 1, len(pairs)):
+            corr = matrix[i][j]
+            if corr is not None and corr >= threshold:
+                parent[find(i)] = find(j)
+    groups: dict[int, list[str]] = {}
+    for i, pair in enumerate(pairs):
+        groups.setdefault(find(i), []).append(pair)
+    return sorted((g for g in groups.values() if len(g) > 1), key=len, reverse=True)
+
+
+def book_cross_correlation(pairs: list[str], matrix, long_pairs: set[str], short_pairs: set[str]) -> dict:
+    index = {p: i for i, p in enumerate(pairs)}
+    cross = []
+    for lp in sorted(long_pairs & index.keys()):
+        for sp in sorted(short_pairs & index.keys()):
+            if lp == sp:
+                continue
+            corr = matrix[index[lp]][index[sp]]
+            if corr is not None:
+                cross.append({"long": lp, "short": sp, "corr": corr})
+    cross.sort(key=lambda x: abs(x["corr"]), reverse=True)
+    return {
+        "long": sorted(long_pairs & index.keys()),
+        "short": sorted(short_pairs & index.keys()),
+        "avg_corr": round(sum(x["corr"] for x in cross) / len(cross), 4) if cross else None,
+        "pairs": cross,
+    }
+
+
+def active_book_pairs(book: str) -> set[str]:
+    rows = load_crypto_order_book(book).get("active", [])
+    return {normalize_crypto_pair(o.get("ticker")) for o in rows if isinstance(o, dict) and o.get("ticker")}
+
+
+def correlation_universe(long_pairs: set[str], short_pairs: set[str]) -> list[str]:
+    # Los pares con posicion abierta entran primero si el universo supera CORRELATION_MAX_PAIRS
+    return sorted(history_pairs(), key=lambda p: (p not in long_pairs and p not in short_pairs, p))
+
+
+def correlation_engine(interval: str) -> "CorrelationEngine":
+    engine = _correlation_engines.get(interval)
+    if engine is None:
+        engine = _correlation_engines[interval] = CorrelationEngine(interval, CORRELATION_WINDOWS)
+    return engine
 
 
 @app.get("/api/correlation")
-def api_correlation():
-    return JSONResponse(_load_json_file(CORRELATION_PATH, {"error": "no correlation data available"}))
+def api_correlation(request: Request, interval: str | None = None, window: int | None = None):
+    interval = (interval or CORRELATION_INTERVAL).strip()
+    if not HISTORY_INTERVAL_RE.match(interval):
+        raise HTTPException(status_code=400, detail="intervalo invalido")
+    if window is not None and window not in CORRELATION_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"ventanas disponibles: {list(CORRELATION_WINDOWS)}")
+    long_pairs, short_pairs = active_book_pairs("long"), active_book_pairs("short")
+    engine = correlation_engine(interval)
+    engine.sync(correlation_universe(long_pairs, short_pairs))
+    if len(engine.pairs) < 2:
+        # sin historico local suficiente: se mantiene el informe del job externo
+        return JSONResponse(load_watched_json(CORRELATION_PATH, {"error": "no correlation data available"}))
+    windows = (window,) if window else CORRELATION_WINDOWS
+    etag = make_etag("correlation", interval, engine.last_t, ",".join(engine.pairs), windows,
+                     ",".join(sorted(long_pairs)), ",".join(sorted(short_pairs)))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    payload = {"source": "engine", "interval": interval, **engine.payload(windows, long_pairs, short_pairs)}
+    return with_etag(JSONResponse(payload), etag)
+
+
+# --- MOTOR DE RIESGO: exposicion y VaR/CVaR de los tres libros, actualizado por diferencias ---
+def risk_var_window_config() -> tuple[int | None, str | None]:
+    """(ventana, error). Los escenarios salen de una ventana del motor de correlacion: otra no existe y no se sustituye."""
+    raw = os.getenv("RISK_VAR_WINDOW", str(max(CORRELATION_WINDOWS or (168,))))
+    if not CORRELATION_WINDOWS:
+        return None, f"CORRELATION_WINDOWS={os.getenv('CORRELATION_WINDOWS')!r} no tiene ninguna ventana valida (enteros >= 3)"
+    if not raw.strip().isdigit() or int(raw) not in CORRELATION_WINDOWS:
+        return None, f"RISK_VAR_WINDOW={raw} no esta en CORRELATION_WINDOWS={list(CORRELATION_WINDOWS)}"
+    return int(raw), None
+
+
+# Con la configuracion mal solo se desactiva el gate de riesgo (VaR y concentracion), no el dashboard
+RISK_VAR_WINDOW, RISK_CONFIG_ERROR = risk_var_window_config()
+RISK_CONFIDENCES = (0.95, 0.99)
+RISK_MIN_SCENARIOS = 20
+RISK_INPUTS = (PORTFOLIO_PATH, CRYPTO_ORDERS_PATH, CRYPTO_SHORT_ORDERS_PATH, SIGNALS_PATH, CRYPTO_SIGNALS_PATH, CRYPTO_SHORT_SIGNALS_PATH)
+
+
+def _positive_float(value) -> float:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return value if value > 0 else 0.0
+
+
+def risk_book_positions(prices: dict[str, float] | None = None) -> dict[tuple[str, str], tuple[str, float, float]]:
+    """(libro, id) -> (ticker, qty con signo, entrada). Acciones: posiciones activas de la cartera, en USD por su notional."""
+    prices = prices or {}
+    positions = {}
+    for p in load_portfolio().get("positions", []) or []:
+        if not isinstance(p, dict) or p.get("status") != "active" or not p.get("ticker"):
+            continue
+        notional = _positive_float(p.get("notional_usd"))
+        if not notional:
+            continue
+        ticker = str(p.get("ticker"))
+        # sin precio de entrada ni cotizacion cuenta como 1 unidad valorada en su notional
+        entry = _positive_float(p.get("entry_price")) or prices.get(ticker) or notional
+        positions[("stock", str(p.get("id") or ticker))] = (ticker, notional / entry, entry)
+    for book, sign in (("long", 1.0), ("short", -1.0)):
+        for o in load_crypto_order_book(book).get("active", []) or []:
+            if not isinstance(o, dict) or not o.get("ticker"):
+                continue
+            entry = _positive_float(o.get("entry_price"))
+            qty = _positive_float(o.get("qty")) or (_positive_float(o.get("notional_usd")) / entry if entry else 0.0) or 1.0
+            positions[(book, str(o.get("id") or o.get("ticker")))] = (normalize_crypto_pair(o.get("ticker")), sign * qty, entry)
+    return positions
 
 
+def risk_book_prices() -> dict[str, float]:
+    prices = {}
+    for m in load_signals_snapshot("prices").get("market", []) or []:
+        if isinstance(m, dict) and m.get("ticker"):
+            px = _positive_float(m.get("regularMarketPrice") or m.get("lastCloseSeries"))
+            if px:
+                prices[str(m.get("ticker"))] = px
+    for snap in (load_crypto_short_snapshot("home"), load_crypto_snapshot("home")):
+        for a in snap.get("assets", []) or []:
+            px = _positive_float(a.get("price_usd")) if isinstance(a, dict) else 0.0
+            if px and a.get("ticker"):
+                prices[normalize_crypto_pair(a.get("ticker"))] = px
+    return prices
+
+
+class RiskEngine:
+    """Cada cambio de orden o de precio toca solo sus tickers: totales, HHI y escenarios de P&L en O(ventana)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.updates = 0
+        self._versions = None
+        self._positions: dict[tuple[str, str], tuple[str, float, float]] = {}
+        self._legs: dict[str, dict[str, float]] = {}  # ticker -> libro -> qty con signo
+        self._entry: dict[str, float] = {}  # ticker -> entrada (respaldo sin cotizacion)
+        self._prices: dict[str, float] = {}
+        self.net: dict[str, float] = {}
+        self.gross: dict[str, float] = {}
+        self.net_total = self.gross_total = self.gross_sq = 0.0
+        self._scen_key = None
+        self._pair_index: dict[str, int] = {}
+        self._rets: list[list[float]] = []  # retorno simple por escenario (velas de la ventana) y par
+        self._scen: list[float] = []  # P&L de cada escenario con la exposicion neta actual
+        self._cov = None  # (m, s, sp) de la ventana para el VaR parametrico
+
+    def _add_leg(self, ticker: str, book: str, qty: float):
+        legs = self._legs.setdefault(ticker, {})
+        legs[book] = legs.get(book, 0.0) + qty
+        if abs(legs[book]) < 1e-12:
+            del legs[book]
+        if not legs:
+            del self._legs[ticker]
+
+    def _refresh(self, ticker: str) -> float:
+        legs = self._legs.get(ticker, {})
+        price = self._prices.get(ticker) or self._entry.get(ticker, 0.0)
+        net = sum(legs.values()) * price
+        gross = sum(abs(q) for q in legs.values()) * price
+        old_net, old_gross = self.net.pop(ticker, 0.0), self.gross.pop(ticker, 0.0)
+        if legs:
+            self.net[ticker], self.gross[ticker] = net, gross
+        self.net_total += net - old_net
+        self.gross_total += gross - old_gross
+        self.gross_sq += gross * gross - old_gross * old_gross
+        return net - old_net
+
+    def sync(self):
+        versions = tuple(file_version(p) for p in RISK_INPUTS)
+        engine = correlation_engine(CORRELATION_INTERVAL)
+        engine.sync(correlation_universe(active_book_pairs("long"), active_book_pairs("short")))
+        with self.lock:
+            dirty = set()
+            if versions != self._versions:
+                prices = risk_book_prices()
+                positions = risk_book_positions(prices)
+                old = self._positions
+                for key in old.keys() - positions.keys():
+                    ticker, qty, _ = old[key]
+                    self._add_leg(ticker, key[0], -qty)
+                    dirty.add(ticker)
+                for key, pos in positions.items():
+                    prev = old.get(key)
+                    if prev == pos:
+                        continue
+                    if prev is not None:
+                        self._add_leg(prev[0], key[0], -prev[1])
+                        dirty.add(prev[0])
+                    self._add_leg(pos[0], key[0], pos[1])
+                    if pos[2]:
+                        self._entry[pos[0]] = pos[2]
+                    dirty.add(pos[0])
+                self._positions = positions
+                dirty |= {t for t in self._legs if prices.get(t) != self._prices.get(t)}
+                self._prices = prices
+                self._versions = versions
+            deltas = {t: self._refresh(t) for t in dirty}
+            self.updates += len(dirty)
+            with engine.lock:
+                cov = engine.covs.get(RISK_VAR_WINDOW)
+                key = (engine.last_t, tuple(engine.pairs), cov.size if cov else None)
+                if key != self._scen_key:
+                    # vela nueva o universo distinto: la ventana de escenarios se rehace entera (una vez por vela)
+                    self._pair_index = {p: i for i, p in enumerate(engine.pairs)}
+                    self._rets = [[math.exp(x) - 1 for x in row] for row in cov.rows] if cov else []
+                    self._cov = (len(cov.rows), list(cov.s), [list(r) for r in cov.sp]) if cov else None
+                    self._scen_key = key
+                    deltas = {t: self.net.get(t, 0.0) for t in self._pair_index}
+                    self._scen = [0.0] * len(self._rets)
+            for ticker, delta in deltas.items():
+                k = self._pair_index.get(ticker)
+                if k is None or not delta:
+                    continue
+                scen = self._scen
+                for i, row in enumerate(self._rets):
+                    scen[i] += delta * row[k]
+
+    @staticmethod
+    def _historical(scen: list[float]) -> dict | None:
+        if len(scen) < RISK_MIN_SCENARIOS:
+            return None
+        losses = sorted((-x for x in scen), reverse=True)
+        out = {}
+        for conf in RISK_CONFIDENCES:
+            k = max(1, math.ceil(len(losses) * (1 - conf)))
+            out[str(int(conf * 100))] = {"var_usd": round(max(0.0, losses[k - 1]), 4), "cvar_usd": round(max(0.0, sum(losses[:k]) / k), 4)}
+        return out
+
+    def _parametric(self) -> dict | None:
+        if not self._cov or self._cov[0] < RISK_MIN_SCENARIOS:
+            return None
+        m, s, sp = self._cov
+        exposed = [(self._pair_index[t], e) for t, e in self.net.items() if t in self._pair_index and e]
+        variance = 0.0
+        for i, ei in exposed:
+            for j, ej in exposed:
+                a, b = min(i, j), max(i, j)
+                variance += ei * ej * (sp[a][b] - s[a] * s[b] / m) / (m - 1)
+        sigma = math.sqrt(max(variance, 0.0))
+        out = {}
+        for conf in RISK_CONFIDENCES:
+            z = NormalDist().inv_cdf(conf)
+            out[str(int(conf * 100))] = {"var_usd": round(z * sigma, 4), "cvar_usd": round(sigma * NormalDist().pdf(z) / (1 - conf), 4)}
+        return out
+
+    def report(self) -> dict:
+        with self.lock:
+            by_book: dict[str, dict] = {}
+            rows = []
+            for ticker, legs in self._legs.items():
+                price = self._prices.get(ticker) or self._entry.get(ticker, 0.0)
+                books = {book: round(q * price, 4) for book, q in legs.items()}
+                for book, usd in books.items():
+                    st = by_book.setdefault(book, {"net_usd": 0.0, "gross_usd": 0.0, "tickers": 0})
+                    st["net_usd"] += usd
+                    st["gross_usd"] += abs(usd)
+                    st["tickers"] += 1
+                gross = self.gross.get(ticker, 0.0)
+                rows.append({
+                    "ticker": ticker,
+                    "net_usd": round(self.net.get(ticker, 0.0), 4),
+                    "gross_usd": round(gross, 4),
+                    "weight_pct": round(gross / self.gross_total * 100, 2) if self.gross_total > 0 else None,
+                    "books": books,
+                    "priced": ticker in self._prices,
+                })
+            rows.sort(key=lambda r: r["gross_usd"], reverse=True)
+            hhi = self.gross_sq / (self.gross_total ** 2) if self.gross_total > 0 else None
+            return {
+                "generated_at": now_iso(),
+                "interval": CORRELATION_INTERVAL,
+                "window_bars": len(self._rets),
+                "exposure": {"gross_usd": round(self.gross_total, 4), "net_usd": round(self.net_total, 4)},
+                "by_book": {b: {k: round(v, 4) if isinstance(v, float) else v for k, v in st.items()} for b, st in by_book.items()},
+                "by_ticker": rows,
+                "concentration": {
+                    "hhi": round(hhi, 4) if hhi is not None else None,
+                    "effective_tickers": round(1 / hhi, 2) if hhi else None,
+                    "max_weight_pct": rows[0]["weight_pct"] if rows else None,
+                    "top_ticker": rows[0]["ticker"] if rows else None,
+                },
+                "var": {"historical": self._historical(self._scen), "parametric": self._parametric()},
+                # sin historico de velas (acciones, pares fuera del universo): cuentan en exposicion, no en VaR
+                "uncovered": sorted(t for t in self.net if t not in self._pair_index),
+                "updates": self.updates,
+                "config_error": RISK_CONFIG_ERROR,
+            }
+
+    def check_entry(self, book: str, ticker: str, notional_usd: float) -> dict:
+        """Que pasaria al abrir `notional_usd` en el libro: VaR99 historico y peso del ticker antes/despues."""
+        pair = str(ticker) if book == "stock" else normalize_crypto_pair(ticker)
+        delta = -notional_usd if book == "short" else notional_usd
+        with self.lock:
+            k = self._pair_index.get(pair)
+            before = self._historical(self._scen)
+            after = self._historical([s + delta * row[k] for s, row in zip(self._scen, self._rets)]) if k is not None else before
+            gross_after = self.gross_total + abs(notional_usd)
+            var_before = before["99"]["var_usd"] if before else None
+            var_after = after["99"]["var_usd"] if after else None
+            return {
+                "book": book,
+                "ticker": pair,
+                "notional_usd": notional_usd,
+                "covered": k is not None,
+                "var99_before_usd": var_before,
+                "var99_after_usd": var_after,
+                "marginal_var99_usd": round(var_after - var_before, 4) if var_before is not None and var_after is not None else None,
+                "weight_after_pct": round((self.gross.get(pair, 0.0) + abs(notional_usd)) / gross_after * 100, 2) if gross_after > 0 else None,
+            }
+
+    def entry_blocker(self, book: str, ticker: str, notional_usd: float, risk_cfg: dict, equity_usd: float) -> str | None:
+        if notional_usd <= 0 or RISK_CONFIG_ERROR:
+            return None
+        check = self.check_entry(book, ticker, notional_usd)
+        max_var_pct = float(risk_cfg.get("max_var99_pct_equity", 0) or 0)
+        if max_var_pct > 0 and equity_usd > 0 and check["var99_after_usd"] is not None:
+            var_pct = check["var99_after_usd"] / equity_usd * 100
+            if var_pct > max_var_pct:
+                return f"VaR99 tras entrada {round(var_pct, 2)}% > {max_var_pct}% del equity"
+        max_weight = float(risk_cfg.get("max_ticker_weight_pct", 0) or 0)
+        if max_weight > 0 and check["weight_after_pct"] is not None and check["weight_after_pct"] > max_weight:
+            return f"concentracion {check['weight_after_pct']}% > {max_weight}%"
+        return None
+
+
+risk_engine = RiskEngine()
+
 
+def risk_gate_context(book: str) -> tuple[dict, float]:
+    """Limites y equity del libro que recibe la entrada: cada libro contra su propio capital."""
+    if book == "stock":
+        # cartera de acciones: limites en portfolio.rules (mismas claves que risk.yaml), equity = cash + activas
+        portfolio = load_portfolio()
+        positions = [p for p in portfolio.get("positions", []) or [] if isinstance(p, dict) and p.get("status") == "active"]
+        equity = _positive_float(portfolio.get("cash_usd")) + sum(_positive_float(p.get("notional_usd")) for p in positions)
+        return portfolio.get("rules") or {}, equity
+    cfg = load_crypto_short_risk_config() if book == "short" else load_crypto_risk_config()
+    return cfg, _positive_float(load_crypto_order_book(book).get("portfolio", {}).get("equity_usd"))
+
+
+@app.get("/api/risk-metrics")
+def api_risk_metrics():
+    risk_engine.sync()
+    payload = risk_engine.report()
+    external = load_watched_json(RISK_METRICS_PATH, None)
+    if external is not None:
+        payload["external_report"] = external  # informe del job batch, si existe
+    return JSONResponse(payload)
+
+
+@app.get("/api/risk/check")
+def api_risk_check(ticker: str, book: str = "long", notional_usd: float = 60.0):
+    if book not in {"stock", "long", "short"} or not ticker.strip() or notional_usd <= 0:
+        raise HTTPException(status_code=400, detail="book (stock|long|short), ticker o notional_usd invalidos")
+    risk_engine.sync()
+    cfg, equity = risk_gate_context(book)
+    check = risk_engine.check_entry(book, ticker, notional_usd)
+    check["blocked_by"] = risk_engine.entry_blocker(book, ticker, notional_usd, cfg, equity)
+    check["config_error"] = RISK_CONFIG_ERROR
+    return check
+
+
+_startup_timing["import_ms"] = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 2)
@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+TMP = Path(tempfile.mkdtemp(prefix="agent-ops-tests-"))
+
+# Todas las rutas de entrada a un directorio temporal: los valores por defecto apuntan al workspace de Windows
+_PATH_VARS = [
+    "DB_PATH", "PORTFOLIO_PATH", "SIGNALS_PATH", "INGEST_SCRIPT", "CARDS_SCRIPT", "AUTOPILOT_LOG", "AGENTS_RUNTIME",
+    "AGENTS_HEALTH", "SOURCES_CONFIG_PATH", "ORDERS_PATH", "JOURNAL_PATH", "SNAPSHOT_PATH", "BACKUP_ROOT",
+    "CRYPTO_SIGNALS_PATH", "CRYPTO_ORDERS_PATH", "CRYPTO_SHORT_SIGNALS_PATH", "CRYPTO_SHORT_ORDERS_PATH",
+    "CRYPTO_RISK_PATH", "CRYPTO_SHORT_RISK_PATH", "CRYPTO_HISTORY_DIR", "CRYPTO_STREAM_STATUS_PATH",
+    "LEARNING_STATUS_PATH", "LEARNING_STATUS_SHORT_PATH", "MOONSHOT_CANDIDATES_PATH", "OPENCLAW_SNAPSHOT_PATH",
+    "RESEARCH_AGENTS_PATH", "RESEARCH_QUEUE_PATH", "RESEARCH_RESULTS_PATH", "RESEARCH_DEPLOYMENTS_PATH",
+    "STARTUP_LOG_PATH", "PRICE_WAREHOUSE_PATH", "STOCK_WAREHOUSE_PATH", "RISK_METRICS_PATH", "REGIME_PATH",
+    "CORRELATION_PATH",
+]
+TEST_ENV = {name: str(TMP / name.lower()) for name in _PATH_VARS}
+TEST_ENV["DB_PATH"] = str(TMP / "registry.db")
+TEST_ENV.update(CRON_SCHEDULER="0", DASHBOARD_SUBSYSTEMS="", BACKTEST_WORKERS="1")
+os.environ.update(TEST_ENV)
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    import app
+
+    return app
+
+
+@pytest.fixture(scope="session")
+def client(app_module):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app_module.app) as c:
+        yield c
+
+
+def wait_for(predicate, timeout: float = 5.0):
+    """El watcher agrupa cambios (debounce): espera a que la app vea lo que el test acaba de escribir."""
+    import time
+
+    deadline = time.monotonic() + timeout
+    while True:
+        value = predicate()
+        if value or time.monotonic() > deadline:
+            return value
+        time.sleep(0.05)
+
+
+def write_candles(path: Path, start_ms: int, bars: int, step_ms: int, mode: str = "w", price=None):
+    with path.open(mode, encoding="utf-8") as f:
+        if mode == "w":
+            f.write("open_time,open,high,low,close,volume\n")
+        for i in range(bars):
+            p = price(i) if price else 100.0 + i * 0.1
+            f.write(f"{start_ms + i * step_ms},{p},{p * 1.01},{p * 0.99},{p},10\n")
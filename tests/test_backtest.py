@@ -0,0 +1,77 @@
+import math
+
+import pytest
+
+from conftest import wait_for, write_candles
+
+HOUR_MS = 3_600_000
+COMBOS = [(6.0, 3.0)]  # objetivo 106, stop 97 para una entrada a 100
+
+
+def _series(app, bars):
+    s = app.CandleSeries()
+    for i, (o, h, l, c) in enumerate(bars):
+        s.append(i * HOUR_MS, o, h, l, c)
+    return s
+
+
+def _replay(app, bars, max_hold_bars=0):
+    stats = [app._new_backtest_stats() for _ in COMBOS]
+    app.replay_entry(_series(app, bars), 0, 100.0, COMBOS, max_hold_bars, stats)
+    return stats[0]
+
+
+def test_gap_open_fills_at_the_open(app_module):
+    up = _replay(app_module, [(100, 101, 99, 100), (110, 112, 109, 111)])
+    assert (up["ganadas"], up["sum_ret"]) == (1, pytest.approx(10.0))
+    down = _replay(app_module, [(100, 101, 99, 100), (90, 91, 88, 89)])
+    assert (down["perdidas"], down["sum_ret"]) == (1, pytest.approx(-10.0))
+
+
+def test_bar_touching_target_and_stop_counts_as_stop(app_module):
+    st = _replay(app_module, [(100, 101, 99, 100), (100, 107, 96, 101)])
+    assert (st["perdidas"], st["ganadas"], st["ambiguas"]) == (1, 0, 1)
+    assert st["sum_ret"] == pytest.approx(-3.0)
+    assert st["bars"] == 2
+
+
+def test_max_hold_bars_timeout_and_open_entries(app_module):
+    flat = [(100, 101, 99, 100), (100, 102, 99, 101), (101, 103, 100, 102), (102, 104, 101, 103)]
+    st = _replay(app_module, flat, max_hold_bars=3)
+    assert (st["timeouts"], st["trades"], st["bars"]) == (1, 1, 3)
+    assert st["sum_ret"] == pytest.approx(2.0)  # cierre de la tercera vela
+    short = _replay(app_module, flat, max_hold_bars=10)
+    assert (short["abiertas"], short["trades"]) == (1, 0)
+    no_limit = _replay(app_module, flat)
+    assert (no_limit["abiertas"], no_limit["trades"]) == (1, 0)
+
+
+def _history(app, pairs, bars=400):
+    app.CRYPTO_HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+    for n, pair in enumerate(pairs):
+        write_candles(app.CRYPTO_HISTORY_DIR / f"{pair}_1h.csv", 1_700_000_000_000, bars, HOUR_MS,
+                      price=lambda i, n=n: 100 * (1 + 0.08 * math.sin(i / (7 + n))))
+    assert wait_for(lambda: all(app.history_intervals(p) == ["1h"] for p in pairs))
+    combos = app.backtest_combos([4, 6], [2, 3])
+    return [{"pair": p, "interval": "1h", "combos": combos, "entries": None, "every_bars": 12, "max_hold_bars": 48}
+            for p in pairs]
+
+
+def test_small_runs_stay_inline(app_module, monkeypatch):
+    jobs = _history(app_module, ["BTINAUSDT", "BTINBUSDT", "BTINCUSDT"])
+    monkeypatch.setattr(app_module, "BACKTEST_WORKERS", 4)
+    assert 350 < app_module.history_bars_estimate("BTINAUSDT", "1h") < 450
+    assert app_module.backtest_inline(jobs)
+    monkeypatch.setattr(app_module, "BACKTEST_INLINE_BARS", 1000)
+    assert not app_module.backtest_inline(jobs)
+
+
+def test_process_pool_matches_inline(app_module, monkeypatch):
+    jobs = _history(app_module, ["BTPOAUSDT", "BTPOBUSDT", "BTPOCUSDT"])
+    inline, used = app_module.run_backtest_jobs(jobs)
+    assert used == 1 and all(r["entries"] for r in inline)
+    monkeypatch.setattr(app_module, "BACKTEST_WORKERS", 2)
+    monkeypatch.setattr(app_module, "BACKTEST_INLINE_BARS", 0)
+    pooled, used = app_module.run_backtest_jobs(jobs)
+    assert used == 2
+    assert pooled == inline
@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import ROOT, TEST_ENV
+
+_WORKER = """
+import sys
+import app
+from concurrent.futures import ThreadPoolExecutor
+
+def worker(seed):
+    ok = 0
+    for _ in range(10):
+        rid, _ = app.budget_reserve(sys.argv[1], 1, 700, holder=f"p{seed}")
+        if rid is not None:
+            ok += 1
+            app.budget_commit(rid, 700)
+    return ok
+
+with ThreadPoolExecutor(10) as ex:
+    print(sum(ex.map(worker, range(10))))
+"""
+
+
+def _set_limits(app_module, model: str, calls: int, tokens: int):
+    conn = app_module.budget_connect()
+    try:
+        conn.execute("INSERT OR REPLACE INTO llm_budget_limits VALUES(?, 'normal', ?, ?)", (model, calls, tokens))
+    finally:
+        conn.close()
+
+
+def test_concurrent_reservers_never_overspend(app_module, client):
+    _set_limits(app_module, "bench-threads", 120, 10_000_000)
+
+    def worker(seed):
+        ok = 0
+        for i in range(20):
+            rid, reason = app_module.budget_reserve("bench-threads", 1, 4000 + seed, holder=f"w{seed}", mode="normal")
+            if rid is None:
+                assert reason == "limite_llamadas"
+                continue
+            ok += 1
+            assert app_module.budget_commit(rid)
+        return ok
+
+    # 50 reservadores x 20 intentos: la demanda (1000 llamadas) supera de sobra el limite
+    with ThreadPoolExecutor(50) as ex:
+        granted = sum(ex.map(worker, range(50)))
+    st = app_module.budget_status("bench-threads", "normal")
+    assert granted == st["calls_used"] == st["max_calls"] == 120
+    assert st["calls_reserved"] == 0
+
+
+def test_concurrent_processes_never_overspend(app_module, client):
+    # el lock en proceso no cubre a otros procesos: ahi manda BEGIN IMMEDIATE de SQLite
+    _set_limits(app_module, "bench-procs", 150, 1_000_000)
+    env = {**os.environ, **TEST_ENV}
+    procs = [
+        subprocess.Popen([sys.executable, "-c", _WORKER, "bench-procs"], cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+        for _ in range(4)
+    ]
+    granted = 0
+    for p in procs:
+        out, _ = p.communicate(timeout=120)
+        assert p.returncode == 0
+        granted += int(out.strip().splitlines()[-1])
+    st = app_module.budget_status("bench-procs", "normal")
+    assert granted == st["calls_used"] == 150
+    assert st["tokens_used"] == 150 * 700
+
+
+def test_reserve_rejects_non_string_mode(client):
+    r = client.post("/api/budget/reserve", json={"model": "bench-threads", "mode": 3})
+    assert r.status_code == 400
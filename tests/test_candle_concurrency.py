@@ -0,0 +1,62 @@
+import sys
+import threading
+
+import pytest
+
+from conftest import write_candles
+
+MIN_MS = 60_000
+
+
+@pytest.fixture
+def fast_switching():
+    old = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # cambios de hilo muy frecuentes: las carreras salen en pocas vueltas
+    yield
+    sys.setswitchinterval(old)
+
+
+def test_concurrent_readers_while_csv_grows(app_module, fast_switching):
+    app = app_module
+    pair = "RACEUSDT"
+    app.CRYPTO_HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+    path = app.CRYPTO_HISTORY_DIR / f"{pair}_1m.csv"
+    start = 1_700_000_000_000
+    write_candles(path, start, 200, MIN_MS, price=lambda i: 100 + (i % 17))
+    total = 200
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        try:
+            while not stop.is_set():
+                series = app.load_candle_history(pair, "1m")
+                app.indicator_state(pair, "1m", series)
+                app.pyramid_level(pair, "15m")
+        except Exception as exc:  # pragma: no cover - se informa abajo
+            errors.append(exc)
+
+    threads = [threading.Thread(target=reader) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for chunk in range(40):
+        write_candles(path, start + total * MIN_MS, 25, MIN_MS, mode="a", price=lambda i: 100 + ((i + total) % 17))
+        total += 25
+    stop.set()
+    for t in threads:
+        t.join()
+    assert not errors
+
+    series = app.load_candle_history(pair, "1m")
+    assert list(series.t) == [start + i * MIN_MS for i in range(total)]  # ni velas perdidas ni repetidas
+
+    fresh = app.IndicatorState()
+    fresh.extend(series)
+    state = app.indicator_state(pair, "1m", series)
+    for name in app.IndicatorState.COLUMNS:
+        assert len(state.cols[name]) == total
+        assert [round(x, 9) for x in state.cols[name]] == pytest.approx([round(x, 9) for x in fresh.cols[name]], nan_ok=True)
+
+    level = app.pyramid_level(pair, "15m")
+    buckets = sorted({t - t % (15 * MIN_MS) for t in series.t})
+    assert list(level["series"].t) + [level["partial"][0]] == buckets
@@ -0,0 +1,50 @@
+import math
+
+from conftest import wait_for, write_candles
+
+HOUR_MS = 3_600_000
+START = 1_760_000_000_000 - 1_760_000_000_000 % HOUR_MS
+
+
+def _pair(app, name, bars, offset=0, phase=0.0):
+    write_candles(app.CRYPTO_HISTORY_DIR / f"{name}_1h.csv", START + offset * HOUR_MS, bars, HOUR_MS,
+                  price=lambda i: 100 + 5 * math.sin((i + offset) / 7 + phase) + (i % 5) * 0.3)
+    wait_for(lambda: app.history_intervals(name))
+
+
+def test_stale_and_short_pairs_do_not_freeze_or_shrink_the_matrix(app_module):
+    app = app_module
+    app.CRYPTO_HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+    _pair(app, "CORAUSDT", 500)
+    _pair(app, "CORBUSDT", 500, phase=0.4)
+    _pair(app, "CORSTALEUSDT", 200)  # el descargador murio en la vela 199
+    _pair(app, "CORNEWUSDT", 50, offset=450)  # listado hace poco
+
+    engine = app.CorrelationEngine("1h", (24, 72, 168))
+    engine.sync(["CORAUSDT", "CORBUSDT", "CORSTALEUSDT", "CORNEWUSDT"])
+    assert engine.pairs == ["CORAUSDT", "CORBUSDT"]
+    assert engine.excluded == {"CORSTALEUSDT": "stale", "CORNEWUSDT": "short"}
+    assert engine.last_t == START + 499 * HOUR_MS
+    assert all(len(cov.rows) == w for w, cov in engine.covs.items())
+
+    payload = engine.payload((168,), set(), set())
+    assert payload["excluded"]["CORSTALEUSDT"] == "stale"
+    assert payload["windows"]["168"]["matrix"][0][1] is not None
+
+
+def test_pair_becomes_stale_while_others_advance(app_module):
+    app = app_module
+    _pair(app, "CORCUSDT", 300)
+    _pair(app, "CORDUSDT", 300, phase=1.0)
+    _pair(app, "COREUSDT", 300, phase=2.0)
+    engine = app.CorrelationEngine("1h", (24,))
+    universe = ["CORCUSDT", "CORDUSDT", "COREUSDT"]
+    engine.sync(universe)
+    assert len(engine.pairs) == 3
+
+    for name, phase in (("CORCUSDT", 0.0), ("CORDUSDT", 1.0)):
+        write_candles(app.CRYPTO_HISTORY_DIR / f"{name}_1h.csv", START + 300 * HOUR_MS, 10, HOUR_MS, mode="a",
+                      price=lambda i, p=phase: 100 + 5 * math.sin((i + 300) / 7 + p))
+    engine.sync(universe)
+    assert engine.pairs == ["CORCUSDT", "CORDUSDT"]
+    assert engine.last_t == START + 309 * HOUR_MS
@@ -0,0 +1,34 @@
+import sqlite3
+
+
+def _set_active(app, cron_id, active):
+    conn = sqlite3.connect(app.DB_PATH)
+    conn.execute("UPDATE cron_tasks SET active=? WHERE id=?", (active, cron_id))
+    conn.commit()
+    conn.close()
+
+
+def _live_entries(sched, cron_id):
+    job = sched._jobs.get(cron_id)
+    return [e for e in sched._heap if e[2] == cron_id and job is not None and e[3] == job["generation"]]
+
+
+def test_reactivated_job_does_not_revive_orphaned_heap_entry(app_module, client):
+    app = app_module
+    conn = sqlite3.connect(app.DB_PATH)
+    cron_id = conn.execute(
+        "INSERT INTO cron_tasks(name, cron_expr, active, task_ref) VALUES('t', '*/5 * * * *', 1, 'noop')"
+    ).lastrowid
+    conn.commit()
+    conn.close()
+    sched = app.CronScheduler({"noop": lambda: None})  # sin hilo: reload() a mano
+
+    sched.reload()
+    assert len(_live_entries(sched, cron_id)) == 1
+    _set_active(app, cron_id, 0)
+    sched.reload()
+    assert cron_id not in sched._jobs
+    _set_active(app, cron_id, 1)
+    sched.reload()
+    assert len([e for e in sched._heap if e[2] == cron_id]) == 2  # la huerfana sigue en el heap...
+    assert len(_live_entries(sched, cron_id)) == 1  # ...pero ya no es valida
@@ -0,0 +1,36 @@
+import asyncio
+import json
+
+
+class _Request:
+    def __init__(self, last_id):
+        self.headers = {"last-event-id": str(last_id)}
+        self._polls = 0
+
+    async def is_disconnected(self):
+        self._polls += 1
+        return self._polls > 1  # una sola vuelta del bucle
+
+
+def _stream(app, **params):
+    start = app.change_feed.last_id
+    app.change_feed.publish(["LSTM_LOG"], app.LSTM_LOG)
+    app.change_feed.publish(["CRYPTO_HISTORY_DIR"], app.CRYPTO_HISTORY_DIR)
+    app.change_feed.publish(["SIGNALS_PATH", "SNAPSHOT_PATH"], app.SIGNALS_PATH)
+
+    async def collect():
+        response = await app.api_events(_Request(start), **params)
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    body = asyncio.run(collect())
+    return [json.loads(line[6:]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+def test_home_scope_only_streams_home_inputs(app_module):
+    events = _stream(app_module, scope="home")
+    assert [e["inputs"] for e in events] == [["SIGNALS_PATH", "SNAPSHOT_PATH"]]
+
+
+def test_explicit_inputs_and_unfiltered_stream(app_module):
+    assert [e["inputs"] for e in _stream(app_module, inputs="LSTM_LOG,SNAPSHOT_PATH")] == [["LSTM_LOG"], ["SNAPSHOT_PATH"]]
+    assert len(_stream(app_module)) == 3
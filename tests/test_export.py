@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+
+
+def _csv(client, url):
+    r = client.get(url)
+    assert r.status_code == 200
+    return list(csv.DictReader(io.StringIO(r.text)))
+
+
+def test_orders_csv_keeps_columns_from_every_book(app_module, client):
+    app = app_module
+    app.ORDERS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    app.ORDERS_PATH.write_text(json.dumps({"pending": [], "completed": [
+        {"id": "s1", "ticker": "AAPL", "created_at": "2026-01-01T00:00:00Z", "shares": 3},
+    ]}))
+    app.CRYPTO_SHORT_ORDERS_PATH.write_text(json.dumps({"active": [], "completed": [
+        {"id": "c1", "ticker": "BTC", "closed_at": "2026-01-02T00:00:00Z", "grid_levels": [1, 2], "pnl_usd": 4.5},
+    ]}))
+    rows = {r["id"]: r for r in _csv(client, "/api/export/orders?format=csv")}
+    assert rows["s1"]["shares"] == "3"
+    assert rows["c1"]["pnl_usd"] == "4.5"
+    assert json.loads(rows["c1"]["grid_levels"]) == [1, 2]
+
+    limited = client.get("/api/export/orders?limit=1").text.strip().splitlines()
+    assert len(limited) == 1
+
+
+def test_journal_limit_and_sql_header_without_rows(app_module, client):
+    app = app_module
+    app.JOURNAL_PATH.write_text(json.dumps([{"ts": f"2026-01-0{i}T00:00:00Z", "note": i} for i in range(1, 6)]))
+    assert len(_csv(client, "/api/export/journal?format=csv&limit=2")) == 2
+    r = client.get("/api/export/tasks?format=csv&since=2999-01-01T00:00:00Z")
+    assert r.text.splitlines()[0].split(",")[:2] == ["id", "task_id"]
+    assert client.get("/api/export/journal?limit=-1").status_code == 400
+
+
+def test_concurrent_sql_exports_span_several_batches(app_module, client):
+    import sqlite3
+    from concurrent.futures import ThreadPoolExecutor
+
+    app = app_module
+    conn = sqlite3.connect(app.DB_PATH)
+    conn.executemany(
+        "INSERT INTO tasks(task_id, title, status, updated_at) VALUES(?, ?, 'done', '2030-05-01T00:00:00Z')",
+        [(f"tsk_exp{i}", f"export {i}") for i in range(app.EXPORT_BATCH_SIZE * 3 + 7)],
+    )
+    conn.commit()
+    conn.close()
+
+    def export(_):
+        r = client.get("/api/export/tasks?since=2030-05-01T00:00:00Z&until=2030-05-02T00:00:00Z")
+        assert r.status_code == 200
+        return [json.loads(line)["task_id"] for line in r.text.splitlines()]
+
+    with ThreadPoolExecutor(8) as ex:
+        results = list(ex.map(export, range(8)))
+    expected = [f"tsk_exp{i}" for i in range(app.EXPORT_BATCH_SIZE * 3 + 7)]
+    assert all(ids == expected for ids in results)
@@ -0,0 +1,89 @@
+import json
+import os
+import time
+
+import pytest
+
+
+class _Request:
+    headers = {}
+
+
+def _report(rows):
+    lines = ["# Walk-forward", "", "| Symbol | Baseline | LSTM |", "|---|---|---|"]
+    lines += [f"| {sym} | {base} | {lstm} |" for sym, base, lstm in rows]
+    return "\n".join(lines) + "\n"
+
+
+def _write(path, text, age_s=10.0):
+    path.write_text(text, encoding="utf-8")
+    past = time.time() - age_s  # por defecto ya asentado (mas viejo que el debounce)
+    os.utime(path, (past, past))
+
+
+@pytest.fixture
+def lstm_files(app_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "LSTM_WALKFORWARD", tmp_path / "walkforward_report.md")
+    monkeypatch.setattr(app_module, "LSTM_REGISTRY", tmp_path / "registry.json")
+    return tmp_path / "walkforward_report.md", tmp_path / "registry.json"
+
+
+def _runs(app, source="walkforward"):
+    return app.q("SELECT id FROM lstm_runs WHERE source=? ORDER BY id", (source,))
+
+
+def _trend(app, **params):
+    response = app.lstm_real_trend(_Request(), **params)
+    return json.loads(response.body)
+
+
+def test_ingest_dedupes_by_content_and_skips_partial_reports(app_module, client, lstm_files):
+    app = app_module
+    wf, reg = lstm_files
+    full = [("BTC", 0.5, 0.55), ("ETH", 0.5, 0.52), ("SOL", 0.5, 0.48)]
+    before = len(_runs(app))
+
+    _write(wf, _report(full), age_s=30)
+    _write(reg, json.dumps({"symbols": {"BTC": {"best_val_mse": 0.0004}}}), age_s=30)
+    assert app.ingest_lstm_reports()
+    assert len(_runs(app)) == before + 1
+    assert len(_runs(app, "registry")) >= 1
+
+    # misma version: nada; mismo contenido con otro mtime: misma ejecucion
+    assert app.ingest_lstm_reports()
+    _write(wf, _report(full), age_s=20)
+    app.ingest_lstm_reports()
+    assert len(_runs(app)) == before + 1
+
+    # lectura a medio escribir (mtime reciente): no se vuelca ni cuenta como ejecucion
+    wf.write_text(_report(full[:1]), encoding="utf-8")
+    assert not app.ingest_lstm_reports()
+    assert len(_runs(app)) == before + 1
+    # el escritor termina y el fichero se asienta: ejecucion nueva con todos los simbolos
+    _write(wf, _report([("BTC", 0.5, 0.6), ("ETH", 0.5, 0.5), ("SOL", 0.5, 0.49)]))
+    assert app.ingest_lstm_reports()
+    assert len(_runs(app)) == before + 2
+    assert {r["symbol"] for r in app.lstm_latest_rows("walkforward")} == {"BTC", "ETH", "SOL"}
+
+    # truncado y asentado sin filas: tampoco es una ejecucion
+    _write(wf, "# Walk-forward\n", age_s=5)
+    assert app.ingest_lstm_reports()
+    assert len(_runs(app)) == before + 2
+
+
+def test_trend_endpoint(app_module, client, lstm_files):
+    app = app_module
+    wf, reg = lstm_files
+    _write(reg, json.dumps({"symbols": {}}))
+    _write(wf, _report([("ADA", 0.5, 0.51), ("XRP", 0.5, 0.5)]), age_s=30)
+    app.ingest_lstm_reports()
+    _write(wf, _report([("ADA", 0.5, 0.56), ("XRP", 0.5, 0.47)]), age_s=20)
+    app.ingest_lstm_reports()
+
+    ada = _trend(app, symbol="ada", limit=2)
+    assert [p["delta"] for p in ada["walkforward"]] == [0.01, 0.06]
+    assert ada["walkforward"][1]["delta_change"] == 0.05
+
+    summary = {s["symbol"]: s for s in _trend(app, limit=2)["symbols"]}
+    assert summary["ADA"]["runs"] == 2 and summary["ADA"]["trend"] == 0.05
+    assert summary["XRP"]["trend"] == -0.03
@@ -0,0 +1,142 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+
+from conftest import wait_for, write_candles
+
+HOUR_MS = 3_600_000
+
+
+def _iso(dt):
+    return dt.isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def _setup_book(app, order_id, ticker, opened, closed):
+    app.CRYPTO_HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+    app.CRYPTO_ORDERS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    book = json.loads(app.CRYPTO_ORDERS_PATH.read_text()) if app.CRYPTO_ORDERS_PATH.exists() else {"active": [], "completed": []}
+    book["completed"].append({
+        "id": order_id, "ticker": ticker, "entry_price": 100, "close_price": 101,
+        "opened_at": _iso(opened), "closed_at": _iso(closed),
+    })
+    app.CRYPTO_ORDERS_PATH.write_text(json.dumps(book))
+    wait_for(lambda: ("completed", order_id) in app.crypto_order_index("long"))
+
+
+def test_etag_changes_when_pair_csv_is_appended_in_place(app_module, client):
+    app = app_module
+    now = datetime.now(UTC).replace(minute=0, second=0, microsecond=0)
+    opened, closed = now - timedelta(hours=6), now - timedelta(hours=2)
+    _setup_book(app, "etag-1", "ETAG", opened, closed)
+    csv_path = app.CRYPTO_HISTORY_DIR / "ETAGUSDT_1h.csv"
+    start = int((opened - timedelta(hours=4)).timestamp() * 1000)
+    write_candles(csv_path, start, 5, HOUR_MS)
+    wait_for(lambda: app.history_intervals("ETAGUSDT"))
+
+    url = "/api/crypto-order-detail/long/completed/etag-1"
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag.startswith("W/")
+    assert "Accept-Encoding" in first.headers["vary"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    dir_mtime = os.stat(app.CRYPTO_HISTORY_DIR).st_mtime_ns
+    write_candles(csv_path, start + 5 * HOUR_MS, 5, HOUR_MS, mode="a")
+    assert os.stat(app.CRYPTO_HISTORY_DIR).st_mtime_ns == dir_mtime  # append en sitio: el directorio no cambia
+    fresh = client.get(url, headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["etag"] != etag
+    assert len(fresh.json()["candles"]) > len(first.json()["candles"])
+
+
+def test_same_weak_etag_for_gzip_and_identity(app_module, client):
+    app = app_module
+    now = datetime.now(UTC).replace(minute=0, second=0, microsecond=0)
+    opened, closed = now - timedelta(hours=40), now - timedelta(hours=20)
+    _setup_book(app, "etag-2", "GZIP", opened, closed)
+    write_candles(app.CRYPTO_HISTORY_DIR / "GZIPUSDT_1h.csv", int((opened - timedelta(hours=8)).timestamp() * 1000), 40, HOUR_MS)
+    wait_for(lambda: app.history_intervals("GZIPUSDT"))
+    url = "/api/crypto-order-detail/long/completed/etag-2"
+    a = client.get(url, headers={"Accept-Encoding": "gzip"})
+    b = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert a.headers.get("content-encoding") == "gzip" and "content-encoding" not in b.headers
+    assert a.headers["etag"] == b.headers["etag"] and a.headers["etag"].startswith("W/")
+
+
+def test_long_trade_not_cached_until_right_pad_is_covered(app_module, client):
+    app = app_module
+    now = datetime.now(UTC).replace(minute=0, second=0, microsecond=0)
+    opened, closed = now - timedelta(hours=30), now - timedelta(hours=6)  # 24 h: margen de 6 h, fin de ventana = ahora
+    _setup_book(app, "long-1", "PADX", opened, closed)
+    csv_path = app.CRYPTO_HISTORY_DIR / "PADXUSDT_1h.csv"
+    start = int((opened - timedelta(hours=8)).timestamp() * 1000)
+    write_candles(csv_path, start, 34, HOUR_MS)  # hasta ~cierre + 1 h: ventana truncada
+    wait_for(lambda: app.history_intervals("PADXUSDT"))
+
+    truncated = app.crypto_order_detail("long", "completed", "long-1")
+    assert truncated is not None
+    assert not any(k[2] == "long-1" for k in app._order_detail_cache)
+
+    write_candles(csv_path, start + 34 * HOUR_MS, 10, HOUR_MS, mode="a")
+    complete = app.crypto_order_detail("long", "completed", "long-1")
+    assert len(complete["candles"]) > len(truncated["candles"])
+    assert any(k[2] == "long-1" for k in app._order_detail_cache)
+    assert app.crypto_order_detail("long", "completed", "long-1") is complete
+
+    # el libro se reescribe (p. ej. se corrige el precio de salida): la entrada cacheada deja de valer
+    book = json.loads(app.CRYPTO_ORDERS_PATH.read_text())
+    for row in book["completed"]:
+        if row["id"] == "long-1":
+            row["close_price"] = 105
+    app.CRYPTO_ORDERS_PATH.write_text(json.dumps(book))
+    assert wait_for(lambda: app.crypto_order_detail("long", "completed", "long-1")["exit_price"] == 105)
+
+
+def test_batch_mixes_hits_and_misses_and_caps_size(app_module, client):
+    app = app_module
+    now = datetime.now(UTC).replace(minute=0, second=0, microsecond=0)
+    opened, closed = now - timedelta(hours=50), now - timedelta(hours=30)
+    _setup_book(app, "batch-1", "BATX", opened, closed)
+    write_candles(app.CRYPTO_HISTORY_DIR / "BATXUSDT_1h.csv", int((opened - timedelta(hours=8)).timestamp() * 1000), 60, HOUR_MS)
+    wait_for(lambda: app.history_intervals("BATXUSDT"))
+
+    orders = [
+        {"book": "long", "state": "completed", "order_id": "batch-1"},
+        {"book": "long", "state": "completed", "order_id": "no-existe"},
+        {"book": "medio", "state": "completed", "order_id": "batch-1"},
+        "basura",
+    ]
+    r = client.post("/api/crypto-order-detail/batch", json={"orders": orders})
+    assert r.status_code == 200
+    body = r.json()
+    assert list(body["details"]) == ["long/completed/batch-1"]
+    assert body["details"]["long/completed/batch-1"]["exit_price"] == 101
+    assert body["missing"] == ["long/completed/no-existe", "medio/completed/batch-1"]
+
+    too_many = [{"order_id": f"x{i}"} for i in range(app.ORDER_DETAIL_BATCH_MAX + 1)]
+    assert client.post("/api/crypto-order-detail/batch", json={"orders": too_many}).status_code == 400
+    assert client.post("/api/crypto-order-detail/batch", json={"orders": "batch-1"}).status_code == 400
+
+
+def test_index_is_rebuilt_once_per_book_version(app_module, client, monkeypatch):
+    app = app_module
+    now = datetime.now(UTC).replace(minute=0, second=0, microsecond=0)
+    _setup_book(app, "index-1", "IDXX", now - timedelta(hours=9), now - timedelta(hours=7))
+    loads = []
+    real_load = app.load_crypto_order_book
+
+    def slow_load(book):
+        loads.append(book)
+        time.sleep(0.05)  # ventana amplia para que los hilos coincidan en la reconstruccion
+        return real_load(book)
+
+    monkeypatch.setattr(app, "load_crypto_order_book", slow_load)
+    app._order_index_cache.pop("long", None)
+    with ThreadPoolExecutor(8) as ex:
+        indexes = list(ex.map(lambda _: app.crypto_order_index("long"), range(8)))
+    assert loads == ["long"]
+    assert all(ix is indexes[0] for ix in indexes)
+    assert ("completed", "index-1") in indexes[0]
@@ -0,0 +1,136 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class _FakeProvider(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: el pool puede reutilizar la conexion
+
+    def do_GET(self):
+        server = self.server
+        server.paths.append(self.path)
+        server.ports.add(self.client_address[1])
+        status = server.script.pop(0) if server.script else 200
+        body = f'{{"status": {status}, "n": {len(server.paths)}}}'.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if server.close_after:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        if server.drop_after:
+            self.close_connection = True  # cierra sin avisar: la conexion queda ociosa en el pool y muerta
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_provider():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeProvider)
+    server.daemon_threads = True
+    server.paths, server.ports, server.script = [], set(), []
+    server.close_after = server.drop_after = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session_for(app_module, fake_provider, monkeypatch):
+    sessions = []
+
+    def make(**kwargs):
+        monkeypatch.setenv("PROVIDER_URL_FAKE", f"http://127.0.0.1:{fake_provider.server_address[1]}/base")
+        kwargs.setdefault("rate_per_sec", 0)
+        kwargs.setdefault("backoff", 0.05)
+        session = app_module.ProviderSession("fake", "https://unused.invalid", **kwargs)
+        sessions.append(session)
+        return session
+
+    yield make
+    for session in sessions:
+        session.close()
+
+
+def test_env_override_and_keepalive_pool(session_for, fake_provider):
+    session = session_for()
+    for i in range(5):
+        assert session.get_json(f"/q?i={i}")["status"] == 200
+    assert fake_provider.paths[0] == "/base/q?i=0"
+    assert len(fake_provider.ports) == 1  # una sola conexion TCP para las cinco peticiones
+    assert session.stats["requests"] == 5 and session.stats["reused"] == 4
+
+
+def test_retries_5xx_and_429_with_exponential_backoff(session_for, fake_provider):
+    session = session_for(retries=2, backoff=0.05)
+    fake_provider.script = [503, 429]
+    t0 = time.monotonic()
+    status, _ = session.get("/x")
+    elapsed = time.monotonic() - t0
+    assert status == 200
+    assert session.stats["retries"] == 2
+    assert elapsed >= 0.05 + 0.10  # backoff * 2**intento
+
+
+def test_gives_up_after_retries_and_does_not_retry_4xx(app_module, session_for, fake_provider):
+    session = session_for(retries=1)
+    fake_provider.script = [500, 502]
+    with pytest.raises(app_module.ProviderError) as err:
+        session.get("/fail")
+    assert err.value.status == 502
+    assert session.stats["errors"] == 1 and len(fake_provider.paths) == 2
+
+    fake_provider.script = [404]
+    assert session.get("/missing")[0] == 404
+    assert len(fake_provider.paths) == 3
+    with pytest.raises(app_module.ProviderError):
+        fake_provider.script = [404]
+        session.get_json("/missing")
+
+
+def test_server_closed_connections_are_not_pooled(session_for, fake_provider):
+    session = session_for()
+    fake_provider.close_after = True
+    for _ in range(3):
+        assert session.get("/c")[0] == 200
+    assert len(fake_provider.ports) == 3
+    assert session.stats["reused"] == 0 and session.stats["retries"] == 0
+
+
+def test_stale_idle_connection_is_replaced_transparently(session_for, fake_provider):
+    session = session_for(retries=0)
+    fake_provider.drop_after = True
+    assert session.get("/a")[0] == 200
+    time.sleep(0.1)
+    fake_provider.drop_after = False
+    assert session.get("/b")[0] == 200  # sin reintentos configurados: la reconexion no cuenta como reintento
+    assert session.stats["retries"] == 0 and session.stats["errors"] == 0
+    assert len(fake_provider.ports) == 2
+
+    session._idle[0].sock.close()  # socket cerrado en local: tampoco rompe el checkout
+    assert session.get("/c")[0] == 200
+
+
+def test_cache_and_rate_limit(session_for, fake_provider):
+    session = session_for(rate_per_sec=20)
+    assert session.get("/cached", cache_ttl=60) == session.get("/cached", cache_ttl=60)
+    assert session.stats["cache_hits"] == 1 and len(fake_provider.paths) == 1
+    t0 = time.monotonic()
+    for _ in range(4):
+        session.get("/r")
+    assert time.monotonic() - t0 >= 3 / 20 - 0.01  # 20/s: al menos 3 huecos de 50 ms
+
+
+def test_idle_pool_is_bounded(session_for, fake_provider):
+    session = session_for(max_idle=2)
+    conns = [session._checkout(1)[0] for _ in range(4)]
+    for conn in conns:
+        session._checkin(conn)
+    assert len(session._idle) == 2
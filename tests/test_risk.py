@@ -0,0 +1,88 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT, TEST_ENV, wait_for
+
+
+_BAD_CONFIG_PROBE = """
+from fastapi.testclient import TestClient
+import app
+
+with TestClient(app.app) as c:
+    health = c.get("/health").json()
+    metrics = c.get("/api/risk-metrics")
+    check = c.get("/api/risk/check", params={"ticker": "BTC", "book": "long", "notional_usd": 50}).json()
+print(health["risk_config_error"])
+assert metrics.status_code == 200 and metrics.json()["config_error"] == health["risk_config_error"]
+assert check["blocked_by"] is None and check["config_error"]
+"""
+
+
+@pytest.mark.parametrize("windows, var_window, message", [
+    ("24,72", "100", "RISK_VAR_WINDOW=100"),
+    ("", None, "CORRELATION_WINDOWS"),
+    ("1,2", None, "CORRELATION_WINDOWS"),
+    ("24,72", "semana", "RISK_VAR_WINDOW=semana"),
+])
+def test_bad_risk_windows_disable_the_gate_not_the_app(windows, var_window, message):
+    env = {**os.environ, **TEST_ENV, "CORRELATION_WINDOWS": windows}
+    env.pop("RISK_VAR_WINDOW", None)
+    if var_window is not None:
+        env["RISK_VAR_WINDOW"] = var_window
+    proc = subprocess.run([sys.executable, "-c", _BAD_CONFIG_PROBE], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0, proc.stderr
+    assert message in proc.stdout
+
+
+def test_stock_entries_are_gated_with_the_stock_portfolio(app_module, client):
+    app = app_module
+    app.PORTFOLIO_PATH.parent.mkdir(parents=True, exist_ok=True)
+    app.PORTFOLIO_PATH.write_text(json.dumps({
+        "cash_usd": 800,
+        "positions": [{"ticker": "MSFT", "notional_usd": 200, "status": "active"}, {"ticker": "X", "notional_usd": 999, "status": "closed"}],
+        "rules": {"max_ticker_weight_pct": 10},
+    }))
+    cfg, equity = wait_for(lambda: app.risk_gate_context("stock")[1] == 1000 and app.risk_gate_context("stock"))
+    assert equity == 1000 and cfg["max_ticker_weight_pct"] == 10
+
+    stock = client.get("/api/risk/check", params={"ticker": "AAPL", "book": "stock", "notional_usd": 50}).json()
+    assert stock["blocked_by"] and stock["blocked_by"].startswith("concentracion")
+    # el libro cripto largo usa su propio risk.yaml (sin limite de peso por defecto)
+    crypto = client.get("/api/risk/check", params={"ticker": "BTC", "book": "long", "notional_usd": 50}).json()
+    assert crypto["blocked_by"] is None
+
+
+def test_stock_leg_comes_from_portfolio_notionals(app_module, client):
+    app = app_module
+    app.PORTFOLIO_PATH.write_text(json.dumps({
+        "cash_usd": 500,
+        "positions": [
+            {"id": "p1", "ticker": "MSFT", "notional_usd": 200, "entry_price": 400, "status": "active"},
+            {"id": "p2", "ticker": "KO", "notional_usd": 90, "status": "active"},
+            {"id": "p3", "ticker": "IBM", "notional_usd": 999, "entry_price": 100, "status": "closed"},
+        ],
+        "rules": {},
+    }))
+    app.SIGNALS_PATH.write_text(json.dumps({"market": [{"ticker": "MSFT", "regularMarketPrice": 420}]}))
+    app.ORDERS_PATH.write_text(json.dumps({"pending": [{"id": "o1", "ticker": "NVDA", "entry_price": 900}], "completed": []}))
+    app.CRYPTO_ORDERS_PATH.write_text(json.dumps({"active": [{"id": "l1", "ticker": "BTC", "entry_price": 50000, "notional_usd": 100}]}))
+    app.CRYPTO_SHORT_ORDERS_PATH.write_text(json.dumps({"active": []}))
+
+    def stock_book():
+        report = client.get("/api/risk-metrics").json()
+        return report if report["by_book"].get("stock", {}).get("gross_usd") == 300 else None
+
+    report = wait_for(stock_book)
+    assert report, client.get("/api/risk-metrics").json()["by_book"]
+    tickers = {r["ticker"]: r for r in report["by_ticker"]}
+    assert tickers["MSFT"]["gross_usd"] == 210  # 0.5 acciones a 420
+    assert tickers["KO"]["gross_usd"] == 90  # sin entrada ni cotizacion: su notional
+    assert "NVDA" not in tickers and "IBM" not in tickers  # ni ordenes simuladas pendientes ni posiciones cerradas
+    assert report["exposure"]["gross_usd"] == 400
+
+    check = client.get("/api/risk/check", params={"ticker": "MSFT", "book": "stock", "notional_usd": 40}).json()
+    assert check["weight_after_pct"] == round((210 + 40) / (400 + 40) * 100, 2)
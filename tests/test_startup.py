@@ -0,0 +1,89 @@
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import ROOT, TEST_ENV, TMP
+
+BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+
+# Importar la app no puede tocar la base ni arrancar nada: eso es del lifespan
+_IMPORT_PROBE = """
+import os, sys
+from pathlib import Path
+import app
+
+db = Path(os.environ["DB_PATH"])
+assert not db.exists(), "init_db corrio al importar"
+assert not app._registered_subsystems, app._registered_subsystems
+assert not any(getattr(r, "path", "").startswith(("/lstm", "/sysadmin", "/terminal")) for r in app.app.routes)
+assert not app.file_watcher.running
+assert app.cron_scheduler._thread is None and app.token_telemetry._thread is None
+assert "jinja2" not in sys.modules, "plantillas compiladas al importar"
+
+from fastapi.testclient import TestClient
+with TestClient(app.app):
+    assert db.exists()
+    assert app._registered_subsystems == {"lstm", "sysadmin", "terminal"}
+    assert app.file_watcher.running
+print("ok")
+"""
+
+
+def test_import_defers_migrations_and_optional_subsystems():
+    env = {**os.environ, **TEST_ENV, "DB_PATH": str(TMP / "import-probe.db"), "DASHBOARD_SUBSYSTEMS": "lstm,sysadmin,terminal"}
+    proc = subprocess.run([sys.executable, "-c", _IMPORT_PROBE], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip().endswith("ok")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(port: int, path: str):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+    try:
+        conn.request("GET", path)
+        resp = conn.getresponse()
+        head = resp.read(1)  # primer byte del cuerpo
+        first_byte = time.perf_counter()
+        return first_byte, resp.status, head + resp.read()
+    finally:
+        conn.close()
+
+
+@pytest.mark.skipif(not os.getenv("STARTUP_BENCHMARK"), reason="benchmark de reloj: STARTUP_BENCHMARK=1 para ejecutarlo")
+def test_import_and_first_health_byte_within_budget():
+    port = _free_port()
+    env = {**os.environ, **TEST_ENV, "DB_PATH": str(TMP / "startup.db")}
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        first_byte = None
+        while time.perf_counter() - t0 < 30:
+            try:
+                first_byte, code, _ = _get(port, "/health")
+                break
+            except OSError:
+                time.sleep(0.005)
+        assert first_byte is not None, proc.stderr.read1().decode(errors="replace") if proc.poll() is not None else "sin respuesta"
+        ttfb_ms = (first_byte - t0) * 1000
+        _, code, body = _get(port, "/health")
+        startup = json.loads(body)["startup"]
+        assert code == 200
+        assert startup["import_ms"] <= BUDGET_MS, startup
+        assert ttfb_ms <= BUDGET_MS, f"primer byte de /health a {ttfb_ms:.0f} ms (presupuesto {BUDGET_MS:.0f} ms)"
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+SOURCE = "browser-test"
+
+
+@pytest.fixture(scope="module")
+def browser_tasks(app_module, client):
+    rows = []
+    for i in range(23):
+        # empates de updated_at, y filas sin updated_at como las que insertan otros procesos
+        updated = None if i % 3 == 0 else f"2031-01-0{1 + i % 4}T00:00:00Z"
+        title = f"alpha-beta \"quoted\" star* tarea {i}" if i % 2 else f"gamma tarea {i}"
+        rows.append((f"tsk_br{i}", title, "pending", SOURCE, updated))
+    conn = sqlite3.connect(app_module.DB_PATH)
+    ids = [conn.execute("INSERT INTO tasks(task_id, title, status, source, updated_at) VALUES(?,?,?,?,?)", r).lastrowid for r in rows]
+    conn.commit()
+    conn.close()
+    return dict(zip(ids, rows))
+
+
+def _all_pages(client, **params):
+    seen, cursor = [], None
+    for _ in range(50):
+        r = client.get("/api/tasks", params={**params, "source": SOURCE, "limit": 4, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200
+        body = r.json()
+        seen += body["tasks"]
+        cursor = body["next_cursor"]
+        if not cursor:
+            return seen
+    raise AssertionError("la paginacion no termina")
+
+
+def test_keyset_pages_reach_every_row_including_null_updated_at(client, browser_tasks):
+    seen = _all_pages(client)
+    assert sorted(t["id"] for t in seen) == sorted(browser_tasks)
+    keys = [(t["updated_at"] or "", t["id"]) for t in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert [t for t in seen if t["updated_at"] is None]  # las NULL salen al final, no se pierden
+
+
+@pytest.mark.parametrize("search", ['alpha-beta', '"quoted', 'star*', 'beta -', '"', '*'])
+def test_search_with_fts_operator_characters(client, browser_tasks, search):
+    seen = _all_pages(client, search=search)
+    expected = {i for i, r in browser_tasks.items() if "alpha-beta" in r[1]}
+    if search.strip('"* -'):
+        assert {t["id"] for t in seen} == expected
+    else:
+        assert {t["id"] for t in seen} <= set(browser_tasks)
+
+
+def test_filter_and_bad_cursor(client, browser_tasks):
+    assert len(_all_pages(client, status="pending")) == len(browser_tasks)
+    assert _all_pages(client, status="done") == []
+    assert client.get("/api/tasks", params={"cursor": "no-es-un-cursor"}).status_code == 400
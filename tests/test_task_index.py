@@ -0,0 +1,84 @@
+import json
+import random
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+TITLES = [f"Revisar idea {i}" for i in range(6)]
+
+
+def _db_active(app):
+    conn = sqlite3.connect(app.DB_PATH)
+    try:
+        return conn.execute(
+            "SELECT fingerprint, COUNT(*) FROM tasks WHERE status IN ('pending','running') AND fingerprint IS NOT NULL GROUP BY fingerprint"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def _task_ids(app):
+    conn = sqlite3.connect(app.DB_PATH)
+    try:
+        return [r[0] for r in conn.execute("SELECT DISTINCT task_id FROM tasks")]
+    finally:
+        conn.close()
+
+
+def test_index_matches_db_under_concurrent_writers(app_module, client):
+    app = app_module
+    app.SIGNALS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    app.SIGNALS_PATH.write_text(json.dumps({"top_opportunities": [{"ticker": t, "score": 80} for t in ("AAA", "BBB", "CCC")]}))
+
+    def writer(seed):
+        rnd = random.Random(seed)
+        for _ in range(15):
+            op = rnd.random()
+            if op < 0.45:
+                r = client.post("/tasks/create", data={"title": rnd.choice(TITLES)}, follow_redirects=False)
+            elif op < 0.6:
+                r = client.post("/signals/autotasks", data={"threshold": 50}, follow_redirects=False)
+            elif op < 0.95:
+                ids = _task_ids(app)
+                if not ids:
+                    continue
+                status = rnd.choice(["pending", "running", "done", "cancelled"])
+                r = client.post("/tasks/status", data={"task_id": rnd.choice(ids), "status": status}, follow_redirects=False)
+            else:
+                r = client.post("/kill_switch", follow_redirects=False)
+            assert r.status_code == 303
+
+    with ThreadPoolExecutor(12) as ex:
+        list(ex.map(writer, range(12)))
+
+    # /tasks/status puede reabrir una tarea vieja junto a otra activa: se compara el conjunto, no el recuento
+    active = _db_active(app)
+    assert "no-existe" not in app.active_tasks  # fuerza la resincronizacion pendiente
+    assert app.active_tasks.fingerprints() == {fp for fp, _ in active}
+
+
+def test_external_writer_frees_fingerprint(app_module, client):
+    app = app_module
+    title = "Tarea cerrada desde otro proceso"
+    fp = app.fingerprint(title, "[conviction:3] creada desde dashboard")
+    client.post("/tasks/create", data={"title": title}, follow_redirects=False)
+    assert fp in app.active_tasks
+
+    # otro proceso (un agente, un script) la cierra escribiendo directamente en SQLite
+    conn = sqlite3.connect(app.DB_PATH)
+    conn.execute("UPDATE tasks SET status='done' WHERE fingerprint=?", (fp,))
+    conn.commit()
+    conn.close()
+    assert fp not in app.active_tasks
+
+    client.post("/tasks/create", data={"title": title}, follow_redirects=False)
+    assert [count for f, count in _db_active(app) if f == fp] == [1]
+
+    # y una tarea activa insertada desde fuera tambien deduplica
+    other = "Tarea creada desde otro proceso"
+    other_fp = app.fingerprint(other, "[conviction:3] creada desde dashboard")
+    conn = sqlite3.connect(app.DB_PATH)
+    conn.execute("INSERT INTO tasks(task_id, title, status, fingerprint) VALUES('tsk_ext', ?, 'pending', ?)", (other, other_fp))
+    conn.commit()
+    conn.close()
+    client.post("/tasks/create", data={"title": other}, follow_redirects=False)
+    assert [count for f, count in _db_active(app) if f == other_fp] == [1]
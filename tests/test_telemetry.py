@@ -0,0 +1,20 @@
+import json
+
+
+def test_recorded_at_is_stored_in_utc_and_found_by_since(app_module, client):
+    r = client.post("/api/telemetry/tokens", json={"records": [
+        {"model": "tz-offset", "tokens_in": 5, "recorded_at": "2031-03-01T01:30:00+02:00"},
+        {"model": "tz-zulu", "tokens_in": 7, "recorded_at": "2031-02-28T23:45:00.250Z"},
+    ]})
+    assert r.status_code == 202
+    app_module.token_telemetry.flush()
+
+    lines = client.get("/api/export/token_usage?since=2031-02-28T23:00:00Z").text.strip().splitlines()
+    stored = {row["model"]: row["recorded_at"] for row in map(json.loads, lines)}
+    assert stored == {"tz-offset": "2031-02-28T23:30:00Z", "tz-zulu": "2031-02-28T23:45:00Z"}
+
+
+def test_recorded_at_without_timezone_is_rejected(client):
+    for value in ("2031-03-01", "2031-03-01T10:00:00", "ayer"):
+        r = client.post("/api/telemetry/tokens", json={"model": "tz-naive", "recorded_at": value})
+        assert r.status_code == 400, value
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from conftest import wait_for
+
+
+def _blob_sizes(app, signals: dict) -> dict:
+    # calculo anterior: volcar cada seccion a texto y pasarla por approx_tokens
+    def rows(key):
+        return " ".join(json.dumps(x, ensure_ascii=False) for x in (signals.get(key) or []))
+
+    news = " ".join(
+        (it.get("title_es") or it.get("title") or "")
+        for feed in (signals.get("news") or [])
+        for it in (feed.get("items") or [])
+    )
+    return {
+        "market": app.approx_tokens(rows("market")),
+        "news": app.approx_tokens(news),
+        "social": app.approx_tokens(rows("social")),
+        "top": app.approx_tokens(rows("top_opportunities")),
+    }
+
+
+@pytest.mark.parametrize("signals", [
+    {"market": [], "news": [], "social": [], "top_opportunities": []},
+    {"market": [{"ticker": "AAPL", "score": 71.5, "nota": "señal ñ"}], "news": [{"items": [{"title": ""}, {"title": ""}]}]},
+    {"news": [{"items": [{"title_es": "Sube el oro"}, {"title": ""}, {}]}, {"items": []}],
+     "social": [{"t": "x" * 9}], "top_opportunities": [{"ticker": "MSFT"}] * 30},
+])
+def test_section_sizes_match_blob_estimate(app_module, client, signals):
+    app = app_module
+    app.SIGNALS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    app.SIGNALS_PATH.write_text(json.dumps(signals, ensure_ascii=False), encoding="utf-8")
+    expected = _blob_sizes(app, signals)
+    assert wait_for(lambda: app.signals_token_sizes("approx") == expected)
+
+
+def test_char_tokenizer_matches_approx_tokens(app_module):
+    tok = app_module.CharTokenizer()
+    for text in ("", " ", "abc", "abcd", "x" * 4099):
+        assert tok.count(text) == app_module.approx_tokens(text)
+    assert app_module.approx_tokens("") == tok.count_pieces(["", ""]) == 0
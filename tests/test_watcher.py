@@ -0,0 +1,77 @@
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+from conftest import wait_for
+
+
+@pytest.fixture
+def watcher(app_module):
+    made = []
+
+    def make(*watches):
+        w = app_module.FileWatcher(poll_interval=0.2, debounce=0.05)
+        for path, newest_child in watches:
+            w.watch(path, newest_child=newest_child)
+        seen = []
+        w.subscribe(lambda key, path: seen.append(key))
+        w.start()
+        made.append(w)
+        return w, seen
+
+    yield make
+    for w in made:
+        w.stop()
+
+
+def test_recreated_directory_keeps_reporting(watcher):
+    root = Path(tempfile.mkdtemp(prefix="watch-"))
+    data = root / "data"
+    data.mkdir()
+    target = data / "snap.json"
+    target.write_text("1")
+    w, seen = watcher((target, False))
+    assert wait_for(lambda: w.backend == "inotify")
+
+    shutil.rmtree(data)
+    assert wait_for(lambda: w.stat(target) is None)
+
+    # el directorio vuelve a aparecer: primero lo ve el sondeo, luego vuelve el watch
+    data.mkdir()
+    target.write_text("22")
+    assert wait_for(lambda: w.stat(target) is not None and w.stat(target)[1] == 2)
+    time.sleep(0.5)
+    seen.clear()
+    target.write_text("333")
+    assert wait_for(lambda: seen and w.stat(target)[1] == 3)
+
+
+def test_write_inside_backup_subdirectory_is_seen(watcher):
+    root = Path(tempfile.mkdtemp(prefix="watch-"))
+    backups = root / "backups"
+    existing = backups / "2026-01-01"
+    existing.mkdir(parents=True)
+    (existing / "state.db").write_text("a")
+    w, seen = watcher((backups, True))
+    assert wait_for(lambda: w.backend == "inotify")
+    before = w.newest_child_mtime(backups)
+
+    time.sleep(0.05)
+    (existing / "extra.db").write_text("b")
+    assert wait_for(lambda: str(backups) in seen)
+    assert w.newest_child_mtime(backups) > before
+
+    # carpeta creada con el watcher en marcha: tambien se vigila por dentro
+    fresh = backups / "2026-01-02"
+    fresh.mkdir()
+    assert wait_for(lambda: str(backups) in seen)
+    time.sleep(0.3)
+    seen.clear()
+    mark = w.newest_child_mtime(backups)
+    time.sleep(0.05)
+    (fresh / "state.db").write_text("c")
+    assert wait_for(lambda: seen)
+    assert w.newest_child_mtime(backups) > mark